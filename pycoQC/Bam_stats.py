@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~IMPORTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+# Standard library imports
+from collections import *
+import warnings
+import datetime
+
+# Local lib import
+from pycoQC import __name__ as package_name
+from pycoQC import __version__ as package_version
+from pycoQC.common import *
+from pycoQC.pycoQC_parse import bam_file_stats, bam_stats_dir, load_bam_stats, save_bam_stats
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~GLOBAL SETTINGS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+# Silence futurewarnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN CLASS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+def Bam_stats (
+    bam_file:str,
+    threads:int=1,
+    force:bool=False,
+    verbose:bool=False,
+    quiet:bool=False):
+    """
+    Extract the per read alignment stats used by pycoQC from bam files and save them in a sidecar directory next to each
+    file (bam_file.pycoqc_stats), so that the bam files do not have to be parsed again by pycoQC.
+    Files with an up to date sidecar directory are skipped
+    * bam_file
+        Path to a Bam file. One can also pass multiple space separated file paths or a UNIX style regex matching multiple files
+    * threads
+        Number of worker processes used to parse the bam files by regions
+    * force
+        If True, the sidecar directories are rebuilt even if up to date
+    * verbose
+        Increase verbosity
+    * quiet
+        Reduce verbosity
+    """
+
+    # Save args and init options in dict for report
+    options_d = locals()
+    info_d = {"package_name":package_name, "package_version":package_version, "timestamp":str(datetime.datetime.now())}
+
+    # Set logging level
+    logger = get_logger (name=__name__, verbose=verbose, quiet=quiet)
+
+    # Print debug info
+    logger.debug("General info")
+    logger.debug(dict_to_str(info_d))
+    logger.debug("Runtime options")
+    logger.debug(dict_to_str(options_d))
+
+    logger.warning ("Check input bam files")
+    bam_file_list = expand_file_names(bam_file, bam_check=True)
+    if STDIN_FN in bam_file_list:
+        raise pycoQCError("Alignments read from the standard input cannot be saved in a sidecar directory")
+    if not force:
+        bam_file_list = [bam_fn for bam_fn in bam_file_list if not load_bam_stats(bam_fn)]
+        logger.info ("\t{:,} bam files without up to date sidecar directory".format(len(bam_file_list)))
+
+    # Parse one file at a time to bound the memory usage
+    for bam_fn in bam_file_list:
+        logger.warning ("Extract alignment stats from {}".format(bam_fn))
+        df, alignments_dict, ref_len_dict = bam_file_stats([bam_fn], threads=threads)[bam_fn]
+        logger.info ("\t{:,} primary alignments".format(len(df)))
+        save_bam_stats(bam_fn, df, alignments_dict, ref_len_dict)
+        logger.info ("\tAlignment stats saved in {}".format(bam_stats_dir(bam_fn)))
@@ -1,4 +1,4 @@
 # -*- coding: utf-8 -*-
 
 __version__ = '2.5.0.23'
-__all__ = ["pycoQC", "Fast5_to_seq_summary", "Barcode_split", "common"]
+__all__ = ["pycoQC", "Fast5_to_seq_summary", "Barcode_split", "Bam_stats", "common"]
@@ -15,7 +15,8 @@ from jinja2 import Environment, PackageLoader, Template
 from pycoQC.pycoQC import pycoQC
 from pycoQC.Fast5_to_seq_summary import Fast5_to_seq_summary
 from pycoQC.Barcode_split import Barcode_split
-from pycoQC.common import get_logger
+from pycoQC.Bam_stats import Bam_stats
+from pycoQC.common import get_logger, sequencing_summary_file_sample
 from pycoQC import __version__ as package_version
 from pycoQC import __name__ as package_name
 
@@ -49,7 +50,8 @@ def main_pycoQC (args=None):
         One can also pass multiple space separated file paths or a UNIX style regex matching multiple files (optional)"""))
     parser_io.add_argument("--bam_file", "-a", default=[], nargs='*',
         help=textwrap.dedent("""Path to a Bam file corresponding to reads in the summary_file. Preferably aligned with Minimap2
-          One can also pass multiple space separated file paths or a UNIX style regex matching multiple files (optional)"""))
+          One can also pass multiple space separated file paths or a UNIX style regex matching multiple files. Unsorted bam or sam
+          files are also accepted, and "-" reads the alignments from the standard input, for example piped from the aligner (optional)"""))
     parser_io.add_argument("--html_outfile", "-o", default="", type=str,
         help="Path to an output html file report (required if json_outfile not given)")
     parser_io.add_argument("--json_outfile", "-j", default="", type=str,
@@ -64,8 +66,16 @@ def main_pycoQC (args=None):
     parser_filt.add_argument("--filter_duplicated", default=False, action='store_true',
         help=textwrap.dedent("""If given, duplicated read_ids are removed but the first occurence is kept
         (Guppy sometimes outputs the same read multiple times) (default: %(default)s)"""))
+    parser_filt.add_argument("--verify_duplicates", default=False, action='store_true',
+        help=textwrap.dedent("""If given, the duplicated read_ids found using 64 bits hashes of the read_ids are verified with a second
+        64 bits value. Uses 16 instead of 8 bytes per read (default: %(default)s)"""))
     parser_filt.add_argument("--min_barcode_percent", default=0.1, type=float,
         help="Minimal percent of total reads to retain barcode label. If below, the barcode value is set as `unclassified` (default: %(default)s)")
+    parser_filt.add_argument("--runid_list", default=[], nargs='*',
+        help=textwrap.dedent("""Select only specific runids to be analysed. Also defines the order of the runids for temporal plots
+        (default: all runids, ordered by decreasing throughput)"""))
+    parser_filt.add_argument("--time_window", default=None, type=float, nargs=2, metavar=("MIN", "MAX"),
+        help="Select only the reads with a start time within a time window, in hours from the start of their run (default: %(default)s)")
     parser_html = parser.add_argument_group('HTML report options')
     parser_html.add_argument("--report_title", default="PycoQC report", type=str,
         help="Title to use in the html report (default: %(default)s)")
@@ -80,6 +90,49 @@ def main_pycoQC (args=None):
     parser_other.add_argument("--sample", default=100000, type=int,
         help=textwrap.dedent("""If not None a n number of reads will be randomly selected instead of the entire dataset for ploting function
         (deterministic sampling) (default: %(default)s)"""))
+    parser_other.add_argument("--streaming", action='store_true', default=False,
+        help=textwrap.dedent("""If given, summary files are parsed by chunks and folded into exact aggregates, keeping only a random sample of
+        reads in memory. Bounded memory mode for very large datasets (default: %(default)s)"""))
+    parser_other.add_argument("--chunk_size", default=1000000, type=int,
+        help="Number of lines per chunk in streaming mode (default: %(default)s)")
+    parser_other.add_argument("--preview", action='store_true', default=False,
+        help=textwrap.dedent("""If given, fast preview report. Summary files are parsed by chunks, the reads and bases counts are exact but the
+        reads are sampled per runid and the distributions are estimated from the sample. Implies --streaming (default: %(default)s)"""))
+    parser_other.add_argument("--watch", action='store_true', default=False,
+        help=textwrap.dedent("""If given, pycoQC keeps running, parses the lines appended to the uncompressed summary files during a run and
+        regenerates the reports every --watch_interval seconds. Implies --streaming (default: %(default)s)"""))
+    parser_other.add_argument("--watch_interval", default=60, type=float,
+        help="Time in seconds between 2 updates of the reports in watch mode (default: %(default)s)")
+    parser_other.add_argument("--threads", default=1, type=int,
+        help=textwrap.dedent("""Number of worker processes used to parse multiple summary or barcode files concurrently, or byte ranges of a
+        single large uncompressed file (default: %(default)s)"""))
+    parser_other.add_argument("--reader", default="pandas", type=str, choices=["pandas", "arrow"],
+        help=textwrap.dedent("""Parser backend used to read the summary and barcode files outside of streaming mode. "arrow" uses the
+        multithreaded CSV reader of pyarrow (default: %(default)s)"""))
+    parser_other.add_argument("--summary_index", action='store_true', default=False,
+        help=textwrap.dedent("""If given, a sidecar index of the start times and runids per block of lines is saved next to each uncompressed
+        summary file. Up to date indexes are reused by later runs to only parse the blocks selected with --time_window or --runid_list
+        (default: %(default)s)"""))
+    parser_other.add_argument("--cache_dir", default="", type=str,
+        help=textwrap.dedent("""If given, the cleaned data are saved in a columnar cache in this directory, and reloaded by later runs with the
+        same input files and parsing options (default: %(default)s)"""))
+    parser_other.add_argument("--cache_max_size", default=10, type=float,
+        help="Maximal size of the cache directory in GB. The least recently used entries are evicted first (default: %(default)s)")
+    parser_other.add_argument("--memory_map", action='store_true', default=False,
+        help=textwrap.dedent("""If given, the reads table is memory-mapped from the cache entry column files instead of being loaded in memory.
+        Requires --cache_dir (default: %(default)s)"""))
+    parser_other.add_argument("--no_bam_sidecar", dest="write_bam_sidecar", action='store_false', default=True,
+        help=textwrap.dedent("""If given, the per read alignment stats extracted from the bam files are not saved in sidecar directories next to
+        the bam files (bam_file.pycoqc_stats). Existing up to date sidecars are still reused (default: False)"""))
+    parser_other.add_argument("--bam_sample", action='store_true', default=False,
+        help=textwrap.dedent("""If given, the alignment types of all the reads are counted exactly, but the per read alignment stats are only
+        extracted for the reads plotted (see --sample) and --bam_extra_sample other random reads, from which the alignment summaries are
+        estimated. Not available in streaming mode (default: %(default)s)"""))
+    parser_other.add_argument("--bam_extra_sample", default=100000, type=int,
+        help="Number of reads sampled in addition to the plotted reads to estimate the alignment summaries with --bam_sample (default: %(default)s)")
+    parser_other.add_argument("--read_ids", default="string", type=str, choices=["string", "binary", "none"],
+        help=textwrap.dedent("""Representation of the read_ids in the parsed reads table. "none" avoids loading the read_ids if no barcode
+        or bam merge or duplicate filtering is needed (default: %(default)s)"""))
     parser_other.add_argument("--default_config", "-d", action='store_true',
         help="Print default configuration file. Can be used to generate a template JSON file (default: %(default)s)")
     parser_verbosity = parser.add_mutually_exclusive_group()
@@ -114,12 +167,29 @@ def main_pycoQC (args=None):
         summary_file = args.summary_file,
         barcode_file = args.barcode_file,
         bam_file = args.bam_file,
+        write_bam_sidecar = args.write_bam_sidecar,
+        bam_sample = args.bam_sample,
+        bam_extra_sample = args.bam_extra_sample,
+        runid_list = args.runid_list,
+        time_window = args.time_window,
+        summary_index = args.summary_index,
         filter_calibration = args.filter_calibration,
         filter_duplicated = args.filter_duplicated,
+        verify_duplicates = args.verify_duplicates,
         min_barcode_percent = args.min_barcode_percent,
         min_pass_qual = args.min_pass_qual,
         min_pass_len = args.min_pass_len,
         sample = args.sample,
+        chunk_size = args.chunk_size if args.streaming or args.watch or args.preview else 0,
+        preview = args.preview,
+        threads = args.threads,
+        reader = args.reader,
+        watch = args.watch,
+        watch_interval = args.watch_interval,
+        cache_dir = args.cache_dir,
+        cache_max_size = args.cache_max_size,
+        memory_map = args.memory_map,
+        read_ids = args.read_ids,
         html_outfile = args.html_outfile,
         report_title = args.report_title,
         config_file = args.config_file,
@@ -210,3 +280,71 @@ def main_Barcode_split (args=None):
         min_barcode_percent=args.min_barcode_percent,
         verbose=args.verbose,
         quiet=args.quiet)
+
+#~~~~~~~~~~~~~~Summary_sample CLI ENTRY POINT~~~~~~~~~~~~~~#
+def main_Summary_sample (args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    # Define parser object
+    parser = argparse.ArgumentParser(
+        description ="Summary_sample randomly samples reads from sequencing summary files, proportionally to the number of reads of each run_id")
+    parser.add_argument('--version', action='version', version="{} v{}".format(package_name, package_version))
+    # Define arguments
+    parser.add_argument("--summary_file", "-f", required=True, nargs='*',
+        help=textwrap.dedent("""Path to a sequencing_summary generated by Albacore 1.0.0 + (read_fast5_basecaller.py) / Guppy 2.1.3+ (guppy_basecaller).
+        One can also pass multiple space separated file paths or a UNIX style regex matching multiple files"""))
+    parser.add_argument("--outfile", "-o", required=True, type=str,
+        help="Path to the output sequencing summary file. Files ending with gz are compressed in bgzip format")
+    parser.add_argument("--n_seq", "-n", default=10000, type=int,
+        help="Overall number of reads to sample (default: %(default)s)")
+    parser.add_argument("--seed", "-s", default=None, type=int,
+        help="Seed of the random generator, for reproducible sampling (default: %(default)s)")
+    parser.add_argument("--chunk_size", default=1000000, type=int,
+        help="Number of lines read at once (default: %(default)s)")
+    parser.add_argument("--threads", "-t", default=1, type=int,
+        help="Number of threads used to decompress the files (default: %(default)s)")
+
+    # Try to parse arguments
+    args = parser.parse_args()
+
+    # Run main function
+    sequencing_summary_file_sample (
+        infile=args.summary_file,
+        outfile=args.outfile,
+        n_seq=args.n_seq,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        threads=args.threads)
+
+#~~~~~~~~~~~~~~Bam_stats CLI ENTRY POINT~~~~~~~~~~~~~~#
+def main_Bam_stats (args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    # Define parser object
+    parser = argparse.ArgumentParser(
+        description ="Bam_stats extracts the per read alignment stats used by pycoQC from bam files and saves them in sidecar directories next to the bam files")
+    parser.add_argument('--version', action='version', version="{} v{}".format(package_name, package_version))
+    # Define arguments
+    parser.add_argument("--bam_file", "-a", required=True, nargs='*',
+        help=textwrap.dedent("""Path to a Bam file corresponding to reads in the summary_file.
+        One can also pass multiple space separated file paths or a UNIX style regex matching multiple files"""))
+    parser.add_argument("--threads", "-t", default=1, type=int,
+        help="Number of worker processes used to parse the bam files by regions (default: %(default)s)")
+    parser.add_argument("--force", action='store_true', default=False,
+        help="If given, the sidecar directories are rebuilt even if up to date (default: %(default)s)")
+    parser_verbosity = parser.add_mutually_exclusive_group()
+    parser_verbosity.add_argument("-v", "--verbose", action="store_true", default=False, help="Increase verbosity")
+    parser_verbosity.add_argument("-q", "--quiet", action="store_true", default=False, help="Reduce verbosity")
+
+    # Try to parse arguments
+    args = parser.parse_args()
+
+    # Run main function
+    Bam_stats (
+        bam_file=args.bam_file,
+        threads=args.threads,
+        force=args.force,
+        verbose=args.verbose,
+        quiet=args.quiet)
@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 
 # Standard library imports
-from os import access, R_OK, listdir, path, makedirs
+from os import access, R_OK, listdir, path, makedirs, rename, utime, stat, walk
 import inspect
+import io
+import json
+import shutil
 from glob import iglob, glob
 import sys
 import logging
+import multiprocessing as mp
+import subprocess
+from contextlib import contextmanager
 from collections import *
 
 # Third party imports
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import pysam as ps
 
 #~~~~~~~~~~~~~~CUSTOM EXCEPTION AND WARN CLASSES~~~~~~~~~~~~~~#
@@ -49,37 +57,60 @@ def check_arg (arg_name, arg_val, required_type, allow_none=True, min=None, max=
 
     return arg_val
 
-def sequencing_summary_file_sample (infile, outfile=None, n_seq=10000):
+def sequencing_summary_file_sample (infile, outfile=None, n_seq=10000, seed=None, chunk_size=1000000, threads=1):
     """
     Sample a number read lines in infile and write the output_over_time in output_file
     If the file contains several runids the function will sample proportionally to the
+    number of reads of each runid, with at least 1 read per runid. The files are read in a single pass
+    by chunks of lines, and a reservoir of n_seq reads is kept for each runid, so that the memory usage is bounded
     * infile: STR
-    Path to a sequencing_summary input file
+        Path to a sequencing_summary input file. One can also pass multiple space separated file paths or a UNIX style regex
+        matching multiple files. Files can be compressed
     * outfile: STR (default None)
-        Path to a sequencing_summary output file. If not given, will return a dataframe instead
-    * n_seq: STR (default 10000)
+        Path to a sequencing_summary output file. If not given, will return a dataframe instead.
+        Files ending with gz are compressed in bgzip format
+    * n_seq: INT (default 10000)
         Overall number of sequence lines to sample
+    * seed: INT (default None)
+        Seed of the random generator, for reproducible sampling
+    * chunk_size: INT (default 1000000)
+        Number of lines read at once
+    * threads: INT (default 1)
+        Number of threads used to decompress the files
     """
-    df = pd.read_csv(infile, sep ="\t")
-    df.dropna (inplace=True)
-    total = len(df)
+    random = np.random.RandomState(seed=seed)
+    sample_df = pd.DataFrame()
+    runid_counts = Counter()
+
+    # Keep the reads with the smallest random keys for each runid
+    for df in iter_files_to_df (expand_file_names(infile), chunk_size=chunk_size, threads=threads):
+        df = df.dropna()
+        for runid, n in df.groupby("run_id", sort=False).size().items():
+            runid_counts[runid] += n
+        df = df.assign (_sample_key=random.random_sample(len(df)))
+        df = pd.concat([sample_df, df], ignore_index=True, sort=False)
+        df = df.sort_values("_sample_key", kind="mergesort")
+        sample_df = df[df.groupby("run_id", sort=False).cumcount().values < n_seq]
+
+    total = sum(runid_counts.values())
     print ("{} sequences".format(total))
 
     l = []
-    for runid, runid_df in df.groupby("run_id", sort=False):
-        n_to_sample = int (round (len (runid_df)/total*n_seq, 0))
+    for runid, n in runid_counts.items():
+        n_to_sample = int (round (n/total*n_seq, 0))
         if n_to_sample == 0:
             n_to_sample=1
-        print ("{} = {} seq, to sample = {}".format (runid, len(runid_df), n_to_sample))
-        sdf = runid_df.sample(n_to_sample)
-        sdf.sort_values("start_time", inplace=True)
-        l.append(sdf)
+        print ("{} = {} seq, to sample = {}".format (runid, n, n_to_sample))
+        l.append(sample_df[sample_df["run_id"] == runid].head(n_to_sample))
 
-    df = pd.concat(l)
+    df = pd.concat(l).drop(columns="_sample_key")
+    df = df.sort_values("start_time", kind="mergesort")
     df.reset_index(inplace=True, drop=True)
     if outfile:
+        # gzip output is written in bgzip format, which is gzip compatible and can be decompressed block parallel
         if outfile.endswith("gz"):
-            df.to_csv(outfile, index=False, sep="\t", compression="gzip")
+            with ps.BGZFile(outfile, "wb") as fp:
+                fp.write(df.to_csv(index=False, sep="\t").encode())
         else:
             df.to_csv(outfile, index=False, sep="\t", compression=None)
     else:
@@ -313,6 +344,9 @@ def ls (dir_path):
     for f in listdir(dir_path):
         print(f)
 
+# File name used to read alignments from the standard input
+STDIN_FN = "-"
+
 def expand_file_names(fn, bam_check=False):
     """"""
     # Try to expand file name to list
@@ -328,46 +362,798 @@ def expand_file_names(fn, bam_check=False):
     else:
         raise pycoQCError ("{} has to be either a file or a regular expression or a list of files".format(fn))
 
+    # Alignments can also be read from the standard input
+    if bam_check and STDIN_FN in (fn if isinstance(fn, list) else [fn]) and not STDIN_FN in fn_list:
+        fn_list.append(STDIN_FN)
+
     # Verify that files are readable
     if not fn_list:
         raise pycoQCError("No files found in {}".format(fn))
     for f in fn_list:
+        if f == STDIN_FN:
+            continue
         if not is_readable_file (f):
             raise pycoQCError("Cannot read file {}".format(f))
         # Extra checks for bam files
         if bam_check:
-            with ps.AlignmentFile(f, "rb") as bam:
-                if not bam.has_index():
-                    raise pycoQCError("No index found for bam file: {}. Please index with samtools index".format(f))
-                if not bam.header['HD']['SO'] == 'coordinate':
-                    raise pycoQCError("Bam file not sorted: {}. Please sort with samtools sort".format(f))
+            try:
+                with ps.AlignmentFile(f, "r"):
+                    pass
+            except (ValueError, OSError) as E:
+                raise pycoQCError("Cannot parse alignment file {}: {}".format(f, E))
     return fn_list
 
-def merge_files_to_df(fn_list):
-    """"""
+def bam_is_indexed (fn):
+    """True if fn is a coordinate sorted and indexed bam file, which can be parsed by regions"""
+    if fn == STDIN_FN:
+        return False
+    with ps.AlignmentFile(fn, "r") as bam:
+        return bam.is_bam and bam.has_index() and bam.header.to_dict().get("HD", {}).get("SO") == "coordinate"
+
+def bam_index_file (fn):
+    """Path of the index file of a bam file (.bam.bai, .bai or .bam.csi). Returns None if not found"""
+    for index_fn in (fn+".bai", path.splitext(fn)[0]+".bai", fn+".csi"):
+        if path.isfile(index_fn):
+            return index_fn
+    return None
+
+def file_compression (fn):
+    """Detect gzip, bgzip and zstd compressed files from their magic bytes. Returns None for other files"""
+    with open(fn, "rb") as fp:
+        magic = fp.read(14)
+    if magic[:2] == b"\x1f\x8b":
+        # bgzip files are gzip files with a BC extra subfield
+        if len(magic) == 14 and magic[3] & 4 and magic[12:14] == b"BC":
+            return "bgzip"
+        return "gzip"
+    if magic[:4] == b"\x28\xb5\x2f\xfd":
+        return "zstd"
+    return None
+
+def decompress_cmd (fn, threads=1):
+    """
+    Define the command line to decompress a gzip, bgzip or zstd file to stdout using the fastest tool available:
+    bgzip (block parallel), pigz (multithreaded), gzip or zstd. Returns None if the file is not compressed in one of
+    these formats or if no tool is available
+    """
+    compression = file_compression(fn)
+    if compression == "bgzip" and shutil.which("bgzip"):
+        return ["bgzip", "-dc", "-@", str(threads), fn]
+    if compression in ("gzip", "bgzip"):
+        if shutil.which("pigz"):
+            return ["pigz", "-dc", "-p", str(threads), fn]
+        if shutil.which("gzip"):
+            return ["gzip", "-dc", fn]
+    if compression == "zstd" and shutil.which("zstd"):
+        return ["zstd", "-dcq", fn]
+    return None
+
+@contextmanager
+def open_tsv_file (fn, threads=1):
+    """
+    Context manager opening a possibly compressed tabulated file for pandas.read_csv. gzip, bgzip and zstd files are
+    decompressed by an external process (see decompress_cmd) so that the decompression is pipelined with the parsing.
+    zstd files can also be decompressed with the zstandard package. Other files are passed to pandas as is.
+    * fn
+        Path to the file to open
+    * threads
+        Number of threads used by the decompression tool if it supports it
+    """
+    cmd = decompress_cmd(fn, threads)
+    if cmd:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            yield proc.stdout
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+            stderr = proc.stderr.read().decode()
+            proc.stderr.close()
+        if returncode:
+            raise pycoQCError ("Cannot decompress file {}: {}".format(fn, stderr.strip()))
+
+    elif file_compression(fn) == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise pycoQCError ("Reading zstd compressed file {} requires the zstd program or the zstandard python package".format(fn))
+        with open(fn, "rb") as fp:
+            yield zstandard.ZstdDecompressor().stream_reader(fp)
+
+    else:
+        yield fn
+
+def iter_files_to_df (fn_list, chunk_size, usecols=None, dtype=None, threads=1):
+    """
+    Generator reading a list of tabulated files by chunks of lines
+    Integer columns declared in dtype are read as float32 since NA values cannot be anticipated
+    * fn_list
+        List of paths to the files to read
+    * chunk_size
+        Number of lines per chunk
+    * usecols
+        Collection of column names to load. By default all the columns are loaded
+    * dtype
+        Dict of column names to dtype. By default dtypes are infered by pandas
+    * threads
+        Number of threads used to decompress the files
+    """
+    if usecols is not None:
+        usecols_set = set(usecols)
+        usecols = lambda c: c in usecols_set
+    dtype = _na_safe_dtype(dtype)
+
+    for fn in fn_list:
+        with open_tsv_file(fn, threads=threads) as fp:
+            for df in pd.read_csv(fp, sep="\t", usecols=usecols, dtype=dtype, chunksize=chunk_size):
+                yield df
+
+class tsv_file_tail ():
+    """
+    Incrementally read the complete lines appended to an uncompressed tabulated file since the previous read.
+    The byte offset of the first unread line is kept between reads, so that only new lines are parsed
+    """
+    def __init__ (self, fn, block_size=2**26):
+        """
+        * fn
+            Path to the file to read
+        * block_size
+            Number of bytes read at once
+        """
+        if file_compression(fn):
+            raise pycoQCError ("Compressed file {} cannot be read incrementally".format(fn))
+        self.fn = fn
+        self.block_size = block_size
+        self.offset = 0
+        self.header = None
+
+    def iter_df (self, chunk_size, usecols=None, dtype=None):
+        """
+        Generator reading the new complete lines by chunks of lines. A trailing incomplete line is left for the next read.
+        Integer columns declared in dtype are read as float32 since NA values cannot be anticipated
+        * chunk_size
+            Number of lines per chunk
+        * usecols
+            Collection of column names to load. By default all the columns are loaded
+        * dtype
+            Dict of column names to dtype. By default dtypes are infered by pandas
+        """
+        if usecols is not None:
+            usecols_set = set(usecols)
+            usecols = lambda c: c in usecols_set
+        dtype = _na_safe_dtype(dtype)
+
+        with open(self.fn, "rb") as fp:
+            fp.seek(self.offset)
+            tail = b""
+            while True:
+                block = fp.read(self.block_size)
+                if not block:
+                    break
+                block = tail+block
+                end = block.rfind(b"\n")+1
+                tail = block[end:]
+                lines = block[:end]
+
+                # Save header line at first read
+                if self.header is None and lines:
+                    header_end = lines.find(b"\n")+1
+                    self.header = lines[:header_end]
+                    lines = lines[header_end:]
+
+                self.offset = fp.tell()-len(tail)
+                if lines:
+                    for df in pd.read_csv(io.BytesIO(self.header+lines), sep="\t", usecols=usecols, dtype=dtype, chunksize=chunk_size):
+                        yield df
+
+# Readers available to parse tabulated files, and minimal number of bytes per worker to split a single file
+TSV_READERS = ["pandas", "arrow"]
+SPLIT_MIN_BYTES = 2**26
+
+def read_tsv_file (fn, usecols=None, dtype=None, threads=1, reader="pandas"):
+    """
+    Read a tabulated file in a dataframe, optionally loading only a subset of columns
+    directly in the requested dtypes. If integer columns contain NA values they are read
+    as float32 instead, and can be cast later once the NA values are discarded.
+    * fn
+        Path to the file to read
+    * usecols
+        Collection of column names to load. Names absent from the file header are ignored
+    * dtype
+        Dict of column names to dtype. Names absent from the file header are ignored
+    * threads
+        Number of threads used to decompress the file. With the pandas reader, large uncompressed files are split in
+        byte ranges parsed by threads worker processes. The arrow reader parses the file with threads threads
+    * reader
+        Parser backend. "pandas" uses the pandas C engine, "arrow" the multithreaded pyarrow CSV reader
+    """
+    if not reader in TSV_READERS:
+        raise pycoQCError ("Invalid reader {}. Choices: {}".format(reader, ", ".join(TSV_READERS)))
+    if reader == "arrow":
+        return read_tsv_file_arrow(fn, usecols=usecols, dtype=dtype, threads=threads)
+
+    # Split large uncompressed files in ranges of lines parsed concurrently, unless already running in a worker process
+    n_ranges = min(threads, path.getsize(fn)//SPLIT_MIN_BYTES)
+    if n_ranges > 1 and not mp.current_process().daemon and not file_compression(fn):
+        header, ranges = tsv_file_ranges(fn, n_ranges)
+        if len(ranges) > 1:
+            # Pool.starmap returns the results in the same order as ranges
+            with mp.Pool(len(ranges)) as pool:
+                df_list = pool.starmap(_read_tsv_range, [(fn, start, stop, header, usecols, dtype) for start, stop in ranges])
+            return concat_df_list(df_list)
+
+    if usecols is not None:
+        usecols_set = set(usecols)
+        usecols = lambda c: c in usecols_set
+
+    def read (dtype):
+        with open_tsv_file(fn, threads=threads) as fp:
+            return pd.read_csv(fp, sep="\t", usecols=usecols, dtype=dtype)
+    return _read_na_safe(read, dtype)
+
+def _na_safe_dtype (dtype):
+    """Copy of a dict of column names to dtype in which the integer dtypes are replaced by float32, which can hold NA values"""
+    if not dtype:
+        return dtype
+    return {k:"float32" if str(v).startswith(("int", "uint")) else v for k, v in dtype.items()}
+
+def _read_na_safe (read_func, dtype, errors=ValueError):
+    """
+    Return read_func(dtype). If parsing fails with one of the errors exceptions, as when integer columns contain NA values,
+    retry with the integer columns read as float32 (see _na_safe_dtype). They can be cast later once the NA values are discarded
+    """
+    try:
+        return read_func(dtype)
+    except errors:
+        if not dtype:
+            raise
+        return read_func(_na_safe_dtype(dtype))
+
+def tsv_file_ranges (fn, n):
+    """
+    Split an uncompressed tabulated file in up to n ranges of bytes of similar sizes, aligned on line ends.
+    Returns the header line and the list of (start, stop) byte offsets of the ranges, in file order
+    * fn
+        Path to the file to split
+    * n
+        Number of ranges
+    """
+    size = path.getsize(fn)
+    with open(fn, "rb") as fp:
+        header = fp.readline()
+        bounds = [fp.tell()]
+        for i in range(1, n):
+            # Move to the start of the first line beginning at or after the target offset
+            fp.seek(max(bounds[-1], size*i//n)-1)
+            fp.readline()
+            bounds.append(min(fp.tell(), size))
+        bounds.append(size)
+    return (header, [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start])
+
+def _read_tsv_range (fn, start, stop, header, usecols=None, dtype=None):
+    """Parse the lines of fn between the byte offsets start and stop with the header line of the file"""
+    buf = bytearray(len(header)+stop-start)
+    buf[:len(header)] = header
+    with open(fn, "rb") as fp:
+        fp.seek(start)
+        fp.readinto(memoryview(buf)[len(header):])
+
+    if usecols is not None:
+        usecols_set = set(usecols)
+        usecols = lambda c: c in usecols_set
+    return _read_na_safe(lambda dtype: pd.read_csv(io.BytesIO(buf), sep="\t", usecols=usecols, dtype=dtype), dtype)
+
+class summary_file_index ():
+    """
+    Sidecar index of an uncompressed sequencing summary file, saved next to it with the extension .pycoqc_index.
+    The file is split in blocks of lines, and the byte offsets, the start_time range and the run_ids of each block are
+    recorded, so that only the blocks containing reads of a time window or of selected run_ids have to be parsed.
+    The index is only valid as long as the size and modification time of the summary file are unchanged
+    """
+    def __init__ (self, fn, block_size=2**24):
+        """
+        * fn
+            Path to the summary file to index
+        * block_size
+            Approximate number of bytes per block
+        """
+        if file_compression(fn):
+            raise pycoQCError ("Compressed file {} cannot be indexed".format(fn))
+        self.fn = fn
+        self.index_fn = fn+".pycoqc_index"
+        self.block_size = block_size
+        self.header = None
+        self.blocks = []
+
+    def __len__ (self):
+        return len(self.blocks)
+
+    def _file_stat (self):
+        st = stat(self.fn)
+        return [st.st_size, st.st_mtime]
+
+    def load (self):
+        """Load the index file if it exists and matches the summary file. Returns True if successful"""
+        try:
+            with open(self.index_fn) as fp:
+                d = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return False
+        if d.get("file_stat") != self._file_stat():
+            return False
+        self.header = d["header"].encode()
+        self.blocks = d["blocks"]
+        return True
+
+    def build (self):
+        """Scan the summary file to define the blocks and save the index file next to it"""
+        file_stat = self._file_stat()
+        size = file_stat[0]
+        with open(self.fn, "rb") as fp:
+            self.header = fp.readline()
+        colnames = self.header.rstrip(b"\r\n").decode().split("\t")
+        if not "start_time" in colnames or not "run_id" in colnames:
+            raise pycoQCError ("Summary file {} cannot be indexed without start_time and run_id columns".format(self.fn))
+
+        # Define blocks aligned on line ends and collect the start_time range and run_ids of each of them
+        self.blocks = []
+        for start, stop in tsv_file_ranges(self.fn, max(1, size//self.block_size))[1]:
+            df = _read_tsv_range(self.fn, start, stop, self.header, usecols=["start_time", "run_id"], dtype={"run_id":"category"})
+            times = df["start_time"].dropna()
+            self.blocks.append({
+                "start":start,
+                "stop":stop,
+                "reads":len(df),
+                "min_time":float(times.min()) if len(times) else None,
+                "max_time":float(times.max()) if len(times) else None,
+                "run_ids":[str(i) for i in df["run_id"].dropna().unique()]})
+
+        # Failing to write the index is not fatal, it can be used in memory
+        try:
+            tmp_fn = self.index_fn+".tmp"
+            with open(tmp_fn, "w") as fp:
+                json.dump({"file_stat":file_stat, "header":self.header.decode(), "blocks":self.blocks}, fp)
+            rename(tmp_fn, self.index_fn)
+        except (IOError, OSError):
+            pass
+
+    def select (self, time_window=None, runid_list=None):
+        """
+        List the (start, stop) byte offsets of the blocks which can contain reads with a start_time within time_window and
+        one of the run_ids in runid_list. Blocks without start_time values are always selected
+        * time_window
+            (min, max) start_time in seconds. Not used if None
+        * runid_list
+            List of run_ids. Not used if empty or None
+        """
+        ranges = []
+        for block in self.blocks:
+            if time_window and block["min_time"] is not None and (block["max_time"] < time_window[0] or block["min_time"] > time_window[1]):
+                continue
+            if runid_list and not set(block["run_ids"]).intersection(runid_list):
+                continue
+            ranges.append((block["start"], block["stop"]))
+        return ranges
+
+    def iter_df (self, ranges, usecols=None, dtype=None):
+        """
+        Generator parsing the blocks listed in ranges. Yields a dataframe per block
+        * ranges
+            List of (start, stop) byte offsets returned by select
+        * usecols
+            Collection of column names to load. By default all the columns are loaded
+        * dtype
+            Dict of column names to dtype. By default dtypes are infered by pandas
+        """
+        for start, stop in ranges:
+            yield _read_tsv_range(self.fn, start, stop, self.header, usecols=usecols, dtype=dtype)
+
+def read_tsv_file_arrow (fn, usecols=None, dtype=None, threads=1):
+    """
+    Read a tabulated file in a dataframe with the multithreaded CSV reader of pyarrow. Compressed files are decompressed as for
+    the pandas reader. Integer columns containing NA values are returned as floats, and category columns as categoricals
+    * fn
+        Path to the file to read
+    * usecols
+        Collection of column names to load. Names absent from the file header are ignored
+    * dtype
+        Dict of column names to dtype. Names absent from the file header are ignored
+    * threads
+        If > 1, the file is parsed with the pyarrow thread pool and decompressed with threads threads
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv
+    except ImportError:
+        raise pycoQCError ("The arrow reader requires the pyarrow package")
+
+    # Integer columns containing NA values or written as floats cannot be parsed as integers
+    return _read_na_safe(lambda dtype: _read_tsv_arrow(fn, usecols, dtype, threads, pa, csv), dtype, errors=pa.ArrowInvalid)
+
+def _read_tsv_arrow (fn, usecols, dtype, threads, pa, csv):
+    """Parse fn with the pyarrow csv module csv. See read_tsv_file_arrow"""
+    with open_tsv_file(fn, threads=threads) as fp:
+        # Uncompressed files are opened as binary streams
+        if isinstance(fp, str):
+            fp = open(fp, "rb")
+        elif not hasattr(fp, "peek"):
+            fp = io.BufferedReader(fp)
+        with fp:
+            # Read the header line to select the columns present in the file
+            colnames = fp.readline().rstrip(b"\r\n").decode().split("\t")
+            include_columns = [c for c in colnames if usecols is None or c in usecols]
+            column_types = {}
+            for c in include_columns:
+                if dtype and c in dtype:
+                    column_types[c] = pa.dictionary(pa.int32(), pa.string()) if dtype[c] == "category" else pa.from_numpy_dtype(np.dtype(dtype[c]))
+            table = csv.read_csv (fp,
+                read_options=csv.ReadOptions(column_names=colnames, use_threads=threads>1),
+                parse_options=csv.ParseOptions(delimiter="\t"),
+                convert_options=csv.ConvertOptions(include_columns=include_columns, column_types=column_types))
+    return table.to_pandas()
+
+def merge_files_to_df(fn_list, usecols=None, dtype=None, threads=1, reader="pandas"):
+    """
+    Read and concatenate a list of tabulated files in a single dataframe
+    * fn_list
+        List of paths to the files to read
+    * usecols
+        Collection of column names to load. By default all the columns are loaded
+    * dtype
+        Dict of column names to dtype. By default dtypes are infered by pandas
+    * threads
+        Number of worker processes used to read multiple files concurrently. For a single file, number of decompression threads
+        and of worker processes parsing byte ranges of large uncompressed files (see read_tsv_file)
+    * reader
+        Parser backend, "pandas" or "arrow" (see read_tsv_file)
+    """
     if len(fn_list) == 1:
-        df =  pd.read_csv(fn_list[0], sep ="\t")
+        df = read_tsv_file(fn_list[0], usecols=usecols, dtype=dtype, threads=threads, reader=reader)
 
     else:
-        df_list = []
-        for fn in fn_list:
-            df_list.append (pd.read_csv(fn, sep ="\t"))
-        df = pd.concat(df_list, ignore_index=True, sort=False, join="inner")
+        if threads > 1 and reader == "pandas":
+            # Pool.starmap returns the results in the same order as fn_list
+            decompress_threads = max(1, threads//len(fn_list))
+            with mp.Pool(min(threads, len(fn_list))) as pool:
+                df_list = pool.starmap(read_tsv_file, [(fn, usecols, dtype, decompress_threads) for fn in fn_list])
+        else:
+            df_list = []
+            for fn in fn_list:
+                df_list.append (read_tsv_file(fn, usecols=usecols, dtype=dtype, threads=threads, reader=reader))
+        df = concat_df_list(df_list)
 
     if len(df) == 0:
         raise pycoQCError ("No valid read found in input file")
 
     return df
 
+def concat_df_list (df_list):
+    """
+    Concatenate a list of dataframes in preallocated columns, keeping only the columns found in all of them.
+    The dataframes are removed from df_list and released as soon as they are copied.
+    * df_list
+        List of dataframes to concatenate
+    """
+    # Define common columns and their dtypes. Categorical columns are merged directly on their integer codes
+    colnames = [c for c in df_list[0].columns if all(c in df for df in df_list[1:])]
+    n = sum(len(df) for df in df_list)
+    col_dict = OrderedDict()
+    for c in colnames:
+        if any(pd.api.types.is_categorical_dtype(df[c]) for df in df_list):
+            col_dict[c] = union_categoricals([df[c].astype("category") for df in df_list], sort_categories=True)
+        else:
+            col_dict[c] = np.empty(n, dtype=np.result_type(*[df[c].dtype for df in df_list]))
+
+    # Fill the other columns in file order and only wrap them in a dataframe once filled
+    start = 0
+    while df_list:
+        sdf = df_list.pop(0)
+        stop = start+len(sdf)
+        for c, values in col_dict.items():
+            if isinstance(values, np.ndarray):
+                values[start:stop] = sdf[c].values
+        start = stop
+    return pd.DataFrame(col_dict)
+
+def category_counts (s):
+    """
+    Count the occurrences of each category of a categorical series with np.bincount on the integer codes.
+    Missing values are not counted
+    * s
+        Categorical pd.Series
+    """
+    codes = s.cat.codes.values
+    counts = np.bincount(codes[codes>=0], minlength=len(s.cat.categories))
+    return pd.Series(counts, index=s.cat.categories)
+
+def category_replace (s, values, new_value):
+    """
+    Replace the categories found in values by new_value in a categorical series by remapping the integer codes
+    * s
+        Categorical pd.Series
+    * values
+        List of values to replace
+    * new_value
+        Replacement value
+    """
+    categories = s.cat.categories
+    keep = ~categories.isin(values)
+    new_categories = categories[keep]
+    if not new_value in new_categories:
+        new_categories = new_categories.append(pd.Index([new_value]))
+
+    # Map old codes to new codes. Missing values (code -1) point to the appended -1
+    code_map = np.append(new_categories.get_indexer(categories.where(keep, new_value)), -1)
+    codes = code_map[s.cat.codes.values]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=new_categories), index=s.index, name=s.name)
+
+def category_fillna (s, value):
+    """
+    Fill missing values of a categorical series, adding value to the categories if needed
+    * s
+        Categorical pd.Series
+    * value
+        Value to use for missing values
+    """
+    if not value in s.cat.categories:
+        s = s.cat.add_categories([value])
+    return s.fillna(value)
+
+def sorted_runs_argsort (values):
+    """
+    Return the permutation sorting values in ascending order, or None if values are already sorted.
+    The values are split in runs that are already in ascending order, such as successive summary files or run_ids.
+    A single run is detected in one linear pass, without sorting. Otherwise the permutation is computed with a stable
+    argsort, a natural merge sort (timsort) in numpy, which merges the existing runs instead of fully sorting the values
+    * values
+        1D np.ndarray without missing values
+    """
+    if np.all(values[1:] >= values[:-1]):
+        return None
+    return np.argsort(values, kind="stable")
+
+# Positions of the hex characters in a canonical UUID string
+_UUID_HEX_POS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+
+def read_id_to_uint64 (read_ids):
+    """
+    Vectorised conversion of canonical lower case UUID read_ids to pairs of uint64 values (most and least significant
+    64 bits). Returns a (hi, lo) tuple of arrays, or None if any of the read_ids is not a canonical UUID
+    * read_ids
+        Array like of read_id strings
+    """
+    try:
+        b = np.asarray(read_ids).astype("S37")
+    except (UnicodeEncodeError, ValueError, TypeError):
+        return None
+    b = b.view(np.uint8).reshape(-1, 37)
+
+    # Verify the length and the position of the dashes
+    if b[:,36].any() or not (b[:,[8,13,18,23]] == ord("-")).all():
+        return None
+
+    # Convert hex characters to nibbles and pack them in 16 bytes
+    hex_lut = np.full(256, 255, dtype=np.uint8)
+    hex_lut[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16, dtype=np.uint8)
+    nibbles = hex_lut[b[:,_UUID_HEX_POS]]
+    if (nibbles == 255).any():
+        return None
+    packed = np.ascontiguousarray((nibbles[:,0::2]<<4) | nibbles[:,1::2])
+    keys = packed.view(">u8").astype(np.uint64)
+    return (keys[:,0], keys[:,1])
+
+def uint64_to_read_id (hi, lo):
+    """
+    Vectorised conversion of pairs of uint64 values back to UUID read_id strings
+    * hi
+        Array of most significant 64 bits
+    * lo
+        Array of least significant 64 bits
+    """
+    packed = np.stack([hi, lo], axis=1).astype(">u8").view(np.uint8).reshape(-1, 16)
+    hex_chars = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    b = np.full((len(packed), 36), ord("-"), dtype=np.uint8)
+    b[:,_UUID_HEX_POS[0::2]] = hex_chars[packed>>4]
+    b[:,_UUID_HEX_POS[1::2]] = hex_chars[packed&15]
+    return b.view("S36").ravel().astype(str).astype(object)
+
+# Keys of the 2 independent hash functions applied to non encoded read_ids
+_READ_ID_HASH_KEYS = ("pycoQC_read_id_0", "pycoQC_read_id_1")
+
+def read_id_hash (read_ids):
+    """
+    Hash read_id strings to pairs of independent uint64 values. Returns a (hi, lo) tuple of arrays
+    * read_ids
+        Array like of read_id strings
+    """
+    read_ids = np.asarray(read_ids, dtype=object)
+    return tuple(pd.util.hash_array(read_ids, hash_key=k, categorize=False) for k in _READ_ID_HASH_KEYS)
+
+def read_id_key (hi, lo):
+    """
+    Mix pairs of uint64 values encoding read_ids (see read_id_to_uint64 and read_id_hash) in single uint64 hash keys
+    * hi
+        Array of most significant 64 bits
+    * lo
+        Array of least significant 64 bits
+    """
+    return hi ^ (lo*np.uint64(0x9E3779B97F4A7C15))
+
+class duplicate_read_ids ():
+    """
+    Streaming detection of duplicated read_ids over successive batches of reads. Each read_id registered is stored as
+    a single 64 bits hash (8 bytes per read) in a few sorted arrays of geometrically increasing sizes, merged as they grow.
+    With verify, a second 64 bits value is stored (16 bytes per read) and used to verify the duplicates found on the hash.
+    Read_ids given as pairs of uint64 (see read_id_to_uint64) are then compared exactly, while read_id strings are compared
+    on 2 independent 64 bits hashes
+    """
+    def __init__ (self, verify=False):
+        """
+        * verify
+            If True, verify the duplicates found on the 64 bits hashes
+        """
+        self.verify = verify
+        self.counts = OrderedDict()
+        self._runs = []
+
+    def __len__ (self):
+        return sum(len(key) for key, lo in self._runs)
+
+    def add (self, read_ids, label=None):
+        """
+        Register a batch of read_ids and return a boolean array flagging the duplicated read_ids, either already registered
+        in a previous batch or repeated in the batch. The first occurrence is not flagged
+        * read_ids
+            Array like of read_id strings, or (hi, lo) tuple of uint64 arrays
+        * label
+            Name of the input under which the number of duplicates is counted in self.counts
+        """
+        hi, lo = read_ids if isinstance(read_ids, tuple) else read_id_hash(read_ids)
+        key = read_id_key(hi, lo)
+
+        # Duplicates within the batch
+        if self.verify:
+            duplicated = pd.DataFrame({"key":key, "lo":lo}).duplicated(keep="first").values
+        else:
+            duplicated = pd.Index(key).duplicated(keep="first")
+
+        # Duplicates of the previous batches
+        for run_key, run_lo in self._runs:
+            left = np.searchsorted(run_key, key, side="left")
+            right = np.searchsorted(run_key, key, side="right")
+            found = right > left
+            if self.verify:
+                # Hash collisions between distinct read_ids are rare, so all the keys matching the hash are only checked for them
+                found[found] = run_lo[left[found]] == lo[found]
+                for i in np.nonzero(~found & (right-left > 1))[0]:
+                    found[i] = lo[i] in run_lo[left[i]:right[i]]
+            duplicated |= found
+
+        # Register the new read_ids and merge the runs of similar sizes
+        new = ~duplicated
+        self._add_run(key[new], lo[new] if self.verify else None)
+
+        n = int(duplicated.sum())
+        if label is not None:
+            self.counts[label] = self.counts.get(label, 0)+n
+        return duplicated
+
+    def _add_run (self, key, lo):
+        order = np.argsort(key, kind="stable")
+        self._runs.append((key[order], lo[order] if lo is not None else None))
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= 2*len(self._runs[-1][0]):
+            (key1, lo1), (key2, lo2) = self._runs.pop(-2), self._runs.pop(-1)
+            key = np.concatenate([key1, key2])
+            order = np.argsort(key, kind="stable")
+            self._runs.append((key[order], np.concatenate([lo1, lo2])[order] if lo1 is not None else None))
+
+def write_df_columns (df, outdir):
+    """
+    Write each column of a dataframe in a separate NumPy .npy file in outdir. Object columns are factorised and
+    written as integer codes + utf-8 encoded unique values. Categorical columns are written as codes + categories.
+    * df
+        Dataframe to write. The index is not saved
+    * outdir
+        Path to the output directory
+    """
+    mkdir(outdir, exist_ok=True)
+    col_types = OrderedDict()
+    for col in df.columns:
+        prefix = path.join(outdir, col)
+        if pd.api.types.is_categorical_dtype(df[col]):
+            codes = df[col].cat.codes.values
+            uniques = df[col].cat.categories
+            col_types[col] = "category"
+        elif df[col].dtype == object:
+            codes, uniques = pd.factorize(df[col])
+            col_types[col] = "object"
+        else:
+            np.save(prefix+".npy", df[col].values)
+            col_types[col] = "numeric"
+            continue
+        np.save(prefix+".codes.npy", codes)
+        np.save(prefix+".uniques.npy", pd.Series(uniques, dtype=object).str.encode("utf-8").values.astype("S"))
+
+    with open(path.join(outdir, "columns.json"), "w") as fp:
+        json.dump(col_types, fp)
+
+def read_df_columns (indir, index_col=None, mmap=False):
+    """
+    Read a dataframe written with write_df_columns
+    * indir
+        Path to the directory containing the column files
+    * index_col
+        Name of a column to use as the index of the dataframe, if found
+    * mmap
+        If True numeric columns are memory-mapped read-only instead of being loaded in memory. The column files are
+        then paged in on demand when the data are accessed
+    """
+    with open(path.join(indir, "columns.json")) as fp:
+        col_types = json.load(fp, object_pairs_hook=OrderedDict)
+
+    col_dict = OrderedDict()
+    for col, col_type in col_types.items():
+        prefix = path.join(indir, col)
+        if col_type == "numeric":
+            col_dict[col] = np.load(prefix+".npy", mmap_mode="r" if mmap else None)
+        else:
+            codes = np.load(prefix+".codes.npy")
+            uniques = pd.Series(np.load(prefix+".uniques.npy")).str.decode("utf-8")
+            if col_type == "category":
+                col_dict[col] = pd.Categorical.from_codes(codes, categories=uniques)
+            else:
+                # Missing values are encoded as -1 and point to the appended NaN
+                uniques = np.append(uniques.values, np.nan)
+                col_dict[col] = uniques[codes]
+
+    # Build the index and the dataframe without copying the memory-mapped columns. With copy=False, the columns of a dict are not
+    # consolidated in new blocks since pandas 1.3
+    index = pd.Index(col_dict.pop(index_col), name=index_col) if index_col in col_dict else None
+    return pd.DataFrame(col_dict, index=index, copy=False)
+
+def dir_size (dir):
+    """Total size in bytes of the files in a directory tree"""
+    size = 0
+    for root, _, files in walk(dir):
+        for fn in files:
+            size += stat(path.join(root, fn)).st_size
+    return size
+
+def evict_lru_dirs (dir, max_size, keep=[]):
+    """
+    Remove the least recently used subdirectories of dir until the total size is below max_size.
+    Subdirectories access times are tracked through their modification time.
+    * dir
+        Path to the directory containing the subdirectories to evict
+    * max_size
+        Maximal total size in bytes
+    * keep
+        List of subdirectory names that should never be evicted
+    """
+    entries = []
+    for name in listdir(dir):
+        fn = path.join(dir, name)
+        if path.isdir(fn):
+            entries.append((stat(fn).st_mtime, name, dir_size(fn)))
+    total = sum(e[2] for e in entries)
+
+    for mtime, name, size in sorted(entries):
+        if total <= max_size:
+            break
+        if name in keep:
+            continue
+        shutil.rmtree(path.join(dir, name), ignore_errors=True)
+        total -= size
+
 def mkdir (fn, exist_ok=False):
-    """ Create directory recursivelly. Raise IO error if path exist or if error at creation """
+    """ Create directory recursivelly. Raise pycoQCError if path exist or if error at creation """
     try:
         makedirs (fn, exist_ok=exist_ok)
     except:
-        raise pycoMethError ("Error creating output folder `{}`".format(fn))
+        raise pycoQCError ("Error creating output folder `{}`".format(fn))
 
 def mkbasedir (fn, exist_ok=False):
-    """ Create directory for a given file recursivelly. Raise IO error if path exist or if error at creation """
+    """ Create directory for a given file recursivelly. Raise pycoQCError if path exist or if error at creation """
     dir_fn = path.dirname(fn)
     if dir_fn:
         mkdir (dir_fn, exist_ok=True)
@@ -6,12 +6,13 @@
 from collections import *
 import warnings
 import datetime
+import time
 
 # Local lib import
 from pycoQC.common import *
 from pycoQC.pycoQC_parse import pycoQC_parse
 from pycoQC.pycoQC_plot import pycoQC_plot
-from pycoQC.pycoQC_report import pycoQC_report
+from pycoQC.pycoQC_report import pycoQC_report, get_config
 from pycoQC import __name__ as package_name
 from pycoQC import __version__ as package_version
 
@@ -25,13 +26,29 @@ def pycoQC (
     summary_file:str,
     barcode_file:str="",
     bam_file:str="",
+    write_bam_sidecar:bool=True,
+    bam_sample:bool=False,
+    bam_extra_sample:int=100000,
     runid_list:list=[],
+    time_window:list=None,
+    summary_index:bool=False,
     filter_calibration:bool=False,
     filter_duplicated:bool=False,
+    verify_duplicates:bool=False,
     min_barcode_percent:float=0.1,
     min_pass_qual:float=7,
     min_pass_len:int=0,
     sample:int=100000,
+    chunk_size:int=0,
+    preview:bool=False,
+    threads:int=1,
+    reader:str="pandas",
+    watch:bool=False,
+    watch_interval:float=60,
+    cache_dir:str="",
+    cache_max_size:float=10,
+    memory_map:bool=False,
+    read_ids:str="string",
     html_outfile:str="",
     report_title:str="PycoQC report",
     config_file:str="",
@@ -49,15 +66,33 @@ def pycoQC (
         One can also pass multiple space separated file paths or a UNIX style regex matching multiple files
     * bam_file
         Path to a Bam file corresponding to reads in the summary_file. Preferably aligned with Minimap2
-        One can also pass multiple space separated file paths or a UNIX style regex matching multiple files
+        One can also pass multiple space separated file paths or a UNIX style regex matching multiple files.
+        Sorted and indexed bam files are parsed faster, but unsorted bam or sam files are also accepted, as well as "-" to read
+        the alignments from the standard input
+    * write_bam_sidecar
+        If True, the alignment stats extracted from each bam file are saved in a sidecar directory next to it, and reused by the
+        next runs as long as the bam file and its index are unchanged
+    * bam_sample
+        If True, the alignment types of all the reads are counted exactly, but the per read alignment stats are only extracted for the
+        reads of the plotting samples (see sample) and bam_extra_sample other random reads, from which the alignment summaries are
+        estimated. Not available in streaming mode
+    * bam_extra_sample
+        Number of reads sampled in addition to the plotting sample to estimate the alignment summaries, with bam_sample
     * runid_list
         Select only specific runids to be analysed. Can also be used to force pycoQC to order the runids for
         temporal plots, if the sequencing_summary file contain several sucessive runs. By default pycoQC analyses
         all the runids in the file and uses the runid order as defined in the file.
+    * time_window
+        Select only the reads with a start_time within a [min, max] time window, in hours from the start of their run
+    * summary_index
+        If True, build a sidecar index next to each uncompressed summary file. Existing up to date indexes are always reused to
+        only parse the blocks of lines that can contain reads selected with time_window or runid_list
     * filter_calibration
         If True read flagged as calibration strand by the software are removed
     * filter_duplicated
         If True duplicated read_ids are removed but the first occurence is kept (Guppy sometimes outputs the same read multiple times)
+    * verify_duplicates
+        If True, the duplicated read_ids found using 64 bits hashes of the read_ids are verified with a second 64 bits value
     * min_barcode_percent
         Minimal percent of total reads to retain barcode label. If below the barcode value is set as `unclassified`.
     * min_pass_qual
@@ -66,6 +101,34 @@ def pycoQC (
         Minimum read length to consider a read as 'pass'
     * sample
         If not None a n number of reads will be randomly selected instead of the entire dataset for ploting function (deterministic sampling)
+    * chunk_size
+        If > 0, enable the bounded memory streaming mode. Summary files are parsed by chunks of chunk_size lines and folded into
+        exact aggregates, and only a random sample of reads is kept in memory
+    * preview
+        If True, fast preview of the summary files in streaming mode. The reads and bases counts are exact but the reads are sampled
+        per runid and the distributions are estimated from the sample. Requires streaming mode (chunk_size)
+    * threads
+        Number of worker processes used to parse multiple summary or barcode files concurrently, or byte ranges of a single large
+        uncompressed file
+    * reader
+        Parser backend used to read the summary and barcode files outside of streaming mode, "pandas" or "arrow" (requires pyarrow)
+    * watch
+        If True, pycoQC keeps running and the lines appended to the uncompressed summary files are parsed every watch_interval
+        seconds and folded into the existing aggregates before regenerating the reports. Requires streaming mode (chunk_size).
+        The summary files can be initially empty, the reports are then only generated once valid reads were appended
+    * watch_interval
+        Time in seconds between 2 updates of the reports in watch mode
+    * cache_dir
+        If given, the cleaned data are saved in a columnar cache in this directory, and reloaded by later runs with the
+        same input files and parsing options
+    * cache_max_size
+        Maximal size of the cache directory in GB. The least recently used entries are evicted first
+    * memory_map
+        If True, the reads table is memory-mapped from the cache entry column files instead of being loaded in memory.
+        Requires cache_dir
+    * read_ids
+        Representation of the read_ids in the parsed reads table: "string", "binary" (2 uint64 columns) or "none" (discarded).
+        "none" avoids loading the read_ids if no barcode or bam merge or duplicate filtering is needed
     * html_outfile
         Path to an output html file report
     * report_title
@@ -94,13 +157,29 @@ def pycoQC (
     logger.warning ("Checking arguments values")
 
     # Save all verified values + type
+    write_bam_sidecar = check_arg("write_bam_sidecar", write_bam_sidecar, required_type=bool, allow_none=False)
+    bam_sample = check_arg("bam_sample", bam_sample, required_type=bool, allow_none=False)
+    bam_extra_sample = check_arg("bam_extra_sample", bam_extra_sample, required_type=int, min=0, allow_none=False)
     runid_list = check_arg("runid_list", runid_list, required_type=list, allow_none=True)
+    time_window = check_arg("time_window", time_window, required_type=list, allow_none=True)
+    summary_index = check_arg("summary_index", summary_index, required_type=bool, allow_none=False)
     filter_calibration = check_arg("filter_calibration", filter_calibration, required_type=bool, allow_none=False)
     filter_duplicated = check_arg("filter_duplicated", filter_duplicated, required_type=bool, allow_none=False)
+    verify_duplicates = check_arg("verify_duplicates", verify_duplicates, required_type=bool, allow_none=False)
     min_barcode_percent = check_arg("min_barcode_percent", min_barcode_percent, required_type=float, min=0, max=100, allow_none=False)
     min_pass_qual = check_arg("min_pass_qual", min_pass_qual, required_type=float, min=0, max=60, allow_none=False)
     min_pass_len = check_arg("min_pass_len", min_pass_len, required_type=int, min=0, allow_none=False)
     sample = check_arg("sample", sample, required_type=int, min=0, allow_none=True)
+    chunk_size = check_arg("chunk_size", chunk_size, required_type=int, min=0, allow_none=False)
+    preview = check_arg("preview", preview, required_type=bool, allow_none=False)
+    threads = check_arg("threads", threads, required_type=int, min=1, allow_none=False)
+    reader = check_arg("reader", reader, required_type=str, allow_none=False, choices=TSV_READERS)
+    watch = check_arg("watch", watch, required_type=bool, allow_none=False)
+    watch_interval = check_arg("watch_interval", watch_interval, required_type=float, min=0, allow_none=False)
+    cache_dir = check_arg("cache_dir", cache_dir, required_type=str, allow_none=True)
+    cache_max_size = check_arg("cache_max_size", cache_max_size, required_type=float, min=0, allow_none=False)
+    memory_map = check_arg("memory_map", memory_map, required_type=bool, allow_none=False)
+    read_ids = check_arg("read_ids", read_ids, required_type=str, allow_none=False, choices=["string", "binary", "none"])
     html_outfile = check_arg("html_outfile", html_outfile, required_type=str, allow_none=True)
     html_outfile = check_arg("html_outfile", html_outfile, required_type=str, allow_none=True)
     report_title = check_arg("report_title", report_title, required_type=str, allow_none=True)
@@ -114,21 +193,87 @@ def pycoQC (
     logger.debug("Runtime options")
     logger.debug(dict_to_str(options_d))
 
+    # Only load the columns and files used by the plotting methods of the reports
+    colnames = None
+    if html_outfile or json_outfile:
+        method_names = list(get_config(config_file).keys()) if html_outfile else []
+        if json_outfile:
+            method_names.append("summary_stats_dict")
+        colnames = pycoQC_plot.required_colnames(method_names)
+        logger.debug("Optional columns used by the reports: {}".format(" ".join(colnames)))
+
     #~~~~~~~~~~pycoQC_parse~~~~~~~~~~#
     parser = pycoQC_parse (
         summary_file=summary_file,
         barcode_file=barcode_file,
         bam_file=bam_file,
+        write_bam_sidecar=write_bam_sidecar,
+        bam_sample=bam_sample,
+        bam_extra_sample=bam_extra_sample,
         runid_list=runid_list,
+        time_window=time_window,
+        summary_index=summary_index,
         filter_calibration=filter_calibration,
         filter_duplicated=filter_duplicated,
+        verify_duplicates=verify_duplicates,
         min_barcode_percent=min_barcode_percent,
+        chunk_size=chunk_size,
+        min_pass_qual=min_pass_qual,
+        min_pass_len=min_pass_len,
+        sample=sample,
+        preview=preview,
+        threads=threads,
+        reader=reader,
+        watch=watch,
+        cache_dir=cache_dir,
+        cache_max_size=cache_max_size,
+        memory_map=memory_map,
+        read_ids=read_ids,
+        colnames=colnames,
         verbose=verbose,
         quiet=quiet)
 
     logger.debug("Parser stats")
     logger.debug(parser)
 
+    report_kwargs = dict (
+        min_pass_qual=min_pass_qual,
+        min_pass_len=min_pass_len,
+        sample=sample,
+        html_outfile=html_outfile,
+        report_title=report_title,
+        config_file=config_file,
+        template_file=template_file,
+        json_outfile=json_outfile,
+        verbose=verbose,
+        quiet=quiet)
+
+    # In watch mode, the reports are only generated once valid reads were found in the summary files
+    plotter = None
+    if parser.reads_df.empty:
+        logger.warning ("No valid read found yet in the summary files. The reports will be generated when reads are added")
+    else:
+        plotter = _write_reports (parser, **report_kwargs)
+
+    #~~~~~~~~~~Watch mode~~~~~~~~~~#
+    if watch:
+        try:
+            while True:
+                logger.warning ("Waiting {} seconds for new reads (Ctrl+C to stop)".format(watch_interval))
+                time.sleep(watch_interval)
+                if parser.update() and not parser.reads_df.empty:
+                    plotter = _write_reports (parser, **report_kwargs)
+        except KeyboardInterrupt:
+            logger.warning ("Stop watching summary files")
+
+    #~~~~~~~~~~return plotting object for API~~~~~~~~~~#
+    return plotter
+
+def _write_reports (parser, min_pass_qual, min_pass_len, sample, html_outfile, report_title, config_file, template_file,
+    json_outfile, verbose, quiet):
+    """Generate the plots and write the html and json reports from a parser object"""
+    logger = get_logger (name=__name__, verbose=verbose, quiet=quiet)
+
     #~~~~~~~~~~pycoQC_plot~~~~~~~~~~#
     plotter = pycoQC_plot(
         parser=parser,
@@ -161,5 +306,4 @@ def pycoQC (
             reporter.json_report(
                 outfile=json_outfile)
 
-    #~~~~~~~~~~return plotting object for API~~~~~~~~~~#
     return plotter
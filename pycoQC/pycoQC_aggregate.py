@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~IMPORTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+# Standard library imports
+from collections import *
+import warnings
+
+# Third party imports
+import numpy as np
+import pandas as pd
+
+# Local lib import
+from pycoQC.common import *
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~GLOBAL SETTINGS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+# Set seed for deterministic random sampling
+SEED = 42
+
+# Silence futurewarnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# Resolution of the per run start_time histograms in seconds
+TIME_BIN_SIZE = 10
+
+# Float fields are counted after rounding to a fixed number of decimals
+FIELD_DECIMALS = {"mean_qscore":3, "identity_freq":4}
+
+# Alignment fields summed over all the aligned reads
+ALIGNMENT_SUM_FIELDS = ["align_len", "insertion", "deletion", "mismatch", "soft_clip"]
+
+# Fields summed over the reads with complete alignment information
+ALIGNMENT_RATE_FIELDS = ["read_len", "align_len", "insertion", "deletion", "soft_clip", "mismatch"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN CLASS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+class pycoQC_aggregate ():
+
+    def __init__ (self,
+        min_pass_qual:float=7,
+        min_pass_len:int=0,
+        sample:int=100000,
+        preview:bool=False):
+        """
+        Fold chunks of cleaned reads into exact running aggregates for all and pass reads,
+        and maintain a uniform random sample of the reads for the plotting functions.
+        * min_pass_qual
+            Minimum quality to consider a read as 'pass'
+        * min_pass_len
+            Minimum read length to consider a read as 'pass'
+        * sample
+            Number of reads to retain in the random sample
+        * preview
+            If True, only the reads and bases counts and the start_time range per runid are aggregated exactly. The sample is
+            stratified by runid and the other aggregates are estimated from the sample reads weighted by the runid sampling rate
+        """
+        self.min_pass_qual = min_pass_qual
+        self.min_pass_len = min_pass_len
+        self.sample = sample
+        self.preview = preview
+        self.runid_offset = OrderedDict()
+        self.unset_barcode_list = []
+
+        self.stats = OrderedDict ()
+        self.stats["all"] = _reads_stats (self)
+        self.stats["pass"] = _reads_stats (self)
+
+        self._sample_df = pd.DataFrame()
+        self._random = np.random.RandomState(seed=SEED)
+
+    def __getitem__ (self, df_level):
+        return self.stats[df_level]
+
+    def __repr__(self):
+        return "[{}]\n".format(self.__class__.__name__)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~PUBLIC METHODS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+    def add_reads (self, df):
+        """
+        Fold a chunk of cleaned reads in the aggregates and in the random sample
+        Start times are expected to be the raw values, before runid reordering
+        * df
+            Dataframe of cleaned reads
+        """
+        if df.empty:
+            return
+        pass_df = df[self._is_pass(df)]
+        self.stats["all"].add_reads(df, exact_only=self.preview)
+        self.stats["pass"].add_reads(pass_df, exact_only=self.preview)
+        self._sample_reads(df)
+
+    def runid_stats (self):
+        """Return a dataframe with the number of reads and the start_time range per runid"""
+        return self.stats["all"].runid_df
+
+    def unset_barcodes (self, barcode_list):
+        """
+        Relabel the reads with barcodes in barcode_list as `unclassified` in the aggregates and in the sample.
+        The raw barcode counts are preserved, so that the list can be redefined when more reads are added
+        * barcode_list
+            List of barcodes to unset
+        """
+        self.unset_barcode_list = list(barcode_list)
+
+    def set_runid_offset (self, runid_offset):
+        """
+        Save the start_time offsets per runid used to order successive runs
+        * runid_offset
+            Dict of runid to time offset in seconds
+        """
+        self.runid_offset = runid_offset
+
+    def estimate_stats (self):
+        """
+        In preview mode, draw the stratified sample from the runid reservoirs and estimate the value counts, sums and
+        start_time bins of all and pass reads from the sample reads weighted by the runid sampling rate
+        """
+        if not self.preview:
+            return
+        df = self._stratified_sample_df()
+        self.stats["all"].add_reads(df, weights=df["_sample_weight"], estimate_only=True)
+        pass_df = df[self._is_pass(df)]
+        self.stats["pass"].add_reads(pass_df, weights=pass_df["_sample_weight"], estimate_only=True)
+        self._stratified_df = df
+
+    def get_sample_df (self):
+        """Return the random sample of reads with start_time offsets applied and barcodes unset, sorted by start_time"""
+        if self.preview:
+            df = self._stratified_df.drop(columns="_sample_weight")
+        else:
+            df = self._sample_df
+        df = df.drop(columns="_sample_key")
+        df["start_time"] += df["run_id"].map(self.runid_offset).astype("float32")
+        if "barcode" in df:
+            df["barcode"] = category_replace(df["barcode"].astype("category"), self.unset_barcode_list, "unclassified")
+        return df.sort_values("start_time")
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~PRIVATE METHODS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+    def _is_pass (self, df):
+        return (df["mean_qscore"]>=self.min_pass_qual) & (df["read_len"]>=self.min_pass_len)
+
+    def _sample_reads (self, df):
+        """
+        Reservoir sampling by retaining the reads with the smallest random keys.
+        In preview mode, a reservoir of the sample size is maintained for each runid
+        """
+        df = df.assign (_sample_key=self._random.random_sample(len(df)))
+        if not self._sample_df.empty:
+            df = pd.concat([self._sample_df, df], ignore_index=True, sort=False)
+        if self.preview:
+            df = df.sort_values("_sample_key")
+            df = df[df.groupby("run_id", sort=False, observed=True).cumcount().values < self.sample]
+        elif len(df) > self.sample:
+            df = df.nsmallest(self.sample, "_sample_key")
+        self._sample_df = df
+
+    def _stratified_sample_df (self):
+        """
+        Sample from each runid reservoir a number of reads proportional to the runid reads count (at least 1), as in
+        sequencing_summary_file_sample. The sampling rate of the runid is saved in _sample_weight
+        """
+        runid_reads = self.stats["all"].runid_df["reads"]
+        n_to_sample = (runid_reads/runid_reads.sum()*self.sample).round().clip(lower=1).astype(np.int64)
+        df = self._sample_df
+        run_id = df["run_id"].astype(object)
+        df = df[df.groupby(run_id, sort=False).cumcount().values < run_id.map(n_to_sample).values]
+        run_id = df["run_id"].astype(object)
+        weight = run_id.map(runid_reads)/run_id.map(run_id.value_counts())
+        return df.assign (_sample_weight=weight.values.astype(np.float64))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~HELPER CLASS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+class _reads_stats ():
+    """Exact running aggregates for a given read level (all or pass)"""
+
+    def __init__ (self, aggregate):
+        self.aggregate = aggregate
+        self.reads = 0
+        self.bases = 0
+        self.runid_df = pd.DataFrame(columns=["reads", "min_time", "max_time"])
+        self.counts = OrderedDict()
+        self.sums = pd.Series(dtype="float64")
+        self.rate_sums = pd.Series(dtype="float64")
+        self.time_counts = OrderedDict()
+
+    def add_reads (self, df, weights=None, exact_only=False, estimate_only=False):
+        """
+        Fold a chunk of reads into the aggregates
+        * weights
+            Optional pd.Series of weights of the reads for the value counts, sums and start_time bins
+        * exact_only
+            Only aggregate the reads and bases counts and the start time range per runid
+        * estimate_only
+            Reset and only compute the value counts, sums and start_time bins
+        """
+        if estimate_only:
+            self.counts = OrderedDict()
+            self.sums = pd.Series(dtype="float64")
+            self.rate_sums = pd.Series(dtype="float64")
+            self.time_counts = OrderedDict()
+        if df.empty:
+            return
+
+        if not estimate_only:
+            self.reads += len(df)
+            self.bases += int(df["read_len"].values.sum(dtype=np.int64))
+
+            # Reads and start time range per runid
+            rdf = df.groupby("run_id", sort=False, observed=True)["start_time"].agg(["count", "min", "max"])
+            rdf.columns = ["reads", "min_time", "max_time"]
+            rdf.index = rdf.index.astype(object)
+            if self.runid_df.empty:
+                self.runid_df = rdf
+            else:
+                rdf = pd.concat([self.runid_df, rdf], sort=False).groupby(level=0, sort=False)
+                self.runid_df = rdf.agg({"reads":"sum", "min_time":"min", "max_time":"max"})
+
+        if exact_only:
+            return
+
+        # Value counts of discrete and rounded fields
+        for field in ("read_len", "mean_qscore", "channel", "barcode", "align_len", "identity_freq"):
+            if field in df:
+                self._add_counts(field, df[field], weights)
+
+        # Alignment sums
+        fields = [f for f in ALIGNMENT_SUM_FIELDS if f in df]
+        if fields:
+            self.sums = self.sums.add(_weighted_sum(df[fields], weights), fill_value=0)
+        if all(f in df for f in ALIGNMENT_RATE_FIELDS):
+            self.rate_sums = self.rate_sums.add(_weighted_sum(df[ALIGNMENT_RATE_FIELDS].dropna(), weights), fill_value=0)
+
+        # Reads and bases per start_time bins for each runid
+        for run_id, sdf in df.groupby("run_id", sort=False, observed=True):
+            t = (sdf["start_time"].values//TIME_BIN_SIZE).astype(np.int64)
+            w = None if weights is None else weights[sdf.index].values
+            reads = np.bincount(t, weights=w)
+            bases = np.bincount(t, weights=sdf["read_len"].values if w is None else sdf["read_len"].values*w)
+            if run_id in self.time_counts:
+                prev_reads, prev_bases = self.time_counts[run_id]
+                n = max(len(reads), len(prev_reads))
+                reads = np.pad(reads, (0, n-len(reads)))+np.pad(prev_reads, (0, n-len(prev_reads)))
+                bases = np.pad(bases, (0, n-len(bases)))+np.pad(prev_bases, (0, n-len(prev_bases)))
+            self.time_counts[run_id] = (reads, bases)
+
+    def _add_counts (self, field, data, weights=None):
+        if field in FIELD_DECIMALS:
+            data = data.round(FIELD_DECIMALS[field])
+        if weights is not None:
+            # Estimated counts are rounded to the nearest integer
+            counts = weights.groupby(data.values, observed=True).sum().round()
+            counts = counts[counts>0]
+        elif pd.api.types.is_categorical_dtype(data):
+            counts = category_counts(data)
+            counts = counts[counts>0]
+        else:
+            counts = data.value_counts()
+        if field in self.counts:
+            counts = self.counts[field].add(counts, fill_value=0)
+        self.counts[field] = counts.astype(np.int64)
+
+    #~~~~~~~STATS METHODS~~~~~~~#
+
+    def field_counts (self, field):
+        """Return the value counts of a field sorted by value. Unset barcodes are merged into the unclassified counts"""
+        counts = self.counts.get(field, pd.Series(dtype=np.int64))
+        if field == "barcode":
+            low = counts.index.isin(self.aggregate.unset_barcode_list)
+            if low.any():
+                n = counts[low].sum()
+                counts = counts[~low]
+                counts["unclassified"] = counts.get("unclassified", 0)+n
+        return counts.sort_index()
+
+    def run_duration (self):
+        runid_df = self.runid_df
+        offset = runid_df.index.map(lambda r: self.aggregate.runid_offset.get(r, 0)).values
+        return float(((runid_df["max_time"]+offset).max()-(runid_df["min_time"]+offset).min())/3600)
+
+    def active_channels (self):
+        return int((self.field_counts("channel")>0).sum())
+
+    def runid_number (self):
+        return len(self.runid_df)
+
+    def barcodes_number (self):
+        return int((self.field_counts("barcode")>0).sum())
+
+    def sum (self, field):
+        return self.sums.get(field, 0)
+
+    def N50 (self, field):
+        return counts_N50 (self.field_counts(field))
+
+    def median (self, field):
+        return counts_quantile (self.field_counts(field), 0.5)
+
+    def percentiles (self, field):
+        return list(counts_quantile (self.field_counts(field), np.linspace(0,1,101)))
+
+    def time_df (self):
+        """Return the reads and bases counts per start_time bins with runid offsets applied"""
+        l = []
+        for run_id, (reads, bases) in self.time_counts.items():
+            idx = np.nonzero(reads)[0]
+            offset = self.aggregate.runid_offset.get(run_id, 0)
+            l.append (pd.DataFrame({
+                "start_time":idx*TIME_BIN_SIZE+offset,
+                "reads":reads[idx],
+                "bases":bases[idx]}))
+        df = pd.concat(l, ignore_index=True)
+        return df.sort_values("start_time")
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FUNCTIONS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def _weighted_sum (df, weights=None):
+    """Column sums of df in float64, optionally weighted by a series of weights aligned on df index"""
+    df = df.astype(np.float64)
+    if weights is None:
+        return df.sum()
+    return df.mul(weights[df.index], axis=0).sum()
+
+def counts_quantile (counts, q):
+    """
+    Compute quantiles from value counts, equivalent to np.quantile with linear interpolation on the expanded values
+    * counts
+        pd.Series of counts indexed by sorted values
+    * q
+        Quantile or sequence of quantiles to compute
+    """
+    values = counts.index.values.astype(np.float64)
+    cum_counts = np.cumsum(counts.values)
+    pos = np.asarray(q)*(cum_counts[-1]-1)
+    lo = values[np.searchsorted(cum_counts, np.floor(pos), side="right")]
+    hi = values[np.searchsorted(cum_counts, np.ceil(pos), side="right")]
+    return lo+(hi-lo)*(pos-np.floor(pos))
+
+def counts_N50 (counts):
+    """
+    Compute the N50 from value counts
+    * counts
+        pd.Series of counts indexed by sorted values
+    """
+    values = counts.index.values
+    cum_sum = np.cumsum(values*counts.values)
+    return int(values[np.searchsorted(cum_sum, cum_sum[-1]/2)])
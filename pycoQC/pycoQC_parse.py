@@ -5,6 +5,9 @@
 # Standard library imports
 from collections import *
 import warnings
+import hashlib
+import json
+from array import array
 
 # Third party imports
 import numpy as np
@@ -13,25 +16,88 @@ import pysam as ps
 
 # Local lib import
 from pycoQC.common import *
+from pycoQC.pycoQC_aggregate import pycoQC_aggregate
+from pycoQC import __version__ as package_version
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~GLOBAL SETTINGS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 
 # Silence futurewarnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
+# Standardised names of the columns found in the different versions of sequencing summary files
+SUMMARY_COLNAMES_MAP = {
+    "sequence_length_template":"read_len",
+    "sequence_length_2d":"read_len",
+    "sequence_length":"read_len",
+    "mean_qscore_template":"mean_qscore",
+    "mean_qscore_2d":"mean_qscore",
+    "calibration_strand_genome_template":"calibration",
+    "barcode_arrangement":"barcode"}
+
+# Columns retained from the sequencing summary files and their final compact dtypes
+SUMMARY_REQUIRED_COLNAMES = ["read_id", "run_id", "channel", "start_time", "read_len", "mean_qscore"]
+SUMMARY_OPTIONAL_COLNAMES = ["calibration", "barcode"]
+SUMMARY_COLNAMES_DTYPE = {"channel":"uint16", "start_time":"float32", "read_len":"uint32", "mean_qscore":"float32",
+    "run_id":"category", "calibration":"category", "barcode":"category"}
+
+# Seed of the plotting samples, as in pycoQC_plot
+SEED = 42
+
+# Size of the regions of the large references parsed concurrently in the alignment files
+BAM_REGION_SIZE = 10000000
+
+# Columns of the reads extracted from the alignment files
+BAM_COLNAMES = ["ref_id", "ref_start", "ref_end", "align_len", "mapq", "insertion", "deletion", "soft_clip", "mismatch", "identity_freq"]
+
+# Typed arrays used to collect the alignment fields of the reads, before computing the derived fields
+BAM_ARRAY_TYPECODES = OrderedDict([("ref_id","i"), ("ref_start","I"), ("ref_end","I"), ("align_len","I"), ("mapq","B"),
+    ("insertion","I"), ("deletion","I"), ("soft_clip","I"), ("edit_dist","f")])
+
+# Lookup table of the base letters counted in MD tags
+_MD_BASES = np.zeros(256, dtype=np.int64)
+_MD_BASES[np.frombuffer(b"ATCGatcg", dtype=np.uint8)] = 1
+
+# Low cardinality string columns carried as integer coded categoricals
+CATEGORICAL_COLNAMES = ["run_id", "barcode", "calibration", "ref_id"]
+
+# Columns holding the UUID read_ids encoded as pairs of uint64
+READ_ID_COLNAMES = ["read_id_hi", "read_id_lo"]
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN CLASS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 class pycoQC_parse ():
 
+    # In memory input tables attached by from_frame before the initialisation, used instead of the input files
+    _frames = None
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~INIT METHOD~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
     def __init__ (self,
         summary_file:str,
         barcode_file:str="",
         bam_file:str="",
+        write_bam_sidecar:bool=True,
+        bam_sample:bool=False,
+        bam_extra_sample:int=100000,
         runid_list:list=[],
+        time_window:list=None,
+        summary_index:bool=False,
         filter_calibration:bool=False,
         filter_duplicated:bool=False,
+        verify_duplicates:bool=False,
         min_barcode_percent:float=0.1,
         cleanup:bool=True,
+        chunk_size:int=0,
+        min_pass_qual:float=7,
+        min_pass_len:int=0,
+        sample:int=100000,
+        preview:bool=False,
+        threads:int=1,
+        reader:str="pandas",
+        watch:bool=False,
+        cache_dir:str="",
+        cache_max_size:float=10,
+        memory_map:bool=False,
+        read_ids:str="string",
+        colnames:list=None,
         verbose:bool=False,
         quiet:bool=False):
         """
@@ -44,17 +110,80 @@ class pycoQC_parse ():
             One can also pass multiple space separated file paths or a UNIX style regex matching multiple files
         * bam_file
             Path to a Bam file corresponding to reads in the summary_file. Preferably aligned with Minimap2
-            One can also pass multiple space separated file paths or a UNIX style regex matching multiple files
+            One can also pass multiple space separated file paths or a UNIX style regex matching multiple files.
+            Sorted and indexed bam files are parsed faster, but unsorted bam or sam files are also accepted, as well as "-" to read
+            the alignments from the standard input
+        * write_bam_sidecar
+            If True, the alignment stats extracted from each bam file are saved in a sidecar directory next to it (bam_file.pycoqc_stats).
+            Up to date sidecar directories (same bam and index file sizes and modification times) are always reused instead of parsing the bam files
+        * bam_sample
+            If True, the alignment types of all the reads are counted exactly from their flags and the index statistics, but the per read
+            alignment stats are only extracted for the reads of the plotting samples drawn by pycoQC_plot (sample reads among all the reads
+            and among the pass reads, see min_pass_qual and min_pass_len) and bam_extra_sample other random reads. The reads of the
+            all reads plotting sample and the extra reads are flagged in the alignment_sample column of reads_df, and the alignment summaries
+            are estimated from them. Not available in streaming mode
+        * bam_extra_sample
+            Number of reads sampled in addition to the plotting sample to estimate the alignment summaries, with bam_sample
         * runid_list
             Select only specific runids to be analysed. Can also be used to force pycoQC to order the runids for
             temporal plots, if the sequencing_summary file contain several sucessive runs. By default pycoQC analyses
             all the runids in the file and uses the runid order as defined in the file.
+        * time_window
+            Select only the reads with a start_time within a [min, max] time window, in hours from the start of their run
+        * summary_index
+            If True, build a sidecar index next to each uncompressed summary file (see summary_file_index), recording the start_time
+            range and the runids of blocks of lines. Existing up to date indexes are always reused, so that only the blocks that can
+            contain reads selected with time_window or runid_list are parsed. Not used in watch mode
         * filter_calibration
             If True read flagged as calibration strand by the software are removed
         * filter_duplicated
             If True duplicated read_ids are removed but the first occurence is kept (Guppy sometimes outputs the same read multiple times)
+        * verify_duplicates
+            Duplicated read_ids in the summary, barcode and bam files are detected using 64 bits hashes of the read_ids (8 bytes per read).
+            If True, the duplicates are verified with a second 64 bits value (16 bytes per read), exact for UUID read_ids
         * min_barcode_percent
             Minimal percent of total reads to retain barcode label. If below the barcode value is set as `unclassified`.
+        * cleanup
+            If True the data are cleaned-up and the columns are standardised
+        * chunk_size
+            If > 0, enable the bounded memory streaming mode. The summary files are read by chunks of chunk_size lines which are
+            cleaned and folded into exact running aggregates (self.aggregate). self.reads_df then only contains a random sample of the reads.
+        * min_pass_qual
+            Minimum quality to consider a read as 'pass'. Only used in streaming mode and with bam_sample
+        * min_pass_len
+            Minimum read length to consider a read as 'pass'. Only used in streaming mode and with bam_sample
+        * sample
+            Number of reads randomly sampled in self.reads_df in streaming mode, or in the plotting samples with bam_sample
+        * preview
+            If True, enable a fast preview streaming mode. Only the reads and bases counts and the start_time range per runid are
+            aggregated exactly. The reads are sampled per runid proportionally to the runid reads counts (stratified sampling)
+            and the distributions are estimated from the sample. Requires streaming mode
+        * threads
+            Number of worker processes used to parse multiple summary or barcode files concurrently, or byte ranges of a single large
+            uncompressed file
+        * reader
+            Parser backend used to read the summary and barcode files outside of streaming mode. "pandas" uses the pandas C engine,
+            "arrow" the multithreaded CSV reader of pyarrow (requires the pyarrow package)
+        * watch
+            If True, the byte offsets of the uncompressed summary files are saved so that the lines appended later (during a run)
+            can be parsed incrementally with the update method. Requires streaming mode
+        * cache_dir
+            If given, the cleaned data are saved in a columnar cache in this directory, and reloaded by later runs with the
+            same input files (paths, sizes and modification times) and parsing options. Not available in streaming mode
+        * cache_max_size
+            Maximal size of the cache directory in GB. The least recently used entries are evicted first
+        * memory_map
+            If True, the numeric columns of reads_df are memory-mapped from the column files of the cache entry instead of
+            being loaded in memory, so that datasets larger than RAM can be plotted. Requires cache_dir
+        * read_ids
+            Representation of the read_ids in reads_df. With "string" reads_df is indexed by read_id strings. With "binary" UUID
+            read_ids are stored in 2 uint64 columns (read_id_hi and read_id_lo) that can be decoded with uint64_to_read_id.
+            With "none" read_ids are discarded, and not loaded at all if no barcode or bam merge or duplicate filtering is needed.
+            Internally, UUID read_ids are always merged and deduplicated as pairs of uint64
+        * colnames
+            List of the optional reads_df columns needed downstream (see pycoQC_plot.required_colnames). If given, only these optional
+            summary columns and alignment fields are loaded, and the barcode or bam files are not parsed at all if none of their columns
+            are needed. By default all the available columns are loaded
         """
 
         # Set logging level
@@ -62,40 +191,154 @@ class pycoQC_parse ():
 
         # Save self variables
         self.runid_list = runid_list
+        self.time_window = time_window
         self.filter_calibration = filter_calibration
         self.filter_duplicated = filter_duplicated
+        self.verify_duplicates = verify_duplicates
         self.min_barcode_percent = min_barcode_percent
         self.cleanup = cleanup
+        self.chunk_size = chunk_size
+        self.threads = threads
+        self.write_bam_sidecar = write_bam_sidecar
+        self.bam_sample = bam_sample
+        self.bam_extra_sample = bam_extra_sample
+        self.min_pass_qual = min_pass_qual
+        self.min_pass_len = min_pass_len
+        self.sample = sample
+        self.reader = reader
+        self.watch = watch
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.memory_map = memory_map
+        self.read_ids = read_ids
+        self.colnames = colnames
+        self.aggregate = None
+        self._read_id_cols = ["read_id"]
+
+        # Check streaming options
+        if chunk_size and not cleanup:
+            raise pycoQCError("Streaming mode requires cleanup to be enabled")
+        if chunk_size and not sample:
+            raise pycoQCError("Streaming mode requires a number of reads to sample")
+        if watch and not chunk_size:
+            raise pycoQCError("Watch mode requires streaming mode")
+        if preview and not chunk_size:
+            raise pycoQCError("Preview mode requires streaming mode")
+        if bam_sample and (chunk_size or not cleanup):
+            raise pycoQCError("Sampled alignment stats require cleanup and are not available in streaming mode")
+        if time_window and (len(time_window) != 2 or time_window[0] > time_window[1]):
+            raise pycoQCError("Invalid time_window value {}. Expecting [min, max] start times in hours".format(time_window))
+        if not reader in TSV_READERS:
+            raise pycoQCError("Invalid reader value {}. Choices: {}".format(reader, ", ".join(TSV_READERS)))
+        if not read_ids in ["string", "binary", "none"]:
+            raise pycoQCError("Invalid read_ids value {}. Choices: string, binary, none".format(read_ids))
 
         # Init object counter
         self.counter = OrderedDict()
 
         # Check input files
         self.logger.warning ("Check input data files")
+        if self._frames is not None:
+            has_barcode = self._frames["barcode"] is not None
+            has_bam = self._frames["bam"] is not None
+        else:
+            has_barcode = bool(barcode_file)
+            has_bam = bool(bam_file)
+        with_barcode = has_barcode and (colnames is None or "barcode" in colnames)
+        with_bam = has_bam and (colnames is None or bool(set(BAM_COLNAMES).intersection(colnames)))
+        if has_barcode and not with_barcode:
+            self.logger.debug ("\t\tBarcode files not needed, skipping")
+        if has_bam and not with_bam:
+            self.logger.debug ("\t\tBam files not needed, skipping")
+
+        # In memory tables given to from_frame are used instead of files
+        if self._frames is not None:
+            if watch or cache_dir:
+                raise pycoQCError("Watch mode and parse cache require input files")
+            if not with_barcode:
+                self._frames["barcode"] = None
+            if not with_bam:
+                self._frames["bam"] = None
+            self.logger.debug ("\t\tUsing in memory tables: {}".format(" ".join(k for k, v in self._frames.items() if v is not None)))
+            self.summary_files_list = []
+            self.barcode_files_list = []
+            self.bam_file_list = []
 
         # Expand file names and test readability
-        self.summary_files_list = expand_file_names(summary_file)
-        self.logger.debug ("\t\tSequencing summary files found: {}".format(" ".join(self.summary_files_list)))
-        self.counter["Summary files found"] = len(self.summary_files_list)
-
-        if barcode_file:
-            self.barcode_files_list = expand_file_names(barcode_file)
-            self.logger.debug ("\t\tBarcode files found: {}".format(" ".join(self.barcode_files_list)))
-            self.counter["Barcode files found"] = len(self.barcode_files_list)
         else:
-            self.barcode_files_list =[]
+            self.summary_files_list = expand_file_names(summary_file)
+            self.logger.debug ("\t\tSequencing summary files found: {}".format(" ".join(self.summary_files_list)))
+            self.counter["Summary files found"] = len(self.summary_files_list)
+
+            if with_barcode:
+                self.barcode_files_list = expand_file_names(barcode_file)
+                self.logger.debug ("\t\tBarcode files found: {}".format(" ".join(self.barcode_files_list)))
+                self.counter["Barcode files found"] = len(self.barcode_files_list)
+            else:
+                self.barcode_files_list =[]
+
+            if with_bam:
+                self.bam_file_list = expand_file_names(bam_file, bam_check=True)
+                self.logger.debug ("\t\tBam files found: {}".format(" ".join(self.bam_file_list)))
+                self.counter["Bam files found"] = len(self.bam_file_list)
+                if self.cache_dir and STDIN_FN in self.bam_file_list:
+                    self.logger.warning ("WARNING: Parse cache disabled as alignments read from the standard input cannot be fingerprinted")
+                    self.cache_dir = ""
+            else:
+                self.bam_file_list =[]
+
+        # Sidecar indexes of the summary files, to only parse the blocks containing the selected reads
+        self._summary_indexes = OrderedDict()
+        if self.summary_files_list and not watch and (summary_index or time_window or runid_list):
+            self._summary_indexes = self._get_summary_indexes(build=summary_index)
+
+        # read_ids are only needed to merge files, filter duplicates or index the reads
+        if read_ids == "none" and cleanup and not (with_barcode or with_bam or filter_duplicated):
+            self.logger.debug ("\t\tread_ids are not needed and will not be loaded")
+            self.summary_required_colnames = [c for c in SUMMARY_REQUIRED_COLNAMES if c != "read_id"]
+        else:
+            self.summary_required_colnames = SUMMARY_REQUIRED_COLNAMES
 
-        if bam_file:
-            self.bam_file_list = expand_file_names(bam_file, bam_check=True)
-            self.logger.debug ("\t\tBam files found: {}".format(" ".join(self.bam_file_list)))
-            self.counter["Bam files found"] = len(self.bam_file_list)
+        # Only load the optional columns needed downstream, and calibration flags if needed for filtering
+        if colnames is None:
+            self.summary_optional_colnames = SUMMARY_OPTIONAL_COLNAMES
+            self.bam_colnames = BAM_COLNAMES
         else:
-            self.bam_file_list =[]
+            self.summary_optional_colnames = [c for c in SUMMARY_OPTIONAL_COLNAMES if c in colnames or (c == "calibration" and filter_calibration)]
+            self.bam_colnames = [c for c in BAM_COLNAMES if c in colnames or c in ["ref_id", "align_len"]]
+            self.logger.debug ("\t\tOptional columns loaded: {}".format(" ".join(self.summary_optional_colnames+self.bam_colnames)))
+
+        # Streaming mode
+        if self.chunk_size:
+            self.logger.warning ("Parse barcode and alignment files")
+            barcode_reads_df = self._parse_barcode()
+            bam_reads_df, self.alignments_df, self.ref_len_dict = self._parse_bam()
+
+            self.logger.warning ("Parse, clean and aggregate summary files by chunks")
+            self.aggregate = pycoQC_aggregate(min_pass_qual=min_pass_qual, min_pass_len=min_pass_len, sample=sample, preview=preview)
+            self.reads_df = self._stream_summary(barcode_reads_df, bam_reads_df)
+            return
+
+        # Try to reload the cleaned data from the cache
+        if self.cache_dir:
+            if not self.cleanup:
+                raise pycoQCError("Parse cache requires cleanup to be enabled")
+            self.cache_key = self._cache_key()
+            if self._load_cache():
+                return
+        elif self.memory_map:
+            raise pycoQCError("Memory mapped reads table requires a cache_dir where to write the column files")
 
         self.logger.warning ("Parse data files")
         summary_reads_df = self._parse_summary()
         barcode_reads_df = self._parse_barcode()
-        bam_reads_df, self.alignments_df, self.ref_len_dict = self._parse_bam()
+        # With bam_sample, the alignment files are parsed once the plotting samples are known, while cleaning the data
+        if self.bam_sample and self.bam_file_list:
+            bam_reads_df = pd.DataFrame()
+        else:
+            bam_reads_df, self.alignments_df, self.ref_len_dict = self._parse_bam()
+        if self.cleanup:
+            summary_reads_df, barcode_reads_df, bam_reads_df = self._binary_read_ids([summary_reads_df, barcode_reads_df, bam_reads_df])
 
         self.logger.warning ("Merge data")
         self.reads_df = self._merge_reads_df(summary_reads_df, barcode_reads_df, bam_reads_df)
@@ -105,38 +348,140 @@ class pycoQC_parse ():
             self.logger.warning("Cleaning data")
             self.reads_df = self._clean_reads_df(self.reads_df)
 
+        # Save cleaned data to the cache
+        if self.cache_dir:
+            self._save_cache()
+
     def __str__(self):
         return dict_to_str(self.counter)
 
     def __repr__(self):
         return "[{}]\n".format(self.__class__.__name__)
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~PUBLIC METHODS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+    @classmethod
+    def from_frame (cls,
+        summary_df:pd.DataFrame,
+        barcode_df:pd.DataFrame=None,
+        bam_df:pd.DataFrame=None,
+        alignments_df:pd.DataFrame=None,
+        ref_len_dict:dict=None,
+        **kwargs):
+        """
+        Create a parser from in memory tables instead of files. The tables go through the same column renaming, selection and
+        cleaning steps as the files. Columns are not copied on input, unless they have to be converted to another dtype
+        * summary_df
+            Dataframe with the columns of a sequencing_summary file generated by Albacore or Guppy
+        * barcode_df
+            Dataframe with the columns of a barcoding_summary file generated by Guppy or Deepbinner
+        * bam_df
+            Dataframe of primary alignments containing read_id and the alignment columns (ref_id, align_len, ref_start, ref_end,
+            insertion, deletion, mismatch, soft_clip, identity_freq...), as in the reads_df of a parser with a bam_file
+        * alignments_df
+            Dataframe of the number of alignments per type (Alignments, Counts and Percents columns), as in parser.alignments_df
+        * ref_len_dict
+            Dict of reference names to lengths, required for the alignment coverage plots
+        * kwargs
+            Other pycoQC_parse options
+        """
+        frames = OrderedDict([
+            ("summary", summary_df),
+            ("barcode", barcode_df),
+            ("bam", bam_df),
+            ("alignments", alignments_df),
+            ("ref_len", ref_len_dict)])
+
+        # The tables are attached to the parser before its initialisation, which then parses them instead of files
+        parser = cls.__new__(cls)
+        parser._frames = frames
+        parser.__init__(summary_file="", **kwargs)
+        return parser
+
+    @classmethod
+    def from_arrow (cls,
+        summary_table,
+        barcode_table=None,
+        bam_table=None,
+        **kwargs):
+        """
+        Create a parser from in memory Apache Arrow tables instead of files (see from_frame). The tables are converted to pandas
+        with pyarrow, without copy for the numeric columns with no missing values. Dictionary encoded columns are converted to
+        categorical columns
+        * summary_table
+            pyarrow.Table with the columns of a sequencing_summary file generated by Albacore or Guppy
+        * barcode_table
+            pyarrow.Table with the columns of a barcoding_summary file generated by Guppy or Deepbinner
+        * bam_table
+            pyarrow.Table of primary alignments (see from_frame bam_df)
+        * kwargs
+            Other from_frame and pycoQC_parse options
+        """
+        def to_pandas (table):
+            return table.to_pandas(split_blocks=True) if table is not None else None
+
+        return cls.from_frame(
+            summary_df=to_pandas(summary_table),
+            barcode_df=to_pandas(barcode_table),
+            bam_df=to_pandas(bam_table),
+            **kwargs)
+
+    def update (self):
+        """
+        Parse the lines appended to the summary files since the previous parsing, fold them into the aggregates and refresh
+        reads_df. Only available in watch mode. Returns the number of new reads parsed.
+        reads_df stays empty as long as less than 2 valid reads were parsed
+        """
+        if not self.watch:
+            raise pycoQCError("update is only available in watch mode")
+
+        self.logger.warning ("Parse, clean and aggregate new summary lines")
+        n = self.counter["Initial reads"]
+        for df in self._iter_summary_tails():
+            self._add_summary_chunk(df)
+        n = self.counter["Initial reads"]-n
+        self.logger.info ("\t{:,} new reads parsed".format(n))
+        if n:
+            self.reads_df = self._stream_reads_df()
+        return n
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~PRIVATE METHODS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 
     def _parse_summary (self):
         """"""
         self.logger.debug ("\tParse summary files")
-        df = merge_files_to_df (self.summary_files_list)
 
         if self.cleanup:
+            # Only load the columns used by pycoQC directly in their final dtype
+            self.logger.debug ("\tLoading required and optional columns")
+            if self._frames is not None:
+                # Shallow copy, so that the columns added later are not added to the caller dataframe
+                df = self._frames["summary"].copy(deep=False)
+            else:
+                usecols, dtype = self._summary_read_options()
+                if self._summary_indexes and (self.time_window or self.runid_list):
+                    df_list = list(self._iter_indexed_summary(usecols=usecols, dtype=dtype))
+                    if not df_list:
+                        raise pycoQCError("No reads found in the selected time window and runids")
+                    df = concat_df_list(df_list)
+                else:
+                    df = merge_files_to_df (self.summary_files_list, usecols=usecols, dtype=dtype, threads=self.threads, reader=self.reader)
+
             # Standardise col names for all types of files
             self.logger.debug ("\tRename summary sequencing columns")
-            rename_colmanes = {
-                "sequence_length_template":"read_len",
-                "sequence_length_2d":"read_len",
-                "sequence_length":"read_len",
-                "mean_qscore_template":"mean_qscore",
-                "mean_qscore_2d":"mean_qscore",
-                "calibration_strand_genome_template":"calibration",
-                "barcode_arrangement":"barcode"}
-            df = df.rename(columns=rename_colmanes)
+            df = df.rename(columns=SUMMARY_COLNAMES_MAP, copy=False)
 
             # Verify the required and optional columns, Drop unused fields
             self.logger.debug ("\tVerifying fields and discarding unused columns")
             df = self._select_df_columns (
                 df = df,
-                required_colnames = ["read_id", "run_id", "channel", "start_time", "read_len", "mean_qscore"],
-                optional_colnames = ["calibration", "barcode"])
+                required_colnames = self.summary_required_colnames,
+                optional_colnames = self.summary_optional_colnames)
+            df = self._cast_summary_columns(df)
+        elif self._frames is not None:
+            df = self._frames["summary"].copy(deep=False)
+        else:
+            df = merge_files_to_df (self.summary_files_list, threads=self.threads, reader=self.reader)
 
         # Collect stats
         n = len(df)
@@ -145,65 +490,258 @@ class pycoQC_parse ():
 
         return df
 
+    def _stream_summary (self, barcode_reads_df, bam_reads_df):
+        """"""
+        self.logger.debug ("\tParse summary files by chunks of {:,} lines".format(self.chunk_size))
+
+        # Index barcode and alignment reads once to speed up the per chunk merge
+        if not barcode_reads_df.empty:
+            barcode_reads_df = barcode_reads_df.set_index("read_id")
+        if not bam_reads_df.empty:
+            bam_reads_df = bam_reads_df.set_index("read_id")
+        self._barcode_reads_df = barcode_reads_df
+        self._bam_reads_df = bam_reads_df
+
+        self.counter["Initial reads"] = 0
+        self._summary_duplicates = duplicate_read_ids(verify=self.verify_duplicates)
+        if self.watch:
+            self._summary_tails = [tsv_file_tail(fn) for fn in self.summary_files_list]
+            chunk_iter = self._iter_summary_tails()
+        elif self._frames is not None:
+            summary_df = self._frames["summary"]
+            chunk_iter = (summary_df.iloc[i:i+self.chunk_size] for i in range(0, len(summary_df), self.chunk_size))
+        else:
+            usecols, dtype = self._summary_read_options()
+            if self._summary_indexes and (self.time_window or self.runid_list):
+                chunk_iter = self._iter_indexed_summary(usecols=usecols, dtype=dtype, chunk_size=self.chunk_size)
+            else:
+                chunk_iter = iter_files_to_df (self.summary_files_list, chunk_size=self.chunk_size, usecols=usecols, dtype=dtype, threads=self.threads)
+        for df in chunk_iter:
+            self._add_summary_chunk(df)
+
+        # The merge and duplicate filtering data are only needed to parse new lines in watch mode
+        if not self.watch:
+            del self._summary_duplicates, self._barcode_reads_df, self._bam_reads_df
+
+        return self._stream_reads_df()
+
+    def _iter_summary_tails (self):
+        """Generator reading the lines appended to the summary files since the previous read by chunks"""
+        usecols, dtype = self._summary_read_options()
+        for summary_tail in self._summary_tails:
+            for df in summary_tail.iter_df(chunk_size=self.chunk_size, usecols=usecols, dtype=dtype):
+                yield df
+
+    def _get_summary_indexes (self, build):
+        """Load the up to date sidecar indexes of the uncompressed summary files, building the missing ones if build is True"""
+        index_dict = OrderedDict()
+        for fn in self.summary_files_list:
+            if file_compression(fn):
+                self.logger.debug ("\t\tCompressed summary file {} cannot be indexed".format(fn))
+                continue
+            index = summary_file_index(fn)
+            if index.load():
+                self.logger.debug ("\t\tIndex found for summary file {}".format(fn))
+            elif build:
+                self.logger.info ("\tIndexing summary file {}".format(fn))
+                index.build()
+            else:
+                continue
+            index_dict[fn] = index
+        return index_dict
+
+    def _iter_indexed_summary (self, usecols, dtype, chunk_size=0):
+        """
+        Generator reading the summary files, only parsing the blocks of the indexed files that can contain reads within time_window
+        and runid_list. Files without index are fully read, by chunks of chunk_size lines if > 0
+        """
+        time_window = [t*3600 for t in self.time_window] if self.time_window else None
+        for fn in self.summary_files_list:
+            if fn in self._summary_indexes:
+                index = self._summary_indexes[fn]
+                ranges = index.select(time_window=time_window, runid_list=self.runid_list)
+                self.logger.debug ("\t\t{:,} blocks selected out of {:,} for summary file {}".format(len(ranges), len(index), fn))
+                self._add_counter("Summary blocks skipped", len(index)-len(ranges))
+                for df in index.iter_df(ranges, usecols=usecols, dtype=dtype):
+                    yield df
+            elif chunk_size:
+                for df in iter_files_to_df ([fn], chunk_size=chunk_size, usecols=usecols, dtype=dtype, threads=self.threads):
+                    yield df
+            else:
+                yield read_tsv_file(fn, usecols=usecols, dtype=dtype, threads=self.threads, reader=self.reader)
+
+    def _add_summary_chunk (self, df):
+        """Clean a chunk of summary reads, merge it with the barcode and alignment reads and fold it into the aggregates"""
+        df = df.rename(columns=SUMMARY_COLNAMES_MAP, copy=False)
+        df = self._select_df_columns (
+            df = df,
+            required_colnames = self.summary_required_colnames,
+            optional_colnames = self.summary_optional_colnames)
+        df = self._cast_summary_columns(df)
+        self.counter["Initial reads"] += len(df)
+        self.logger.debug ("\t\t{:,} reads parsed".format(self.counter["Initial reads"]))
+
+        df = self._merge_reads_df(df, self._barcode_reads_df, self._bam_reads_df)
+        df = self._filter_reads_df(df, chunk=True)
+        # Integer columns read as float32 because of NA values are cast back, so that the aggregates are not summed in float32
+        df = self._cast_summary_columns(df, integer=True)
+        self.aggregate.add_reads(df)
+
+    def _stream_reads_df (self):
+        """Finalise the aggregates and return the sample of cleaned reads"""
+        n = self.aggregate["all"].reads
+        if n <= 1:
+            # In watch mode, the summary files may not contain any valid read yet
+            if self.watch:
+                self.logger.info ("\tNo valid read parsed yet")
+                return pd.DataFrame()
+            raise pycoQCError("No valid read left after filtering")
+
+        # Order runids using the aggregated runid stats
+        self.aggregate.set_runid_offset (self._runid_offset(self.aggregate.runid_stats()))
+
+        # In preview mode, the distributions are estimated from the stratified sample
+        if self.aggregate.preview:
+            self.logger.info ("\tEstimating distributions from the reads sampled per runid")
+            self.aggregate.estimate_stats()
+
+        #  Unset low frequency barcodes. The list is redefined from the raw barcode counts
+        if "barcode" in self.aggregate["all"].counts and self.min_barcode_percent:
+            self.logger.info ("\tCleaning up low frequency barcodes")
+            barcode_counts = self.aggregate["all"].counts["barcode"].drop("unclassified", errors="ignore").sort_index()
+            low_barcode = self._low_frequency_barcodes(barcode_counts)
+            self.aggregate.unset_barcodes(low_barcode)
+            n = int(barcode_counts[low_barcode].sum())
+            self.logger.info ("\t\t{:,} reads with low frequency barcode unset".format(n))
+            self.counter["Reads with low frequency barcode unset"] = n
+
+        # Get final sample df
+        df = self.aggregate.get_sample_df()
+        df = self._cast_reads_df(df)
+        self.counter["Valid reads"] = self.aggregate["all"].reads
+        self.logger.info ("\t\t{:,} Final valid reads".format(self.counter["Valid reads"]))
+        self.logger.info ("\t\t{:,} Reads sampled".format(len(df)))
+        return df
+
     def _parse_barcode (self):
         """"""
-        if not self.barcode_files_list:
+        if self._frames is not None and self._frames["barcode"] is not None:
+            self.logger.debug ("\tParse barcode table")
+            df = self._frames["barcode"]
+        elif self.barcode_files_list:
+            self.logger.debug ("\tParse barcode files")
+            df = merge_files_to_df (
+                self.barcode_files_list,
+                usecols=["read_id", "barcode_arrangement", "read_ID", "barcode_call"],
+                dtype={"barcode_arrangement":"category", "barcode_call":"category"},
+                threads=self.threads,
+                reader=self.reader)
+        else:
             return pd.DataFrame()
 
-        self.logger.debug ("\tParse barcode files")
-        df = merge_files_to_df (self.barcode_files_list)
-
         # check presence of barcode details
         if "read_id" in df and "barcode_arrangement" in df:
             self.logger.debug ("\t\tFound valid Guppy barcode file")
-            df = df [["read_id", "barcode_arrangement"]]
-            df = df.rename(columns={"barcode_arrangement":"barcode"})
+            df = self._select_df_columns (df, ["read_id", "barcode_arrangement"], [])
+            df = df.rename(columns={"barcode_arrangement":"barcode"}, copy=False)
 
         elif "read_ID" in df and "barcode_call" in df:
             self.logger.debug ("\t\tFound valid Deepbinner barcode file")
-            df = df [["read_ID", "barcode_call"]]
-            df = df.rename(columns={"read_ID":"read_id", "barcode_call":"barcode"})
-            df['barcode'].replace("none", "unclassified", inplace=True)
+            df = self._select_df_columns (df, ["read_ID", "barcode_call"], [])
+            df = df.rename(columns={"read_ID":"read_id", "barcode_call":"barcode"}, copy=False)
+            df['barcode'] = category_replace(df['barcode'].astype("category"), ["none"], "unclassified")
         else:
-            raise pycoQCError ("File {} does not contain required barcode information".format(fp))
+            raise pycoQCError ("File {} does not contain required barcode information".format(" ".join(self.barcode_files_list) or "barcode_df"))
+        if not pd.api.types.is_categorical_dtype(df["barcode"]):
+            df["barcode"] = df["barcode"].astype("category")
 
-        n = len(df[df['barcode']!="unclassified"])
+        n = int((df['barcode']!="unclassified").sum())
         self.logger.debug ("\t\t{:,} reads with barcodes assigned".format(n))
         self.counter["Reads with barcodes"] = n
 
+        # Discard duplicated barcode reads, keeping the first occurrence
+        duplicated = duplicate_read_ids(verify=self.verify_duplicates).add(df["read_id"].values, label="barcode")
+        n = int(duplicated.sum())
+        self.logger.debug ("\t\t{:,} duplicated barcode reads".format(n))
+        self._add_counter("Duplicated barcode reads", n)
+        if n:
+            df = df[~duplicated]
+
         return df
 
-    def _parse_bam (self):
-        """"""
+    def _parse_bam (self, read_ids=None):
+        """
+        Parse the alignment files (see bam_file_stats), or reload the alignment stats from their sidecar directories if up to date.
+        The stats of the files parsed are saved in sidecar directories next to them if write_bam_sidecar is True, except for the
+        alignments read from the standard input. If a set of read_ids is given, the alignment types of all the reads are counted
+        but the stats are only extracted for these reads, and the partial stats are not saved in sidecar directories. The duplicated
+        primary alignments are still counted exactly, from the hashes of the read_ids of all the primary alignments
+        """
+        if self._frames is not None and self._frames["bam"] is not None:
+            return self._parse_bam_frame()
         if not self.bam_file_list:
             return (pd.DataFrame(), pd.DataFrame(), OrderedDict())
 
-        # Init collections
+        # Reload the alignment stats saved in sidecar directories
+        bam_stats_dict = OrderedDict()
+        for bam_fn in self.bam_file_list:
+            if bam_fn == STDIN_FN:
+                continue
+            bam_stats = load_bam_stats(bam_fn, colnames=self.bam_colnames)
+            if bam_stats:
+                self.logger.debug ("\t\tAlignment stats loaded from {}".format(bam_stats_dir(bam_fn)))
+                if read_ids is not None:
+                    df = bam_stats[0]
+                    selected = df["read_id"].isin(read_ids).values if not df.empty else np.zeros(0, dtype=bool)
+                    other_read_ids = read_id_hash(df["read_id"].values[~selected]) if not df.empty else read_id_hash([])
+                    bam_stats = (df[selected].reset_index(drop=True) if not df.empty else df,)+bam_stats[1:]+(other_read_ids,)
+                bam_stats_dict[bam_fn] = bam_stats
+        self.counter["Bam files sidecar loaded"] = len(bam_stats_dict)
+
+        # Parse the other files
+        bam_file_list = [bam_fn for bam_fn in self.bam_file_list if not bam_fn in bam_stats_dict]
+        if bam_file_list:
+            for bam_fn in bam_file_list:
+                if not bam_is_indexed(bam_fn):
+                    self.logger.info ("\t{} is not a sorted and indexed bam file, reading alignments sequentially".format(bam_fn))
+            parsed_stats_dict = bam_file_stats(bam_file_list, colnames=self.bam_colnames, threads=self.threads, read_ids=read_ids)
+            for bam_fn, bam_stats in parsed_stats_dict.items():
+                bam_stats_dict[bam_fn] = bam_stats
+                if self.write_bam_sidecar and bam_fn != STDIN_FN and read_ids is None:
+                    try:
+                        save_bam_stats(bam_fn, *bam_stats, colnames=self.bam_colnames)
+                        self.logger.debug ("\t\tAlignment stats saved in {}".format(bam_stats_dir(bam_fn)))
+                    except (IOError, OSError, pycoQCError) as E:
+                        self.logger.warning ("WARNING: Cannot write alignment stats sidecar for {}: {}".format(bam_fn, E))
+
+        # Merge results in file order, discarding the duplicated primary alignments, including those found in the previous files
         ref_len_dict = OrderedDict()
         alignments_dict = Counter()
-        read_dict = OrderedDict ()
-
+        df_list = []
+        duplicates = duplicate_read_ids(verify=self.verify_duplicates)
         for bam_fn in self.bam_file_list:
-            with ps.AlignmentFile(bam_fn, "rb") as bam:
-
-                # Save reference lengths information
-                for ref_id, ref_len in zip(bam.references, bam.lengths):
-                    if not ref_id in ref_len_dict:
-                        ref_len_dict[ref_id] = ref_len
-
-                # Parse reads
-                for read in bam:
-                    if read.is_unmapped:
-                        alignments_dict["Unmapped"]+=1
-                    elif read.is_secondary:
-                        alignments_dict["Secondary"]+=1
-                    elif read.is_supplementary:
-                        alignments_dict["Suplementary"]+=1
-                    elif read.query_name in read_dict:
-                        alignments_dict["Duplicated"]+=1
-                    else:
-                        alignments_dict["Primary"]+=1
-                        read_dict[read.query_name] = self._get_read_stats(read)
+            df, counts, file_ref_len_dict = bam_stats_dict[bam_fn][:3]
+            for ref_id, ref_len in file_ref_len_dict.items():
+                if not ref_id in ref_len_dict:
+                    ref_len_dict[ref_id] = ref_len
+            alignments_dict.update(counts)
+
+            # The read_ids of the primary alignments not extracted are only searched for duplicates to count them.
+            # They cannot match the read_ids of the extracted alignments, as all the alignments of a read are either extracted or not
+            n = 0
+            if read_ids is not None:
+                n += int(duplicates.add(bam_stats_dict[bam_fn][3], label=bam_fn).sum())
+            duplicated = np.zeros(len(df), dtype=bool)
+            if not df.empty:
+                duplicated = duplicates.add(df["read_id"].values, label=bam_fn)
+                n += int(duplicated.sum())
+            self.logger.debug ("\t\t{:,} duplicated primary alignments in {}".format(n, bam_fn))
+            self._add_counter("Duplicated alignment reads", n)
+            if n:
+                alignments_dict["Primary"]-=n
+                alignments_dict["Duplicated"]+=n
+            if not df.empty:
+                df_list.append(df[~duplicated] if duplicated.any() else df)
 
         # Convert aligments_dict to df
         if alignments_dict:
@@ -214,177 +752,505 @@ class pycoQC_parse ():
         else:
             alignments_df = pd.DataFrame()
 
-        # Convert read_dict to df
-        if read_dict:
-            read_df = pd.DataFrame.from_dict(read_dict, orient="index")
-            read_df.index.name="read_id"
-            read_df.reset_index(inplace=True)
+        # Concatenate read stats
+        if df_list:
+            read_df = _concat_bam_df_list(df_list).reset_index(drop=True)
+            read_df["ref_id"] = read_df["ref_id"].astype("category")
         else:
             read_df = pd.DataFrame()
 
         return (read_df, alignments_df, ref_len_dict)
 
+    def _parse_bam_frame (self):
+        """Select the alignment columns of the in memory bam table given to from_frame"""
+        self.logger.debug ("\tParse alignment table")
+        df = self._frames["bam"]
+        for col in ["read_id", "ref_id", "align_len"]:
+            if not col in df:
+                raise pycoQCError("Column {} not found in the provided alignment table".format(col))
+        df = self._select_df_columns (df=df, required_colnames=["read_id"], optional_colnames=self.bam_colnames)
+        if not pd.api.types.is_categorical_dtype(df["ref_id"]):
+            df["ref_id"] = df["ref_id"].astype("category")
+
+        # Discard the duplicated primary alignments, keeping the first one
+        duplicated = duplicate_read_ids(verify=self.verify_duplicates).add(df["read_id"].values, label="bam")
+        n = int(duplicated.sum())
+        self.logger.debug ("\t\t{:,} duplicated primary alignments".format(n))
+        self._add_counter("Duplicated alignment reads", n)
+        if n:
+            df = df[~duplicated]
+
+        alignments_df = self._frames["alignments"] if self._frames["alignments"] is not None else pd.DataFrame()
+        ref_len_dict = OrderedDict(self._frames["ref_len"] or {})
+        return (df, alignments_df, ref_len_dict)
+
     def _merge_reads_df(self, summary_reads_df, barcode_reads_df, bam_reads_df):
         """"""
         df = summary_reads_df
+        if barcode_reads_df.empty and bam_reads_df.empty:
+            return df
+
+        # Streaming chunks are joined on the barcode and alignment reads indexed once by read_id
+        if self.chunk_size:
+            for other_df in (barcode_reads_df, bam_reads_df):
+                if not other_df.empty:
+                    df = df.join(other_df, on="read_id")
 
-        # Merge df and fill in missing barcode values
+        # Else scatter the barcode and alignment columns using a single index over the summary read_ids
+        else:
+            read_id_index = self._read_id_index(df)
+            for label, other_df in (("Barcode", barcode_reads_df), ("Alignment", bam_reads_df)):
+                if not other_df.empty:
+                    self.logger.debug ("\tMerging {} reads".format(label.lower()))
+                    df = self._join_reads_df(df, other_df, read_id_index, label)
+
+        # Fill in missing barcode values
         if not barcode_reads_df.empty:
-            df = pd.merge(df, barcode_reads_df, on="read_id", how="left")
-            df['barcode'].fillna('unclassified', inplace=True)
+            df['barcode'] = category_fillna(df['barcode'], 'unclassified')
 
-        # Merge df and fill in missing barcode values
-        if not bam_reads_df.empty:
-            df = pd.merge(df, bam_reads_df, on="read_id", how="left")
+        return df
+
+    def _read_id_index (self, df):
+        """
+        Build a hash index over the read_ids of df. UUID read_ids are indexed on a 64 bits key mixing their most and least
+        significant bits (see read_id_key), the pairs being verified after lookup. If distinct read_ids of df share the same
+        key, they are indexed on the exact pairs instead. If df contains duplicated read_ids, the index is built over the
+        unique read_ids and codes maps each row of df to its position in the index
+        """
+        keys = self._read_id_index_keys(df)
+        index = pd.Index(keys)
+        codes = None
+        if not index.is_unique:
+            codes, uniques = pd.factorize(keys)
+            index = pd.Index(uniques)
+
+        pairs = None
+        if self._read_id_cols == READ_ID_COLNAMES:
+            hi, lo = df["read_id_hi"].values, df["read_id_lo"].values
+            if codes is not None:
+                # Pairs of the first row of each key, compared to all the rows sharing the key
+                first = np.empty(len(index), dtype=np.int64)
+                first[codes[::-1]] = np.arange(len(codes)-1, -1, -1)
+                if (hi[first][codes] != hi).any() or (lo[first][codes] != lo).any():
+                    self.logger.debug ("\t\tDistinct read_ids with the same hash key, indexing the read_ids exactly")
+                    index = pd.MultiIndex.from_arrays([hi, lo])
+                    if not index.is_unique:
+                        codes, index = index.factorize()
+                    return (index, codes, None)
+                hi, lo = hi[first], lo[first]
+            pairs = (hi, lo)
+
+        return (index, codes, pairs)
+
+    def _read_id_index_keys (self, df):
+        """Keys of the read_ids of df in the read_id index, either the read_id strings or the keys of the encoded pairs"""
+        if self._read_id_cols == READ_ID_COLNAMES:
+            return read_id_key(df["read_id_hi"].values, df["read_id_lo"].values)
+        return df["read_id"].values
+
+    def _join_reads_df (self, df, other_df, read_id_index, label):
+        """
+        Left join the columns of other_df to df. The position of each read of other_df is looked up in read_id_index, and
+        its values are scattered into preallocated arrays added as new columns of df. Only the first occurrence of
+        duplicated read_ids is used. Unmatched and duplicated read_ids of other_df are reported in self.counter
+        """
+        index, codes, pairs = read_id_index
+
+        # Find the position of the reads in df
+        if isinstance(index, pd.MultiIndex):
+            pos = index.get_indexer(pd.MultiIndex.from_arrays([other_df["read_id_hi"].values, other_df["read_id_lo"].values]))
+        else:
+            pos = index.get_indexer(self._read_id_index_keys(other_df))
+        matched = pos >= 0
+        if pairs is not None:
+            hi, lo = pairs
+            matched[matched] = (hi[pos[matched]] == other_df["read_id_hi"].values[matched]) & (lo[pos[matched]] == other_df["read_id_lo"].values[matched])
+        duplicated = np.zeros(len(pos), dtype=bool)
+        duplicated[matched] = pd.Series(pos[matched]).duplicated(keep="first").values
+
+        n = int((~matched).sum())
+        self.logger.debug ("\t\t{:,} {} reads not found in summary".format(n, label.lower()))
+        self.counter["{} reads not found in summary".format(label)] = n
+        n = int(duplicated.sum())
+        self.logger.debug ("\t\t{:,} duplicated {} reads".format(n, label.lower()))
+        self._add_counter("Duplicated {} reads".format(label.lower()), n)
+
+        # Scatter values in df order. Missing values are NaN, as for a left merge
+        valid = matched & ~duplicated
+        target = pos[valid]
+        all_found = len(target) == len(index)
+        for col in other_df.columns:
+            if col in self._read_id_cols:
+                continue
+            s = other_df[col]
+            if pd.api.types.is_categorical_dtype(s):
+                values = np.full(len(index), -1, dtype=s.cat.codes.dtype)
+                values[target] = s.cat.codes.values[valid]
+            else:
+                if all_found:
+                    values = np.empty(len(index), dtype=s.dtype)
+                else:
+                    values = np.full(len(index), np.nan, dtype=s.dtype if s.dtype.kind in "fO" else np.float64)
+                values[target] = s.values[valid]
+            if codes is not None:
+                values = values[codes]
+            if pd.api.types.is_categorical_dtype(s):
+                values = pd.Categorical.from_codes(values, categories=s.cat.categories)
+            df[col] = values
 
         return df
 
     def _clean_reads_df (self, df):
         """"""
+        df = self._filter_reads_df(df)
+
+        # Modify start time per run ids to order them. Stats are computed in a single grouped pass over the run_id codes
+        # and the offsets are applied through a lookup table indexed by the same codes
+        run_id = df["run_id"].astype("category")
+        runid_df = df["start_time"].groupby(run_id, observed=True).agg(["count", "min", "max"])
+        runid_df.columns = ["reads", "min_time", "max_time"]
+        runid_offset = self._runid_offset(runid_df)
+        offset_table = np.zeros(len(run_id.cat.categories), dtype=df["start_time"].dtype)
+        idx = run_id.cat.categories.get_indexer(list(runid_offset.keys()))
+        offset_table[idx[idx>=0]] = np.array(list(runid_offset.values()))[idx>=0]
+        df["start_time"] = df["start_time"].values + offset_table[run_id.cat.codes.values]
+
+        # Summary files are mostly ordered by start_time per file and run_id. Only the sorting permutation is computed
+        # here, by merging the ordered runs, and it is applied later column by column while casting the values
+        self.logger.info ("\tSorting reads by start time")
+        order = sorted_runs_argsort(df["start_time"].values)
+        if order is None:
+            self.logger.info ("\t\tReads already sorted")
+
+        # Extract the alignment stats of the reads sampled for the plots and the alignment summaries only
+        if self.bam_sample and self.bam_file_list:
+            df = self._merge_sampled_bam(df, order)
+
+        #  Unset low frequency barcodes
+        if "barcode" in df and self.min_barcode_percent:
+            self.logger.info ("\tCleaning up low frequency barcodes")
+            barcode_counts = category_counts(df["barcode"]).drop("unclassified", errors="ignore")
+            low_barcode = self._low_frequency_barcodes(barcode_counts)
+            df["barcode"] = category_replace(df["barcode"], low_barcode, "unclassified")
+            n = int(barcode_counts[low_barcode].sum())
+            self.logger.info ("\t\t{:,} reads with low frequency barcode unset".format(n))
+            self.counter["Reads with low frequency barcode unset"] = n
+
+        df = self._cast_reads_df(df, order)
+        self.logger.info ("\t\t{:,} Final valid reads".format(len(df)))
+
+        # Save final df
+        self.counter["Valid reads"] = len(df)
+        if len(df) < 500:
+            self.logger.warning ("WARNING: Low number of reads found. This is likely to lead to errors when trying to generate plots")
+
+        return df
+
+    def _merge_sampled_bam (self, df, order=None):
+        """
+        Parse the alignment files, extracting the alignment stats of the reads of the plotting samples and of bam_extra_sample other
+        reads only. The positions of the final sorted reads (given by order) are drawn as in pycoQC_plot, so that both samples
+        contain the same reads. The alignment stats are then merged with df and the all reads and extra samples are flagged in the
+        alignment_sample column
+        """
+        self.logger.info ("\tSampling reads for alignment stats extraction")
+        n_reads = len(df)
+        if order is None:
+            order = np.arange(n_reads)
+
+        # All reads plotting sample and extra random reads, used to estimate the alignment summaries
+        all_pos = _plot_sample_positions(n_reads, self.sample)
+        in_sample = np.zeros(n_reads, dtype=bool)
+        in_sample[all_pos] = True
+        n_extra = min(self.bam_extra_sample, n_reads-len(all_pos))
+        if n_extra:
+            extra_pos = np.random.RandomState(SEED).choice(np.flatnonzero(~in_sample), n_extra, replace=False)
+            in_sample[extra_pos] = True
+        alignment_sample = np.zeros(n_reads, dtype=bool)
+        alignment_sample[order[in_sample]] = True
+
+        # Pass reads plotting sample
+        is_pass = (df["mean_qscore"].values >= self.min_pass_qual) & (df["read_len"].values >= self.min_pass_len)
+        pass_pos = np.flatnonzero(is_pass[order])
+        pass_pos = pass_pos[_plot_sample_positions(len(pass_pos), self.sample)]
+        selected = alignment_sample.copy()
+        selected[order[pass_pos]] = True
+        self.counter["Alignment sample reads"] = int(np.count_nonzero(alignment_sample))
+        self.logger.info ("\t\t{:,} reads sampled".format(int(np.count_nonzero(selected))))
+
+        # Parse the alignment files for the sampled read_ids
+        if self._read_id_cols == READ_ID_COLNAMES:
+            read_ids = uint64_to_read_id(df["read_id_hi"].values[selected], df["read_id_lo"].values[selected])
+        else:
+            read_ids = df["read_id"].values[selected]
+        self.logger.warning ("Parse sampled alignment stats")
+        bam_reads_df, self.alignments_df, self.ref_len_dict = self._parse_bam(read_ids=frozenset(read_ids))
+        if not bam_reads_df.empty and self._read_id_cols == READ_ID_COLNAMES:
+            bam_reads_df = self._encode_read_ids(bam_reads_df)
+
+        # Merge the alignment stats with the cleaned reads
+        if not bam_reads_df.empty:
+            df = self._join_reads_df(df, bam_reads_df, self._read_id_index(df), "Alignment")
+        df["alignment_sample"] = alignment_sample
+        return df
+
+    def _filter_reads_df (self, df, chunk=False):
+        """
+        Apply the per read filters. Discarded read counts are accumulated in self.counter.
+        The filters are combined in a single boolean mask, the discarded counts are computed from the mask in filter order and
+        the valid reads are only selected once at the end.
+        If chunk is True, df is a chunk of the summary files, so empty results are allowed and
+        duplicated reads are also searched in the previous chunks
+        """
+        log = self.logger.debug if chunk else self.logger.info
+        keep = np.ones(len(df), dtype=bool)
+
+        def apply_filter (valid, counter_key, error_step):
+            n = int(np.count_nonzero(keep & ~valid))
+            keep[~valid] = False
+            log ("\t\t{:,} reads discarded".format(n))
+            self._add_counter(counter_key, n)
+            if np.count_nonzero(keep) <= 1 and not chunk:
+                raise pycoQCError("No valid read left after {} filtering".format(error_step))
+
         # Drop lines containing NA values
-        self.logger.info ("\tDiscarding lines containing NA values")
-        l = len(df)
-        df = df.dropna(subset=["read_id", "run_id", "channel", "start_time", "read_len", "mean_qscore"])
-        n=l-len(df)
-        self.logger.info ("\t\t{:,} reads discarded".format(n))
-        self.counter["Reads with NA values discarded"] = n
-        if len(df) <= 1:
-            raise pycoQCError("No valid read left after NA values filtering")
+        log ("\tDiscarding lines containing NA values")
+        valid = np.ones(len(df), dtype=bool)
+        for col in SUMMARY_REQUIRED_COLNAMES:
+            if col in df:
+                valid &= df[col].notna().values
+        apply_filter(valid, "Reads with NA values discarded", "NA values")
 
         # Filter out zero length reads
-        self.logger.info ("\tFiltering out zero length reads")
-        l = len(df)
-        df = df[(df["read_len"] > 0)]
-        n=l-len(df)
-        self.logger.info ("\t\t{:,} reads discarded".format(n))
-        self.counter["Zero length reads discarded"] = n
-        if len(df) <= 1:
-            raise pycoQCError("No valid read left after zero_len filtering")
-
-        # Filter out reads with duplicated read_id
+        log ("\tFiltering out zero length reads")
+        apply_filter(df["read_len"].values > 0, "Zero length reads discarded", "zero_len")
+
+        # Filter out reads with duplicated read_id. Only the reads still valid are searched for duplicates
         if self.filter_duplicated:
-            self.logger.info ("\tFiltering out duplicated reads")
-            l = len(df)
-            df = df[~df.duplicated(subset="read_id", keep='first')]
-            n=l-len(df)
-            self.logger.info ("\t\t{:,} reads discarded".format(n))
-            self.counter["Duplicated reads discarded"] = n
-            if len(df) <= 1:
-                raise pycoQCError("No valid read left after calibration strand filtering")
+            log ("\tFiltering out duplicated reads")
+            duplicates = self._summary_duplicates if chunk else duplicate_read_ids(verify=self.verify_duplicates)
+            keys = self._read_id_keys(df)
+            keys = tuple(k[keep] for k in keys) if isinstance(keys, tuple) else keys[keep]
+            valid = np.ones(len(df), dtype=bool)
+            valid[keep] = ~duplicates.add(keys, label="summary")
+            apply_filter(valid, "Duplicated reads discarded", "duplicated reads")
 
         # Filter out calibration strand reads if the "calibration_strand_genome_template" field is available
         if self.filter_calibration and "calibration" in df:
-            self.logger.info ("\tFiltering out calibration strand reads")
-            l = len(df)
-            df = df[(df["calibration"].isin(["filtered_out", "no_match", "*"]))]
-            n=l-len(df)
-            self.logger.info ("\t\t{:,} reads discarded".format(n))
-            self.counter["Calibration reads discarded"] = n
-            if len(df) <= 1:
-                raise pycoQCError("No valid read left after calibration strand filtering")
-
-        # Filter and reorder based on runid_list list if passed by user
+            log ("\tFiltering out calibration strand reads")
+            apply_filter(df["calibration"].isin(["filtered_out", "no_match", "*"]).values, "Calibration reads discarded", "calibration strand")
+
+        # Filter based on runid_list list if passed by user
+        if self.runid_list:
+            log ("\tSelecting run_ids passed by user")
+            apply_filter(df["run_id"].isin(self.runid_list).values, "Excluded runid reads discarded", "run ID")
+
+        # Filter based on time_window if passed by user
+        if self.time_window:
+            log ("\tSelecting reads within the time window")
+            start_time = df["start_time"].values
+            valid = (start_time >= self.time_window[0]*3600) & (start_time <= self.time_window[1]*3600)
+            apply_filter(valid, "Reads outside of time window discarded", "time window")
+
+        # Select the valid reads in a single copy. take returns a new dataframe which is not flagged as a copy of df
+        if not keep.all():
+            df = df.take(np.flatnonzero(keep))
+        return df
+
+    def _runid_offset (self, runid_df):
+        """
+        Define the start_time offset of each runid to order successive runs, either following runid_list if given
+        or by decreasing throughput. runid_df contains the number of reads and the start_time range per runid.
+        """
+        # Order based on runid_list list if passed by user
         if self.runid_list:
-            self.logger.info ("\tSelecting run_ids passed by user")
-            l = len(df)
-            df = df[(df["run_id"].isin(self.runid_list))]
-            n=l-len(df)
-            self.logger.debug ("\t\t{:,} reads discarded".format(n))
-            self.counter["Excluded runid reads discarded"] = n
-            if len(df) <= 1:
-                raise pycoQCError("No valid read left after run ID filtering")
             runid_list = self.runid_list
 
         # Else sort the runids by output per time assuming that the throughput decreases over time
         else:
             self.logger.info ("\tSorting run IDs by decreasing throughput")
-            d = {}
-            for run_id, sdf in df.groupby("run_id"):
-                d[run_id] = len(sdf)/np.ptp(sdf["start_time"])
+            runid_df = runid_df.sort_index()
+            d = runid_df["reads"]/(runid_df["max_time"]-runid_df["min_time"])
             runid_list = [i for i, j in sorted (d.items(), key=lambda t: t[1], reverse=True)]
             self.logger.info ("\t\tRun-id order {}".format(runid_list))
 
-        # Modify start time per run ids to order them following the runid_list
+        # Define start time offset per run ids following the runid_list order
         self.logger.info ("\tReordering runids")
         increment_time = 0
-        runid_start = OrderedDict()
+        runid_offset = OrderedDict()
         for runid in runid_list:
             self.logger.info ("\t\tProcessing reads with Run_ID {} / time offset: {}".format(runid, increment_time))
-            max_val = df['start_time'][df["run_id"] == runid].max()
-            df.loc[df["run_id"] == runid, 'start_time'] += increment_time
-            runid_start[runid] = increment_time
-            increment_time += max_val+1
-        df = df.sort_values ("start_time")
+            runid_offset[runid] = increment_time
+            if runid in runid_df.index:
+                increment_time += float(runid_df.loc[runid, "max_time"])+1
+        return runid_offset
 
-        #  Unset low frequency barcodes
-        if "barcode" in df and self.min_barcode_percent:
-            self.logger.info ("\tCleaning up low frequency barcodes")
-            l = (df["barcode"]=="unclassified").sum()
-            barcode_counts = df["barcode"][df["barcode"]!="unclassified"].value_counts()
-            cutoff = int(barcode_counts.sum()*self.min_barcode_percent/100)
-            low_barcode = barcode_counts[barcode_counts<cutoff].index
-            df.loc[df["barcode"].isin(low_barcode), "barcode"] = "unclassified"
-            n= int((df["barcode"]=="unclassified").sum()-l)
-            self.logger.info ("\t\t{:,} reads with low frequency barcode unset".format(n))
-            self.counter["Reads with low frequency barcode unset"] = n
+    def _low_frequency_barcodes (self, barcode_counts):
+        """Return the barcodes representing less than min_barcode_percent of the classified reads"""
+        cutoff = int(barcode_counts.sum()*self.min_barcode_percent/100)
+        return barcode_counts[barcode_counts<cutoff].index
 
-        # Cast values to required types
+    def _cast_reads_df (self, df, order=None):
+        """
+        Cast values to required types and index by read_ids. If given, the rows are reordered following the
+        permutation order. The permutation is only applied to the columns kept, while casting them
+        """
         self.logger.info ("\tCast value to appropriate type")
-        df = df.astype({'channel':"uint16","start_time":"float32","read_len":"uint32","mean_qscore":"float32"})
+        dtype_dict = {'channel':"uint16","start_time":"float32","read_len":"uint32","mean_qscore":"float32"}
+        if self.read_ids == "none":
+            self.logger.info ("\tDiscarding read_ids")
+            df = df.drop(columns=["read_id"]+READ_ID_COLNAMES, errors="ignore")
+
+        col_dict = OrderedDict()
+        for col in df.columns:
+            s = df[col]
+            if col in CATEGORICAL_COLNAMES:
+                s = s.astype("category")
+                codes = s.cat.codes.values if order is None else s.cat.codes.values[order]
+                col_dict[col] = pd.Categorical.from_codes(codes, categories=s.cat.categories).remove_unused_categories()
+            else:
+                values = s.values if order is None else s.values[order]
+                col_dict[col] = values.astype(dtype_dict[col], copy=False) if col in dtype_dict else values
+        df = pd.DataFrame(col_dict)
+
+        # Convert read_ids to the requested representation and reindex final df
+        if self.read_ids == "binary" and "read_id" in df:
+            self.logger.info ("\tEncoding read_ids")
+            encoded_df = self._encode_read_ids(df)
+            if encoded_df is None:
+                self.logger.warning ("WARNING: read_ids are not all UUIDs and cannot be encoded")
+            else:
+                df = encoded_df
+        elif self.read_ids == "string" and "read_id_hi" in df:
+            self.logger.info ("\tDecoding read_ids")
+            read_ids = uint64_to_read_id(df["read_id_hi"].values, df["read_id_lo"].values)
+            df = df.drop(columns=READ_ID_COLNAMES)
+            df.insert(0, "read_id", read_ids)
+
+        if "read_id" in df:
+            self.logger.info ("\tReindexing dataframe by read_ids")
+            df = df.set_index ("read_id")
+        return df
 
-        # Reindex final df
-        self.logger.info ("\tReindexing dataframe by read_ids")
-        df = df.reset_index (drop=True)
-        df = df.set_index ("read_id")
-        self.logger.info ("\t\t{:,} Final valid reads".format(len(df)))
+    def _binary_read_ids (self, df_list):
+        """
+        Encode the read_ids of all the dataframes in df_list as pairs of uint64 to speed up merges and duplicate filtering.
+        The dataframes are returned unchanged if any of the read_ids is not a UUID
+        """
+        if not "read_id" in df_list[0]:
+            return df_list
+
+        self.logger.debug ("\tEncoding read_ids as pairs of uint64")
+        encoded_list = []
+        for df in df_list:
+            if not df.empty:
+                df = self._encode_read_ids(df)
+                if df is None:
+                    self.logger.debug ("\t\tread_ids are not all UUIDs. Falling back to strings")
+                    return df_list
+            encoded_list.append(df)
+
+        self._read_id_cols = READ_ID_COLNAMES
+        return encoded_list
+
+    def _encode_read_ids (self, df):
+        """Replace the read_id column by 2 uint64 columns. Returns None if the read_ids are not all UUIDs"""
+        keys = read_id_to_uint64(df["read_id"].values)
+        if keys is None:
+            return None
+        df = df.drop(columns="read_id")
+        df.insert(0, "read_id_lo", keys[1])
+        df.insert(0, "read_id_hi", keys[0])
+        return df
 
-        # Save final df
-        self.counter["Valid reads"] = len(df)
-        if len(df) < 500:
-            self.logger.warning ("WARNING: Low number of reads found. This is likely to lead to errors when trying to generate plots")
+    def _read_id_keys (self, df):
+        """Return the read_ids of df in the format expected by duplicate_read_ids, encoded pairs of uint64 if available"""
+        if self._read_id_cols == READ_ID_COLNAMES:
+            return (df["read_id_hi"].values, df["read_id_lo"].values)
+        return df["read_id"].values
 
-        return df
+    def _add_counter (self, key, n):
+        """Increment a counter value, initialising it if needed"""
+        self.counter[key] = self.counter.get(key, 0)+n
 
-    def _get_read_stats(self, read):
-        """"""
+    def _cache_key (self):
+        """Fingerprint of the input files and of the parsing options"""
         d = OrderedDict()
-
-        # Extract general stats
-        d["ref_id"] = read.reference_name
-        d["ref_start"] = read.reference_start
-        d["ref_end"] = read.reference_end
-        d["align_len"] = read.query_alignment_length
-        d["mapq"] = read.mapping_quality
-
-        # Extract indel and soft_clip from cigar
-        c_stat = read.get_cigar_stats()[0]
-        d["insertion"] = c_stat[1]
-        d["deletion"] = c_stat[2]
-        d["soft_clip"] = c_stat[4]
-
-        # Compute alignment score from NM field if available
-        if read.has_tag("NM"):
-            edit_dist = read.get_tag("NM")
-            d["mismatch"] = edit_dist-(d["deletion"]+d["insertion"])
-            try:
-                d["identity_freq"] = (d["align_len"]-edit_dist)/d["align_len"]
-            except ZeroDivisionError:
-                d["identity_freq"] = 0
-
-        # If not NM try to compute score from MD field
-        elif read.has_tag("MD"):
-            md_err = 0
-            for i in read.get_tag("MD"):
-                if i in ["A","T","C","G","a","t","c","g"]:
-                    md_err += 1
-            d["mismatch"] = md_err-d["deletion"]
-            edit_dist = d["mismatch"]+d["insertion"]+d["deletion"]
-            try:
-                d["identity_freq"] = (d["align_len"]-edit_dist)/d["align_len"]
-            except ZeroDivisionError:
-                d["identity_freq"] = 0
-
-        return d
+        d["version"] = package_version
+        for name, fn_list in (("summary", self.summary_files_list), ("barcode", self.barcode_files_list), ("bam", self.bam_file_list)):
+            d[name] = [(path.abspath(fn), stat(fn).st_size, stat(fn).st_mtime) for fn in fn_list]
+        d["runid_list"] = self.runid_list
+        d["time_window"] = self.time_window
+        d["filter_calibration"] = self.filter_calibration
+        d["filter_duplicated"] = self.filter_duplicated
+        d["verify_duplicates"] = self.verify_duplicates
+        d["min_barcode_percent"] = self.min_barcode_percent
+        d["read_ids"] = self.read_ids
+        d["colnames"] = sorted(self.colnames) if self.colnames is not None else None
+        if self.bam_sample:
+            d["bam_sample"] = [self.bam_extra_sample, self.sample, self.min_pass_qual, self.min_pass_len]
+        return hashlib.sha1(json.dumps(d).encode()).hexdigest()
+
+    def _load_cache (self):
+        """Reload the cleaned data from the cache if available. Returns True if successful"""
+        cache_fn = path.join(self.cache_dir, self.cache_key)
+        if not path.isdir(cache_fn):
+            self.logger.debug ("\tNo cache entry found for key {}".format(self.cache_key))
+            return False
+
+        self.logger.warning ("Load cleaned data from cache")
+        try:
+            reads_df = read_df_columns(path.join(cache_fn, "reads_df"), index_col="read_id", mmap=self.memory_map)
+            alignments_df = read_df_columns(path.join(cache_fn, "alignments_df"))
+            with open(path.join(cache_fn, "parser.json")) as fp:
+                d = json.load(fp, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError, KeyError) as E:
+            self.logger.warning ("WARNING: Invalid cache entry {}: {}".format(cache_fn, E))
+            return False
+
+        self.reads_df = reads_df
+        self.alignments_df = alignments_df
+        self.ref_len_dict = d["ref_len_dict"]
+        self.counter = d["counter"]
+
+        # Mark the entry as recently used
+        utime(cache_fn)
+        self.logger.info ("\t{:,} valid reads loaded from {}".format(len(self.reads_df), cache_fn))
+        return True
+
+    def _save_cache (self):
+        """Save the cleaned data in the cache, then evict the least recently used entries if needed"""
+        cache_fn = path.join(self.cache_dir, self.cache_key)
+        self.logger.warning ("Save cleaned data to cache")
+        try:
+            # Write in a temporary directory first so that incomplete entries are never loaded
+            tmp_fn = cache_fn+".tmp"
+            shutil.rmtree(tmp_fn, ignore_errors=True)
+            reads_df = self.reads_df.reset_index() if self.reads_df.index.name == "read_id" else self.reads_df
+            write_df_columns(reads_df, path.join(tmp_fn, "reads_df"))
+            write_df_columns(self.alignments_df, path.join(tmp_fn, "alignments_df"))
+            with open(path.join(tmp_fn, "parser.json"), "w") as fp:
+                json.dump({"ref_len_dict":self.ref_len_dict, "counter":self.counter}, fp, default=int)
+            shutil.rmtree(cache_fn, ignore_errors=True)
+            rename(tmp_fn, cache_fn)
+            self.logger.info ("\tCache entry saved in {}".format(cache_fn))
+            evict_lru_dirs(self.cache_dir, max_size=self.cache_max_size*1e9, keep=[self.cache_key])
+            if self.memory_map:
+                self.logger.debug ("\tMemory map reads table from {}".format(cache_fn))
+                self.reads_df = read_df_columns(path.join(cache_fn, "reads_df"), index_col="read_id", mmap=True)
+        except (IOError, OSError, pycoQCError) as E:
+            self.logger.warning ("WARNING: Cannot write cache entry {}: {}".format(cache_fn, E))
+
+    def _summary_read_options (self):
+        """Define the summary columns to load and their dtypes, including all the known aliases of the column names"""
+        usecols = self.summary_required_colnames+self.summary_optional_colnames
+        dtype = dict(SUMMARY_COLNAMES_DTYPE)
+        for colname, std_colname in SUMMARY_COLNAMES_MAP.items():
+            if std_colname in usecols:
+                usecols.append(colname)
+            if std_colname in dtype:
+                dtype[colname] = dtype[std_colname]
+        return (usecols, dtype)
 
     def _select_df_columns(self, df, required_colnames, optional_colnames):
         """"""
@@ -399,4 +1265,308 @@ class pycoQC_parse ():
             if col in df:
                 col_found.append(col)
 
-        return df[col_found]
+        # Assemble the selected columns without copying them
+        return pd.concat([df[col] for col in col_found], axis=1, copy=False)
+
+    def _cast_summary_columns (self, df, integer=False):
+        """
+        Cast the summary columns which are not in their final dtype yet. Integer columns can only be cast after NA values
+        filtering, so they are only cast if integer is True
+        """
+        for col, dtype in SUMMARY_COLNAMES_DTYPE.items():
+            if col in df and (integer or not dtype.startswith(("int", "uint"))) and df[col].dtype != dtype:
+                df[col] = df[col].astype(dtype)
+        return df
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FUNCTIONS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def bam_file_stats (bam_file_list, colnames=BAM_COLNAMES, threads=1, read_ids=None):
+    """
+    Extract the per read alignment stats of a list of bam or sam files. Sorted and indexed bam files are parsed by regions (references,
+    or chunks of BAM_REGION_SIZE bases of the large references if threads > 1), with a pool of worker processes if threads > 1, and
+    their unmapped reads are counted from the index statistics instead of being read. The other files, including the standard input
+    ("-"), are read sequentially by the main process, concurrently with the pool.
+    Returns an OrderedDict of (primary alignments stats dataframe, Counter of the alignment types, OrderedDict of reference lengths)
+    per file. The alignments are in coordinate order for indexed files, else in file order, and duplicated read_ids are not filtered.
+    If read_ids is given, a 4th element holds the (hi, lo) hashes of the read_ids of the other primary alignments (see read_id_hash),
+    so that their duplicates can still be counted
+    * bam_file_list
+        List of paths to the bam or sam files
+    * colnames
+        Alignment fields to extract, among BAM_COLNAMES
+    * threads
+        Number of worker processes and bgzf decompression threads
+    * read_ids
+        If given, set of read_ids for which the primary alignment stats are extracted. The alignments of all the reads are still counted
+    """
+    # Define the regions to parse and the unmapped reads counts from the bam indexes
+    region_list = []
+    stream_list = []
+    ref_len_dict = OrderedDict()
+    unmapped_dict = OrderedDict()
+    for bam_fn in bam_file_list:
+        if not bam_is_indexed(bam_fn):
+            stream_list.append(bam_fn)
+            continue
+        with ps.AlignmentFile(bam_fn, "rb") as bam:
+            ref_len_dict[bam_fn] = OrderedDict(zip(bam.references, bam.lengths))
+            index_stats = bam.get_index_statistics()
+            unmapped_dict[bam_fn] = sum(i.unmapped for i in index_stats) + bam.nocoordinate
+            for i in index_stats:
+                if not i.mapped:
+                    continue
+                if threads > 1:
+                    ref_len = bam.get_reference_length(i.contig)
+                    for start in range(0, ref_len, BAM_REGION_SIZE):
+                        region_list.append((bam_fn, i.contig, start, min(start+BAM_REGION_SIZE, ref_len)))
+                else:
+                    region_list.append((bam_fn, i.contig, None, None))
+
+    # Parse regions, concurrently if needed. Pool.starmap returns the results in the same order as region_list
+    # The standard input is closed in the worker processes, so the unindexed files are read by the main process
+    if threads > 1 and len(region_list) > 1:
+        n_workers = min(threads, len(region_list))
+        bgzf_threads = max(1, threads//n_workers)
+        # The read_ids are sent once to each worker rather than with each region
+        with mp.Pool(n_workers, initializer=_init_bam_worker, initargs=(read_ids,)) as pool:
+            async_results = pool.starmap_async(_parse_bam_region_worker, [r+(colnames, bgzf_threads) for r in region_list])
+            stream_results = [_parse_bam_stream(bam_fn, colnames, read_ids=read_ids) for bam_fn in stream_list]
+            results = async_results.get()
+    else:
+        results = [_parse_bam_region(*r, cols=colnames, threads=threads, read_ids=read_ids) for r in region_list]
+        stream_results = [_parse_bam_stream(bam_fn, colnames, threads=threads, read_ids=read_ids) for bam_fn in stream_list]
+    stream_dict = OrderedDict(zip(stream_list, stream_results))
+
+    # Merge the results of the regions per file
+    bam_stats_dict = OrderedDict()
+    for bam_fn in bam_file_list:
+        if bam_fn in stream_dict:
+            bam_stats = stream_dict[bam_fn]
+            bam_stats_dict[bam_fn] = bam_stats if read_ids is not None else bam_stats[:3]
+            continue
+        alignments_dict = Counter()
+        df_list = []
+        other_read_ids_list = []
+        for region, (df, counts, other_read_ids) in zip(region_list, results):
+            if region[0] == bam_fn:
+                alignments_dict.update(counts)
+                if not df.empty:
+                    df_list.append(df)
+                if other_read_ids is not None:
+                    other_read_ids_list.append(other_read_ids)
+        if unmapped_dict[bam_fn]:
+            alignments_dict["Unmapped"] += unmapped_dict[bam_fn]
+        df = _concat_bam_df_list(df_list) if df_list else pd.DataFrame()
+        bam_stats_dict[bam_fn] = (df, alignments_dict, ref_len_dict[bam_fn])
+        if read_ids is not None:
+            other_read_ids = tuple(np.concatenate(k) for k in zip(*other_read_ids_list)) if other_read_ids_list else read_id_hash([])
+            bam_stats_dict[bam_fn] += (other_read_ids,)
+    return bam_stats_dict
+
+def bam_stats_dir (bam_fn):
+    """Path of the sidecar directory of the alignment stats of a bam file"""
+    return bam_fn+".pycoqc_stats"
+
+def _bam_stats_key (bam_fn):
+    """Fingerprint of a bam file and of its index, used to validate the sidecar directory"""
+    key = OrderedDict()
+    key["version"] = package_version
+    for name, fn in (("bam", bam_fn), ("index", bam_index_file(bam_fn))):
+        if fn:
+            st = stat(fn)
+            key[name] = [st.st_size, st.st_mtime]
+        else:
+            key[name] = None
+    return key
+
+def save_bam_stats (bam_fn, df, alignments_dict, ref_len_dict, colnames=BAM_COLNAMES):
+    """
+    Save the alignment stats of a bam file returned by bam_file_stats in a sidecar directory next to it, with the sizes and
+    modification times of the bam and index files. Raise IOError, OSError or pycoQCError if the directory cannot be written
+    """
+    stats_dir = bam_stats_dir(bam_fn)
+    tmp_dir = stats_dir+".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    mkdir(tmp_dir)
+    write_df_columns(df, path.join(tmp_dir, "reads_df"))
+    with open(path.join(tmp_dir, "bam_stats.json"), "w") as fp:
+        json.dump({"key":_bam_stats_key(bam_fn), "colnames":list(colnames), "alignments":alignments_dict, "ref_len_dict":ref_len_dict}, fp, default=int)
+    shutil.rmtree(stats_dir, ignore_errors=True)
+    rename(tmp_dir, stats_dir)
+
+def load_bam_stats (bam_fn, colnames=BAM_COLNAMES):
+    """
+    Reload the alignment stats of a bam file from its sidecar directory, in the same format as bam_file_stats. Returns None if the
+    sidecar directory is not found, if the bam or index files changed or if some of the alignment fields in colnames are missing
+    """
+    stats_dir = bam_stats_dir(bam_fn)
+    try:
+        with open(path.join(stats_dir, "bam_stats.json")) as fp:
+            d = json.load(fp, object_pairs_hook=OrderedDict)
+        if d["key"] != _bam_stats_key(bam_fn) or not set(colnames).issubset(d["colnames"]):
+            return None
+        df = read_df_columns(path.join(stats_dir, "reads_df"))
+    except (IOError, OSError, ValueError, KeyError, pycoQCError):
+        return None
+
+    # Only keep the fields requested
+    df = df[[c for c in df.columns if c == "read_id" or c in colnames]]
+    return (df, Counter(d["alignments"]), d["ref_len_dict"])
+
+# Read_ids selected in bam_file_stats, set once in each worker process
+_worker_read_ids = None
+
+def _init_bam_worker (read_ids):
+    """Store the read_ids selected in a worker process global"""
+    global _worker_read_ids
+    _worker_read_ids = read_ids
+
+def _parse_bam_region_worker (*args):
+    """_parse_bam_region with the read_ids selected stored in the worker process"""
+    return _parse_bam_region(*args, read_ids=_worker_read_ids)
+
+def _parse_bam_region (bam_fn, ref_id, start, end, cols, threads=1, read_ids=None):
+    """
+    Extract the alignment fields listed in cols from the mapped reads of a region of an indexed bam file. Reads are assigned to the
+    region containing their start position, so that the reads overlapping successive regions are only counted once.
+    Returns a dataframe of the primary alignments stats, a Counter of the alignment types and the hashes of the other primary
+    alignments read_ids if read_ids is given (see _parse_bam_reads)
+    """
+    with ps.AlignmentFile(bam_fn, "rb", threads=threads) as bam:
+        return _parse_bam_reads(bam.fetch(ref_id, start, end), bam.references, cols, start=start, read_ids=read_ids)
+
+def _parse_bam_stream (bam_fn, cols, threads=1, read_ids=None):
+    """
+    Extract the alignment fields listed in cols from all the reads of an unsorted or unindexed bam or sam file, or of the standard
+    input, in a single sequential pass. The unmapped reads are counted while reading. Returns a dataframe of the primary alignments
+    stats, a Counter of the alignment types, an OrderedDict of the reference lengths and the hashes of the other primary alignments
+    read_ids if read_ids is given (see _parse_bam_reads)
+    """
+    with ps.AlignmentFile(bam_fn, "r", threads=threads) as bam:
+        df, alignments_dict, other_read_ids = _parse_bam_reads(bam.fetch(until_eof=True), bam.references, cols, count_unmapped=True, read_ids=read_ids)
+        return (df, alignments_dict, OrderedDict(zip(bam.references, bam.lengths)), other_read_ids)
+
+def _parse_bam_reads (reads, references, cols, start=None, count_unmapped=False, read_ids=None):
+    """
+    Extract the alignment fields listed in cols from an iterator of reads, skipping those starting before start.
+    If a set of read_ids is given, the other reads are only counted, from their flags, and the read_ids of their primary alignments
+    are hashed to detect their duplicates (see read_id_hash).
+    The fields are appended to typed arrays (uint32 positions and lengths, uint8 mapq) and the error rates are computed at the end
+    for all the reads at once. Returns a dataframe of the primary alignments stats, a Counter of the alignment types and the
+    hashes of the other primary alignments read_ids, or None if read_ids is not given
+    """
+    with_cigar = bool(set(cols).intersection(["insertion", "deletion", "soft_clip", "mismatch", "identity_freq"]))
+    with_error = "mismatch" in cols or "identity_freq" in cols
+
+    alignments_dict = Counter()
+    unmapped = 0
+    read_id_list = []
+    other_read_id_list = []
+    arrays = OrderedDict((field, array(typecode)) for field, typecode in BAM_ARRAY_TYPECODES.items())
+    md_index = []
+    md_list = []
+    for read in reads:
+        if read.is_unmapped:
+            unmapped+=1
+            continue
+        elif start and read.reference_start < start:
+            continue
+        elif read.is_secondary:
+            alignments_dict["Secondary"]+=1
+        elif read.is_supplementary:
+            alignments_dict["Suplementary"]+=1
+        else:
+            alignments_dict["Primary"]+=1
+            if read_ids is not None and not read.query_name in read_ids:
+                other_read_id_list.append(read.query_name)
+                continue
+            read_id_list.append(read.query_name)
+            arrays["ref_id"].append(read.reference_id)
+            if "ref_start" in cols:
+                arrays["ref_start"].append(read.reference_start)
+            if "ref_end" in cols:
+                arrays["ref_end"].append(read.reference_end or read.reference_start)
+            arrays["align_len"].append(read.query_alignment_length)
+            if "mapq" in cols:
+                arrays["mapq"].append(read.mapping_quality)
+
+            # Extract indel and soft_clip from cigar
+            if with_cigar:
+                c_stat = read.get_cigar_stats()[0]
+                arrays["insertion"].append(c_stat[1])
+                arrays["deletion"].append(c_stat[2])
+                arrays["soft_clip"].append(c_stat[4])
+
+            # Edit distance from the NM field if available, else from the MD field once all the reads are parsed
+            if with_error:
+                try:
+                    arrays["edit_dist"].append(read.get_tag("NM"))
+                except KeyError:
+                    arrays["edit_dist"].append(np.nan)
+                    if read.has_tag("MD"):
+                        md_index.append(len(read_id_list)-1)
+                        md_list.append(read.get_tag("MD"))
+
+    # Unmapped reads of indexed files are counted from the index statistics
+    if count_unmapped and unmapped:
+        alignments_dict["Unmapped"] = unmapped
+
+    other_read_ids = read_id_hash(other_read_id_list) if read_ids is not None else None
+
+    # Wrap the arrays in numpy arrays without copy
+    values = OrderedDict((field, np.frombuffer(a, dtype=a.typecode)) for field, a in arrays.items() if len(a))
+    df = pd.DataFrame()
+    if not read_id_list:
+        return (df, alignments_dict, other_read_ids)
+    df["read_id"] = read_id_list
+    df["ref_id"] = pd.Categorical.from_codes(values["ref_id"], categories=references).remove_unused_categories()
+    for field in ["ref_start", "ref_end", "align_len", "mapq", "insertion", "deletion", "soft_clip"]:
+        if field in cols and field in values:
+            df[field] = values[field]
+
+    # Compute the mismatches and identity of all the reads with a NM or MD field at once
+    if with_error:
+        edit_dist = values["edit_dist"].astype(np.float64)
+        if md_list:
+            md_index = np.array(md_index)
+            edit_dist[md_index] = _md_base_counts(md_list)+values["insertion"][md_index]
+        if not np.isnan(edit_dist).all():
+            if "mismatch" in cols:
+                df["mismatch"] = (edit_dist-values["insertion"]-values["deletion"]).astype(np.float32)
+            if "identity_freq" in cols:
+                align_len = values["align_len"]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    identity_freq = np.where(align_len > 0, (align_len-edit_dist)/align_len, 0)
+                df["identity_freq"] = np.where(np.isnan(edit_dist), np.nan, identity_freq).astype(np.float32)
+
+    return (df, alignments_dict, other_read_ids)
+
+def _md_base_counts (md_list):
+    """
+    Count the reference bases (A, C, G or T) of a list of MD tag strings, i.e. the mismatched and deleted bases of each alignment.
+    All the strings are concatenated and the bases are counted with a lookup table in a single vectorized pass
+    """
+    md = np.frombuffer("".join(md_list).encode(), dtype=np.uint8)
+    cumcount = np.concatenate([[0], np.cumsum(_MD_BASES[md])])
+    md_len = np.fromiter(map(len, md_list), dtype=np.int64, count=len(md_list))
+    ends = np.cumsum(md_len)
+    return cumcount[ends]-cumcount[ends-md_len]
+
+def _concat_bam_df_list (df_list):
+    """
+    Concatenate the alignment stats dataframes of several regions. The fields which could not be computed for any read of a
+    region (no NM or MD tag) are added as missing values
+    """
+    colnames = []
+    for df in df_list:
+        colnames.extend(c for c in df.columns if not c in colnames)
+    return concat_df_list([df if list(df.columns) == colnames else df.reindex(columns=colnames) for df in df_list])
+
+def _plot_sample_positions (n_reads, sample):
+    """
+    Positions of the reads randomly sampled among n_reads by pycoQC_plot (DataFrame.sample with the same seed), or all the positions
+    if no sampling is needed
+    """
+    if not sample or n_reads <= sample:
+        return np.arange(n_reads)
+    return pd.Series(np.arange(n_reads)).sample(n=sample, random_state=SEED).values
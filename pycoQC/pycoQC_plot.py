@@ -16,7 +16,7 @@ from plotly.subplots import make_subplots
 
 # Local lib import
 from pycoQC.common import *
-from pycoQC.pycoQC_parse import pycoQC_parse
+from pycoQC.pycoQC_parse import pycoQC_parse, BAM_COLNAMES
 from pycoQC import __name__ as package_name
 from pycoQC import __version__ as package_version
 
@@ -28,6 +28,17 @@ np.random.RandomState(seed=SEED)
 # Silence futurewarnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~DECORATORS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+def _required_colnames (*colnames):
+    """
+    Declare the optional columns of reads_df used by a plotting method, on top of the required summary columns
+    (run_id, channel, start_time, read_len and mean_qscore) which are always available
+    """
+    def decorator (func):
+        func.required_colnames = list(colnames)
+        return func
+    return decorator
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~MAIN CLASS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 class pycoQC_plot ():
 
@@ -53,21 +64,38 @@ class pycoQC_plot ():
         self.logger = get_logger (name=__name__, verbose=verbose, quiet=quiet)
         self.logger.warning ("Loading plotting interface")
 
-        # Save args to self values
-        self.min_pass_qual = min_pass_qual
-        self.sample = sample
-
         # Check that parser is a valid instance of pycoQC_parse
         if not isinstance(parser, pycoQC_parse):
             raise pycoQCError ("{} is not a valid pycoQC_parse object".format(parser))
         self.parser = parser
 
+        # In streaming mode the pass reads are defined at parsing time
+        self.aggregate = parser.aggregate
+        if self.is_streaming and (min_pass_qual != self.aggregate.min_pass_qual or min_pass_len != self.aggregate.min_pass_len):
+            self.logger.warning ("WARNING: Streaming mode, using min_pass_qual and min_pass_len values defined in the parser")
+            min_pass_qual = self.aggregate.min_pass_qual
+            min_pass_len = self.aggregate.min_pass_len
+
+        # Save args to self values
+        self.min_pass_qual = min_pass_qual
+        self.sample = sample
+
         # Extract values from parser object
         self.all_df = parser.reads_df
         if self.has_alignment:
             self.ref_len_dict = parser.ref_len_dict
             self.alignments_df = parser.alignments_df
-        self.logger.info ("\tFound {:,} total reads".format(len(self.all_df)))
+        self.logger.info ("\tFound {:,} total reads".format(self._basecalled_reads("all")))
+
+        # In streaming mode all_df is already a sample of the reads
+        if self.is_streaming:
+            self.all_sample_df = self.all_df
+            self.all_scaling_factor = self._basecalled_reads("all")/len(self.all_df)
+            self.pass_df = self.all_df.query ("mean_qscore>={} and read_len>={}".format(min_pass_qual, min_pass_len))
+            self.pass_sample_df = self.pass_df
+            self.pass_scaling_factor = self._basecalled_reads("pass")/len(self.pass_df) if len(self.pass_df) else 1
+            self.logger.info ("\tFound {:,} pass reads (qual >= {} and length >= {})".format(self._basecalled_reads("pass"), min_pass_qual, min_pass_len))
+            return
 
         # Save df wiews and compute scaling factors
         if sample and len(self.all_df)>sample:
@@ -86,22 +114,44 @@ class pycoQC_plot ():
             self.pass_scaling_factor = 1
         self.logger.info ("\tFound {:,} pass reads (qual >= {} and length >= {})".format(len(self.pass_df), min_pass_qual, min_pass_len))
 
+        # If the alignment stats were only extracted for a sample of the reads, the alignment summaries are estimated from this sample
+        if self.has_alignment_sample:
+            self.all_alignment_df = self.all_df[self.all_df["alignment_sample"].values]
+            self.pass_alignment_df = self.pass_df[self.pass_df["alignment_sample"].values]
+            self.logger.info ("\tAlignment stats estimated from {:,} sampled reads".format(len(self.all_alignment_df)))
+
     def __str__(self):
         m = ""
         m+= "\tBarcode: {}\n".format(self.has_barcodes)
         m+= "\tAlignment: {}\n".format(self.has_alignment)
         m+= "\tPromethion: {}\n".format(self.is_promethion)
-        m+= "\tAll reads: {:,}\n".format(len(self.all_df))
-        m+= "\tAll bases: {:,}\n".format(int(self.all_df["read_len"].sum()))
-        m+= "\tAll median read length: {:,}\n".format(np.median(self.all_df["read_len"]))
-        m+= "\tPass reads: {:,}\n".format(len(self.pass_df))
-        m+= "\tPass bases: {:,}\n".format(int(self.pass_df["read_len"].sum()))
-        m+= "\tPass median read length: {:,}\n".format(np.median(self.pass_df["read_len"]))
+        m+= "\tStreaming: {}\n".format(self.is_streaming)
+        m+= "\tAll reads: {:,}\n".format(self._basecalled_reads("all"))
+        m+= "\tAll bases: {:,}\n".format(self._basecalled_bases("all"))
+        m+= "\tAll median read length: {:,}\n".format(self._basecall_median_read_len("all"))
+        m+= "\tPass reads: {:,}\n".format(self._basecalled_reads("pass"))
+        m+= "\tPass bases: {:,}\n".format(self._basecalled_bases("pass"))
+        m+= "\tPass median read length: {:,}\n".format(self._basecall_median_read_len("pass"))
         return m
 
     def __repr__(self):
         return "[{}]\n".format(self.__class__.__name__)
 
+    @classmethod
+    def required_colnames (cls, method_names):
+        """
+        Return the union of the optional reads_df columns used by a list of plotting methods.
+        The result can be passed to pycoQC_parse (colnames) to avoid loading unused columns and files
+        * method_names
+            List of names of pycoQC_plot methods. Invalid method names are ignored
+        """
+        colnames = []
+        for method_name in method_names:
+            for colname in getattr(getattr(cls, method_name, None), "required_colnames", []):
+                if not colname in colnames:
+                    colnames.append(colname)
+        return colnames
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~PROPERTY METHODS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
     @property
     def has_barcodes (self):
@@ -111,6 +161,10 @@ class pycoQC_plot ():
     def has_alignment (self):
         return "ref_id" in self.all_df
 
+    @property
+    def has_alignment_sample (self):
+        return "alignment_sample" in self.all_df
+
     @property
     def has_identity_freq (self):
         return "identity_freq" in self.all_df
@@ -124,62 +178,128 @@ class pycoQC_plot ():
         if self.has_alignment:
             return np.sum(list(self.ref_len_dict.values()))
 
-    def _run_duration(self, df):
-        return float(np.ptp(df["start_time"])/3600)
-
-    def _active_channels(self, df):
-        return int(df["channel"].nunique())
-
-    def _runid_number(self, df):
-        return int(df["run_id"].nunique())
-
-    def _barcodes_number(self, df):
-        return int(df["barcode"].nunique()) if self.has_barcodes else 0
-
-    def _basecalled_reads(self, df):
-        return len(df)
-
-    def _basecalled_bases(self, df):
-        return int(df["read_len"].sum())
-
-    def _basecall_N50(self, df):
-        return self._compute_N50(df["read_len"])
-
-    def _basecall_median_read_len(self, df):
-        return np.median(df["read_len"])
-
-    def _basecall_median_read_qscore(self, df):
-        return np.median(df["mean_qscore"])
+    @property
+    def is_streaming (self):
+        return self.aggregate is not None
 
-    def _alignment_mean_coverage(self, df):
-        return df["align_len"].dropna().sum()/self.total_ref_len if self.has_alignment else np.nan
+    def _get_df (self, df_level):
+        return self.pass_df if df_level == "pass" else self.all_df
 
-    def _aligned_reads(self, df):
-        return len(df["align_len"].dropna()) if self.has_alignment else np.nan
+    def _get_field (self, df_level, field):
+        """
+        Return the values of a field and the scaling factor of the counts and sums. Alignment fields are taken from the alignment
+        sample if the alignment stats were only extracted for a sample of the reads
+        """
+        if self.has_alignment_sample and field in BAM_COLNAMES:
+            df = self.pass_alignment_df if df_level == "pass" else self.all_alignment_df
+            return (df[field], len(self._get_df(df_level))/len(df) if len(df) else 1)
+        return (self._get_df(df_level)[field], 1)
+
+    def _run_duration(self, df_level):
+        if self.is_streaming:
+            return self.aggregate[df_level].run_duration()
+        return float(np.ptp(self._get_df(df_level)["start_time"])/3600)
+
+    def _active_channels(self, df_level):
+        if self.is_streaming:
+            return self.aggregate[df_level].active_channels()
+        return int(self._get_df(df_level)["channel"].nunique())
+
+    def _runid_number(self, df_level):
+        if self.is_streaming:
+            return self.aggregate[df_level].runid_number()
+        return int(self._get_df(df_level)["run_id"].nunique())
+
+    def _barcodes_number(self, df_level):
+        if not self.has_barcodes:
+            return 0
+        if self.is_streaming:
+            return self.aggregate[df_level].barcodes_number()
+        return int(self._get_df(df_level)["barcode"].nunique())
 
-    def _aligned_bases(self, df):
-        return int(df["align_len"].dropna().sum()) if self.has_alignment else np.nan
+    def _basecalled_reads(self, df_level):
+        if self.is_streaming:
+            return self.aggregate[df_level].reads
+        return len(self._get_df(df_level))
 
-    def _alignment_N50(self, df):
-        return self._compute_N50(df["align_len"]) if self.has_alignment else np.nan
+    def _basecalled_bases(self, df_level):
+        if self.is_streaming:
+            return self.aggregate[df_level].bases
+        return int(self._get_df(df_level)["read_len"].sum())
 
-    def _alignment_median_read_len(self, df):
-        return np.median(df["align_len"].dropna()) if self.has_alignment else np.nan
+    def _basecall_N50(self, df_level):
+        return self._field_N50(df_level, "read_len")
 
-    def _alignment_median_identity(self, df):
-        return np.median(df["identity_freq"].dropna()) if self.has_identity_freq else np.nan
+    def _basecall_median_read_len(self, df_level):
+        return self._field_median(df_level, "read_len")
 
-    def _alignment_insertion_rate(self, df):
-        return df["insertion"].dropna().sum()/self._aligned_bases(df) if self.has_identity_freq else np.nan
+    def _basecall_median_read_qscore(self, df_level):
+        return self._field_median(df_level, "mean_qscore")
 
-    def _alignment_deletion_rate(self, df):
-        return df["deletion"].dropna().sum()/self._aligned_bases(df) if self.has_identity_freq else np.nan
+    def _alignment_mean_coverage(self, df_level):
+        return self._field_sum(df_level, "align_len")/self.total_ref_len if self.has_alignment else np.nan
 
-    def _alignment_mismatch_rate(self, df):
-        return df["mismatch"].dropna().sum()/self._aligned_bases(df) if self.has_identity_freq else np.nan
+    def _aligned_reads(self, df_level):
+        if not self.has_alignment:
+            return np.nan
+        if self.is_streaming:
+            return int(self.aggregate[df_level].field_counts("align_len").sum())
+        data, scaling_factor = self._get_field(df_level, "align_len")
+        return int(round(data.count()*scaling_factor))
+
+    def _aligned_bases(self, df_level):
+        return int(self._field_sum(df_level, "align_len")) if self.has_alignment else np.nan
+
+    def _alignment_N50(self, df_level):
+        return self._field_N50(df_level, "align_len") if self.has_alignment else np.nan
+
+    def _alignment_median_read_len(self, df_level):
+        return self._field_median(df_level, "align_len") if self.has_alignment else np.nan
+
+    def _alignment_median_identity(self, df_level):
+        return self._field_median(df_level, "identity_freq") if self.has_identity_freq else np.nan
+
+    def _alignment_insertion_rate(self, df_level):
+        return self._field_sum(df_level, "insertion")/self._aligned_bases(df_level) if self.has_identity_freq else np.nan
+
+    def _alignment_deletion_rate(self, df_level):
+        return self._field_sum(df_level, "deletion")/self._aligned_bases(df_level) if self.has_identity_freq else np.nan
+
+    def _alignment_mismatch_rate(self, df_level):
+        return self._field_sum(df_level, "mismatch")/self._aligned_bases(df_level) if self.has_identity_freq else np.nan
+
+    def _field_sum(self, df_level, field):
+        if self.is_streaming:
+            return self.aggregate[df_level].sum(field)
+        data, scaling_factor = self._get_field(df_level, field)
+        return data.dropna().sum()*scaling_factor if scaling_factor != 1 else data.dropna().sum()
+
+    def _field_N50(self, df_level, field):
+        if self.is_streaming:
+            return self.aggregate[df_level].N50(field)
+        return self._compute_N50(self._get_field(df_level, field)[0])
+
+    def _field_median(self, df_level, field):
+        if self.is_streaming:
+            return self.aggregate[df_level].median(field)
+        return np.median(self._get_field(df_level, field)[0].dropna())
+
+    def _field_percentiles(self, df_level, field):
+        if self.is_streaming:
+            return self.aggregate[df_level].percentiles(field)
+        return self._compute_percentiles(self._get_field(df_level, field)[0])
+
+    def _field_hist(self, df_level, field, x_scale="linear", smooth_sigma=2, nbins=200):
+        if self.is_streaming:
+            counts = self.aggregate[df_level].field_counts(field)
+            return self._compute_hist(data=counts.index.values, weights=counts.values, x_scale=x_scale, smooth_sigma=smooth_sigma, nbins=nbins)
+        data, scaling_factor = self._get_field(df_level, field)
+        weights = np.full(len(data), scaling_factor) if scaling_factor != 1 else None
+        return self._compute_hist(data=data, weights=weights, x_scale=x_scale, smooth_sigma=smooth_sigma, nbins=nbins)
 
     #~~~~~~~SUMMARY_STATS_DICT METHOD AND HELPER~~~~~~~#
 
+    @_required_colnames("barcode", "ref_id", "align_len", "insertion", "deletion", "mismatch", "identity_freq")
     def summary_stats_dict (self):
         """
         Return a dictionnary containing exhaustive information about the run.
@@ -191,52 +311,52 @@ class pycoQC_plot ():
         d["pycoqc"]["version"] = package_version
         d["pycoqc"]["date"] = datetime.datetime.now().strftime("%d/%m/%y")
 
-        for df, lab in ((self.all_df, "All Reads"), (self.pass_df, "Pass Reads")):
-            d[lab] = self._compute_stats(df)
+        for df_level, lab in (("all", "All Reads"), ("pass", "Pass Reads")):
+            d[lab] = self._compute_stats(df_level)
         return d
 
-    def _compute_stats (self, df):
+    def _compute_stats (self, df_level):
         d = OrderedDict ()
         # run information
         d["run"] = OrderedDict()
-        d["run"]["run_duration"] = self._run_duration(df)
-        d["run"]["active_channels"] = self._active_channels(df)
-        d["run"]["runid_number"] = self._runid_number(df)
-        d["run"]["barcodes_number"] = self._barcodes_number(df)
+        d["run"]["run_duration"] = self._run_duration(df_level)
+        d["run"]["active_channels"] = self._active_channels(df_level)
+        d["run"]["runid_number"] = self._runid_number(df_level)
+        d["run"]["barcodes_number"] = self._barcodes_number(df_level)
         d["basecall"] = OrderedDict()
-        d["basecall"]["reads_number"] = self._basecalled_reads(df)
-        d["basecall"]["bases_number"] = self._basecalled_bases(df)
-        d["basecall"]["N50"] = self._basecall_N50(df)
-        d["basecall"]["len_percentiles"] = self._compute_percentiles (df["read_len"])
-        d["basecall"]["qual_score_percentiles"] = self._compute_percentiles (df["mean_qscore"])
+        d["basecall"]["reads_number"] = self._basecalled_reads(df_level)
+        d["basecall"]["bases_number"] = self._basecalled_bases(df_level)
+        d["basecall"]["N50"] = self._basecall_N50(df_level)
+        d["basecall"]["len_percentiles"] = self._field_percentiles (df_level, "read_len")
+        d["basecall"]["qual_score_percentiles"] = self._field_percentiles (df_level, "mean_qscore")
 
-        x,y = self._compute_hist(data=df["read_len"],x_scale="log",smooth_sigma=2,nbins=100)
+        x,y = self._field_hist(df_level, "read_len", x_scale="log",smooth_sigma=2,nbins=100)
         d["basecall"]["len_hist"] = OrderedDict ()
         d["basecall"]["len_hist"]["x"] = x
         d["basecall"]["len_hist"]["y"] = y
-        x,y = self._compute_hist(data=df["mean_qscore"],x_scale="linear",smooth_sigma=2,nbins=100)
+        x,y = self._field_hist(df_level, "mean_qscore", x_scale="linear",smooth_sigma=2,nbins=100)
         d["basecall"]["qual_score_hist"] = OrderedDict ()
         d["basecall"]["qual_score_hist"]["x"] = x
         d["basecall"]["qual_score_hist"]["y"] = y
 
         if self.has_alignment:
             d["alignment"] = OrderedDict()
-            d["alignment"]["reads_number"] = self._aligned_reads(df)
-            d["alignment"]["bases_number"] = self._aligned_bases(df)
-            d["alignment"]["mean_coverage"] = self._alignment_mean_coverage(df)
-            d["alignment"]["N50"] = self._alignment_N50(df)
-            d["alignment"]["len_percentiles"] = self._compute_percentiles (df["align_len"])
-            x,y = self._compute_hist(data=df["align_len"],x_scale="log",smooth_sigma=2,nbins=100)
+            d["alignment"]["reads_number"] = self._aligned_reads(df_level)
+            d["alignment"]["bases_number"] = self._aligned_bases(df_level)
+            d["alignment"]["mean_coverage"] = self._alignment_mean_coverage(df_level)
+            d["alignment"]["N50"] = self._alignment_N50(df_level)
+            d["alignment"]["len_percentiles"] = self._field_percentiles (df_level, "align_len")
+            x,y = self._field_hist(df_level, "align_len", x_scale="log",smooth_sigma=2,nbins=100)
             d["alignment"]["len_hist"] = OrderedDict ()
             d["alignment"]["len_hist"]["x"] = x
             d["alignment"]["len_hist"]["y"] = y
 
             if self.has_identity_freq:
-                d["alignment"]["identity_freq_percentiles"] = self._compute_percentiles (df["identity_freq"])
-                d["alignment"]["insertion_rate"] = self._alignment_insertion_rate(df)
-                d["alignment"]["deletion_rate"] = self._alignment_deletion_rate(df)
-                d["alignment"]["mismatch_rate"] = self._alignment_mismatch_rate(df)
-                x,y = self._compute_hist(data=df["identity_freq"],x_scale="linear",smooth_sigma=2,nbins=100)
+                d["alignment"]["identity_freq_percentiles"] = self._field_percentiles (df_level, "identity_freq")
+                d["alignment"]["insertion_rate"] = self._alignment_insertion_rate(df_level)
+                d["alignment"]["deletion_rate"] = self._alignment_deletion_rate(df_level)
+                d["alignment"]["mismatch_rate"] = self._alignment_mismatch_rate(df_level)
+                x,y = self._field_hist(df_level, "identity_freq", x_scale="linear",smooth_sigma=2,nbins=100)
                 d["alignment"]["identity_freq_hist"] = OrderedDict ()
                 d["alignment"]["identity_freq_hist"]["x"] = x
                 d["alignment"]["identity_freq_hist"]["y"] = y
@@ -245,6 +365,7 @@ class pycoQC_plot ():
 
     #~~~~~~~SUMMARY METHODS AND HELPER~~~~~~~#
 
+    @_required_colnames("barcode")
     def run_summary (self,
         width:int = None,
         height:int = 300,
@@ -262,13 +383,13 @@ class pycoQC_plot ():
         """
         # Extract data
         data = []
-        for status, df in (("All Reads", self.all_df), ("Pass Reads", self.pass_df)):
+        for status, df_level in (("All Reads", "all"), ("Pass Reads", "pass")):
             data.append([
                 status,
-                self._run_duration(df),
-                self._active_channels(df),
-                self._runid_number(df),
-                self._barcodes_number(df)])
+                self._run_duration(df_level),
+                self._active_channels(df_level),
+                self._runid_number(df_level),
+                self._barcodes_number(df_level)])
 
         fig = self.__summary_plot (
             width = width,
@@ -280,6 +401,7 @@ class pycoQC_plot ():
 
         return fig
 
+    @_required_colnames()
     def basecall_summary (self,
         width:int = None,
         height:int = 300,
@@ -297,14 +419,14 @@ class pycoQC_plot ():
         """
         # Extract data
         data = []
-        for status, df in (("All Reads", self.all_df), ("Pass Reads", self.pass_df)):
+        for status, df_level in (("All Reads", "all"), ("Pass Reads", "pass")):
             data.append([
                 status,
-                self._basecalled_reads(df),
-                self._basecalled_bases(df),
-                self._basecall_N50(df),
-                self._basecall_median_read_len(df),
-                self._basecall_median_read_qscore(df)])
+                self._basecalled_reads(df_level),
+                self._basecalled_bases(df_level),
+                self._basecall_N50(df_level),
+                self._basecall_median_read_len(df_level),
+                self._basecall_median_read_qscore(df_level)])
 
         fig = self.__summary_plot (
             width = width,
@@ -316,6 +438,7 @@ class pycoQC_plot ():
 
         return fig
 
+    @_required_colnames("ref_id", "align_len", "identity_freq")
     def alignment_summary (self,
         width:int = None,
         height:int = 300,
@@ -336,15 +459,15 @@ class pycoQC_plot ():
             raise pycoQCError ("No Alignment information available")
 
         data = []
-        for status, df in (("All Reads", self.all_df), ("Pass Reads", self.pass_df)):
+        for status, df_level in (("All Reads", "all"), ("Pass Reads", "pass")):
             data.append([
                 status,
-                self._aligned_reads(df),
-                self._aligned_bases(df),
-                self._alignment_mean_coverage(df),
-                self._alignment_N50(df),
-                self._alignment_median_read_len(df),
-                self._alignment_median_identity(df)])
+                self._aligned_reads(df_level),
+                self._aligned_bases(df_level),
+                self._alignment_mean_coverage(df_level),
+                self._alignment_N50(df_level),
+                self._alignment_median_read_len(df_level),
+                self._alignment_median_identity(df_level)])
 
         fig = self.__summary_plot (
             width = width,
@@ -383,6 +506,7 @@ class pycoQC_plot ():
         return go.Figure (data=data, layout=layout)
 
     #~~~~~~~1D DISTRIBUTION METHODS AND HELPER~~~~~~~#
+    @_required_colnames()
     def read_len_1D (self,
         color:str="lightsteelblue",
         nbins:int=200,
@@ -417,6 +541,7 @@ class pycoQC_plot ():
             height=height)
         return fig
 
+    @_required_colnames()
     def read_qual_1D (self,
         color:str="salmon",
         nbins:int=200,
@@ -451,6 +576,7 @@ class pycoQC_plot ():
             height=height)
         return fig
 
+    @_required_colnames("ref_id", "align_len")
     def align_len_1D (self,
         color:str="mediumseagreen",
         nbins:int=200,
@@ -489,6 +615,7 @@ class pycoQC_plot ():
             height=height)
         return fig
 
+    @_required_colnames("identity_freq")
     def identity_freq_1D (self,
         color:str="sandybrown",
         nbins:int=200,
@@ -615,6 +742,7 @@ class pycoQC_plot ():
         return (label, data_dict, layout_dict)
 
     #~~~~~~~2D DISTRIBUTION METHOD AND HELPER~~~~~~~#
+    @_required_colnames()
     def read_len_read_qual_2D (self,
         colorscale = [
             [0.0,'rgba(255,255,255,0)'],
@@ -662,6 +790,7 @@ class pycoQC_plot ():
             plot_title = plot_title)
         return fig
 
+    @_required_colnames("ref_id", "align_len")
     def read_len_align_len_2D (self,
         colorscale = [
             [0.0,'rgba(255,255,255,0)'],
@@ -713,6 +842,7 @@ class pycoQC_plot ():
             plot_title = plot_title)
         return fig
 
+    @_required_colnames("align_len", "identity_freq")
     def align_len_identity_freq_2D (self,
         colorscale = [
             [0.0,'rgba(255,255,255,0)'],
@@ -763,6 +893,7 @@ class pycoQC_plot ():
             plot_title = plot_title)
         return fig
 
+    @_required_colnames("identity_freq")
     def read_qual_identity_freq_2D (self,
         colorscale = [
             [0.0,'rgba(255,255,255,0)'],
@@ -891,6 +1022,7 @@ class pycoQC_plot ():
         return (label, data_dict)
 
     #~~~~~~~OUTPUT_OVER_TIME METHODS AND HELPER~~~~~~~#
+    @_required_colnames()
     def output_over_time (self,
         cumulative_color:str="rgb(204,226,255)",
         interval_color:str="rgb(102,168,255)",
@@ -962,8 +1094,13 @@ class pycoQC_plot ():
         self.logger.debug ("\t\tPreparing data for {} {}".format(df_level, count_level))
 
         # Get data and scaling factor
-        df = self.pass_sample_df if df_level == "pass" else self.all_sample_df
-        sf = self.pass_scaling_factor if df_level == "pass" else self.all_scaling_factor
+        # In streaming mode use the exact reads and bases counts aggregated per start_time bins
+        if self.is_streaming:
+            df = self.aggregate[df_level].time_df()
+            sf = 1
+        else:
+            df = self.pass_sample_df if df_level == "pass" else self.all_sample_df
+            sf = self.pass_scaling_factor if df_level == "pass" else self.all_scaling_factor
 
         # Bin data in categories
         t = (df["start_time"]/3600).values
@@ -971,7 +1108,9 @@ class pycoQC_plot ():
         t = np.digitize (t, bins=x, right=True)
 
         # Count reads or bases per categories
-        if count_level == "reads":
+        if self.is_streaming:
+            y = np.bincount(t, weights=df[count_level].values)
+        elif count_level == "reads":
             y = np.bincount(t)
         elif count_level == "bases":
             y = np.bincount(t, weights=df["read_len"].values)
@@ -1012,6 +1151,7 @@ class pycoQC_plot ():
         return (label, data_dict, layout_dict)
 
     #~~~~~~~QUAL_OVER_TIME METHODS AND HELPER~~~~~~~#
+    @_required_colnames()
     def read_len_over_time (self,
         median_color:str="rgb(102,168,255)",
         quartile_color:str="rgb(153,197,255)",
@@ -1054,6 +1194,7 @@ class pycoQC_plot ():
             height = height)
         return fig
 
+    @_required_colnames()
     def read_qual_over_time (self,
         median_color:str="rgb(250,128,114)",
         quartile_color:str="rgb(250,170,160)",
@@ -1097,6 +1238,7 @@ class pycoQC_plot ():
             height = height)
         return fig
 
+    @_required_colnames("ref_id", "align_len")
     def align_len_over_time (self,
         median_color:str="rgb(102,168,255)",
         quartile_color:str="rgb(153,197,255)",
@@ -1143,6 +1285,7 @@ class pycoQC_plot ():
             height = height)
         return fig
 
+    @_required_colnames("identity_freq")
     def identity_freq_over_time (self,
         median_color:str="rgb(250,128,114)",
         quartile_color:str="rgb(250,170,160)",
@@ -1285,6 +1428,7 @@ class pycoQC_plot ():
         return (label, data_dict)
 
     #~~~~~~~BARCODE_COUNT METHODS AND HELPER~~~~~~~#
+    @_required_colnames("barcode")
     def barcode_counts (self,
         colors:list=["#f8bc9c", "#f6e9a1", "#f5f8f2", "#92d9f5", "#4f97ba"],
         width:int= None,
@@ -1335,9 +1479,12 @@ class pycoQC_plot ():
         self.logger.debug ("\t\tPreparing data for {} reads".format(df_level))
 
         # get data
-        df = self.pass_df if df_level == "pass" else self.all_df
-        counts = df["barcode"].value_counts()
-        counts = counts.sort_index()
+        if self.is_streaming:
+            counts = self.aggregate[df_level].field_counts("barcode")
+        else:
+            df = self.pass_df if df_level == "pass" else self.all_df
+            counts = category_counts(df["barcode"].astype("category"))
+            counts = counts[counts>0].sort_index()
 
         # Extract label and values
         data_dict = dict (
@@ -1348,6 +1495,7 @@ class pycoQC_plot ():
         return (label, data_dict)
 
     #~~~~~~~BARCODE_COUNT METHODS AND HELPER~~~~~~~# ############################################################################# ADD TABLE AS IN ALIGNMENTS
+    @_required_colnames()
     def channels_activity (self,
         colorscale:list = [
             [0.0,'rgba(255,255,255,0)'],
@@ -1453,6 +1601,7 @@ class pycoQC_plot ():
         return (label, data_dict)
 
     #~~~~~~~ALIGNMENT_SUMMARY METHOD~~~~~~~#
+    @_required_colnames("ref_id")
     def alignment_reads_status (self,
         colors:list=["#f44f39","#fc8161","#fcaf94","#828282"],
         width:int= None,
@@ -1504,6 +1653,7 @@ class pycoQC_plot ():
         return fig
 
     #~~~~~~~ALIGNMENT RATE METHOD AND HELPER~~~~~~~#
+    @_required_colnames("read_len", "align_len", "insertion", "deletion", "soft_clip", "mismatch", "identity_freq")
     def alignment_rate (self,
             colors:list=["#fcaf94","#828282","#fc8161","#828282","#f44f39","#d52221","#828282","#828282","#828282","#828282"],
             width:int=None,
@@ -1527,8 +1677,14 @@ class pycoQC_plot ():
         self.logger.info ("\t\tComputing plot")
 
         # Extract Data
-        bc_bases = self.all_df["read_len"].sum()
-        s = self.all_df[[ "read_len", "align_len", "insertion", "deletion", "soft_clip", "mismatch"]].dropna().sum()
+        bc_bases = self._basecalled_bases("all")
+        if self.is_streaming:
+            s = self.aggregate["all"].rate_sums
+        elif self.has_alignment_sample:
+            s = self.all_alignment_df[[ "read_len", "align_len", "insertion", "deletion", "soft_clip", "mismatch"]].dropna().sum()
+            s = s*len(self.all_df)/len(self.all_alignment_df)
+        else:
+            s = self.all_df[[ "read_len", "align_len", "insertion", "deletion", "soft_clip", "mismatch"]].dropna().sum()
         total_error = s["insertion"]+s["deletion"]+s["mismatch"]
         matching = s["align_len"]-total_error
         unmapped = bc_bases-s["read_len"]
@@ -1586,6 +1742,7 @@ class pycoQC_plot ():
         return fig
 
     #~~~~~~~ALIGNMENT COVERAGE METHOD AND HELPER~~~~~~~#
+    @_required_colnames("ref_id", "ref_start", "ref_end", "align_len")
     def alignment_coverage (self,
         nbins:int=500,
         color:str='rgba(70,130,180,0.70)',
@@ -1612,9 +1769,10 @@ class pycoQC_plot ():
         self.logger.info ("\t\tComputing plot")
 
         ref_offset_dict = self._ref_offset(self.ref_len_dict, "left", ret_type="dict")
-        df = self.all_df[["ref_id", "ref_start", "ref_end", "align_len"]].dropna()
+        df = self.all_alignment_df if self.has_alignment_sample else self.all_df
+        df = df[["ref_id", "ref_start", "ref_end", "align_len"]].dropna()
         steps = self.total_ref_len//nbins
-        mean_cov = round(df["align_len"].sum()/self.total_ref_len, 2)
+        mean_cov = round(self._alignment_mean_coverage("all"), 2)
 
         # Compute coverage by interval
         l = []
@@ -1625,6 +1783,12 @@ class pycoQC_plot ():
         l = np.digitize(l,bins)
         y = np.bincount(l, weights=df["align_len"])/steps
 
+        # Scale coverage in case of downsampling in streaming mode or of sampled alignment stats
+        if self.is_streaming:
+            y = y*self.all_scaling_factor
+        elif self.has_alignment_sample:
+            y = y*len(self.all_df)/len(self.all_alignment_df)
+
         # Time series smoothing
         if smooth_sigma:
             y = gaussian_filter1d (y, sigma=smooth_sigma)
@@ -1718,16 +1882,16 @@ class pycoQC_plot ():
                 return int(v)
 
     @staticmethod
-    def _compute_hist (data, x_scale="linear", smooth_sigma=2, nbins=200):
+    def _compute_hist (data, x_scale="linear", smooth_sigma=2, nbins=200, weights=None):
 
         # Count each categories in log or linear space
         min = np.nanmin(data)
         max = np.nanmax(data)
 
         if x_scale == "log":
-            count_y, bins = np.histogram (a=data, bins=np.logspace (np.log10(min), np.log10(max)+0.1, nbins))
+            count_y, bins = np.histogram (a=data, bins=np.logspace (np.log10(min), np.log10(max)+0.1, nbins), weights=weights)
         elif x_scale == "linear":
-            count_y, bins = np.histogram (a=data, bins= np.linspace (min, max, nbins))
+            count_y, bins = np.histogram (a=data, bins= np.linspace (min, max, nbins), weights=weights)
 
         # Remove last bin from labels
         count_x = bins[1:]
@@ -119,7 +119,7 @@ class pycoQC_report ():
             if files_list:
                 src_files += "<h4>Source {} files</h4><ul>".format(name)
                 for f in files_list:
-                    f = os.path.abspath(f)
+                    f = os.path.abspath(f) if f != STDIN_FN else "standard input"
                     src_files += "<li>{}</li>".format(f)
                 src_files += "</ul>"
 
@@ -155,20 +155,7 @@ class pycoQC_report ():
 
     def _get_config(self, config_file=None):
         """"""
-        # First, try to read provided configuration file if given
-        if config_file:
-            self.logger.debug ("\tTry to read provided config file")
-            try:
-                with open(config_file, 'r') as cf:
-                    return json.load(cf)
-            except (FileNotFoundError, IOError, json.JSONDecodeError):
-                self.logger.debug ("\t\tConfiguration file not found, non-readable or invalid")
-
-        # Last use the default harcoded config_dict
-        self.logger.debug ("\tRead default configuration file")
-        config_file = resource_filename("pycoQC", "templates/pycoQC_config.json")
-        with open(config_file, 'r') as cf:
-            return json.load(cf)
+        return get_config(config_file)
 
     def _get_jinja_template(self, template_file=None):
         """"""
@@ -189,3 +176,28 @@ class pycoQC_report ():
             autoescape=jinja2.select_autoescape(["html"]))
         template = env.get_template('spectre.html.j2')
         return template
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FUNCTIONS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def get_config (config_file=None):
+    """
+    Return the html report configuration dict, with the plotting methods to run as first level keys
+    * config_file
+        Path to a JSON configuration file. Falls back to the default configuration if not given or invalid
+    """
+    logger = logging.getLogger(__name__)
+
+    # First, try to read provided configuration file if given
+    if config_file:
+        logger.debug ("\tTry to read provided config file")
+        try:
+            with open(config_file, 'r') as cf:
+                return json.load(cf)
+        except (FileNotFoundError, IOError, json.JSONDecodeError):
+            logger.debug ("\t\tConfiguration file not found, non-readable or invalid")
+
+    # Last use the default harcoded config_dict
+    logger.debug ("\tRead default configuration file")
+    config_file = resource_filename("pycoQC", "templates/pycoQC_config.json")
+    with open(config_file, 'r') as cf:
+        return json.load(cf)
@@ -20,7 +20,7 @@ setup(
     author = 'Adrien Leger & Tommaso Leonardi',
     author_email = 'aleg@ebi.ac.uk',
     license = 'GPLv3',
-    python_requires ='>=3.5',
+    python_requires ='>=3.7.1',
     classifiers = [
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Science/Research',
@@ -28,14 +28,16 @@ setup(
         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
         'Programming Language :: Python :: 3'],
     install_requires = [
-        'numpy==1.17.1',
+        'numpy==1.17.3',
         'scipy==1.3.1',
-        'pandas==0.25.1',
+        'pandas==1.3.0',
         'plotly==4.1.0',
         'jinja2==2.10.1',
         'h5py==2.9.0',
         'tqdm==4.35.0',
         'pysam==0.15.3'],
+    extras_require = {
+        'zstd': ['zstandard>=0.11']},
     packages = [name],
     package_dir = {name: name},
     package_data = {name: ['templates/*']},
@@ -43,5 +45,7 @@ setup(
         'console_scripts': [
             'pycoQC=pycoQC.__main__:main_pycoQC',
             'Fast5_to_seq_summary=pycoQC.__main__:main_Fast5_to_seq_summary',
-            'Barcode_split=pycoQC.__main__:main_Barcode_split']}
+            'Barcode_split=pycoQC.__main__:main_Barcode_split',
+            'Summary_sample=pycoQC.__main__:main_Summary_sample',
+            'Bam_stats=pycoQC.__main__:main_Bam_stats']}
 )
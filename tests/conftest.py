@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~IMPORTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+# Standard library imports
+from os import path
+import math
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pysam as ps
+import pytest
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~GLOBAL SETTINGS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+DATA_DIR = path.join(path.dirname(path.dirname(path.abspath(__file__))), "docs", "pycoQC", "data")
+SUMMARY_FN = path.join(DATA_DIR, "Guppy-basecall-1D-DNA_sequencing_summary.txt.gz")
+BARCODE_FN = path.join(DATA_DIR, "Guppy-basecall-1D-DNA_deepbinner_barcoding_summary.txt.gz")
+REF_LEN_DICT = {"chr1":50000, "chr2":20000}
+SEED = 42
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture(scope="session")
+def summary_file ():
+    return SUMMARY_FN
+
+@pytest.fixture(scope="session")
+def barcode_file ():
+    return BARCODE_FN
+
+@pytest.fixture(scope="session")
+def bam_file (tmp_path_factory):
+    """
+    Sorted and indexed bam file of simulated alignments of the reads of summary_file, shared by the tests. The parsers using it
+    must not write sidecar directories, which would be reloaded by the next tests instead of parsing the file
+    """
+    tmp_dir = tmp_path_factory.mktemp("bam")
+    bam_fn = str(tmp_dir/"reads.bam")
+    write_bam(str(tmp_dir/"unsorted.bam"), pd.read_csv(SUMMARY_FN, sep="\t", usecols=["read_id"])["read_id"].values[:2000])
+    ps.sort("-o", bam_fn, str(tmp_dir/"unsorted.bam"))
+    ps.index(bam_fn)
+    return bam_fn
+
+@pytest.fixture
+def assert_dict_close ():
+    return _assert_dict_close
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~HELPERS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def write_bam (bam_fn, read_ids, seed=SEED):
+    """
+    Write an unsorted bam file with one primary alignment per read_id, including soft clips, indels and mismatches given either
+    by a NM or a MD tag, a few secondary and supplementary alignments and unmapped reads
+    """
+    rng = np.random.RandomState(seed)
+    header = {"HD":{"VN":"1.0"}, "SQ":[{"SN":ref_id, "LN":ref_len} for ref_id, ref_len in REF_LEN_DICT.items()]}
+    with ps.AlignmentFile(bam_fn, "wb", header=header) as bam:
+        for i, read_id in enumerate(read_ids):
+            if i % 20 == 19:
+                bam.write(_aligned_segment(bam, read_id, flag=4))
+                continue
+            ref_id = rng.randint(len(REF_LEN_DICT))
+            m1, m2, m3 = rng.randint(50, 500, size=3)
+            ref_start = rng.randint(list(REF_LEN_DICT.values())[ref_id]-m1-m2-m3-3)
+            a = _aligned_segment(bam, read_id, flag=0, ref_id=ref_id, ref_start=ref_start, cigar=(m1, m2, m3), mapq=rng.randint(60))
+            if i % 2:
+                a.set_tag("NM", 2+3+int(rng.randint(10)))
+            else:
+                mismatch_pos = rng.randint(m1+m2-1)
+                a.set_tag("MD", "{}A{}^CCG{}".format(mismatch_pos, m1+m2-mismatch_pos-1, m3))
+            bam.write(a)
+            if i % 10 == 0:
+                bam.write(_aligned_segment(bam, read_id, flag=256, ref_id=ref_id, ref_start=ref_start, cigar=(m1, m2, m3)))
+            if i % 25 == 0:
+                bam.write(_aligned_segment(bam, read_id, flag=2048, ref_id=ref_id, ref_start=ref_start, cigar=(m1, m2, m3)))
+
+def _aligned_segment (bam, read_id, flag, ref_id=-1, ref_start=-1, cigar=None, mapq=0):
+    """Alignment with a 10S{m1}M2I{m2}M3D{m3}M cigar string if cigar=(m1, m2, m3) is given"""
+    a = ps.AlignedSegment(bam.header)
+    a.query_name = read_id
+    a.flag = flag
+    a.reference_id = ref_id
+    a.reference_start = ref_start
+    a.mapping_quality = mapq
+    if cigar:
+        m1, m2, m3 = cigar
+        a.cigarstring = "10S{}M2I{}M3D{}M".format(m1, m2, m3)
+        a.query_sequence = "A"*(10+m1+2+m2+m3)
+    else:
+        a.query_sequence = "A"*100
+    return a
+
+def _assert_dict_close (d1, d2, rel=1e-6, abs=None):
+    """Recursively compare 2 dicts of stats, allowing float differences up to rel, or up to abs if given"""
+    if isinstance(d1, dict):
+        assert list(d1.keys()) == list(d2.keys())
+        for k in d1:
+            _assert_dict_close(d1[k], d2[k], rel=rel, abs=abs)
+    elif isinstance(d1, (list, tuple)):
+        assert len(d1) == len(d2)
+        for v1, v2 in zip(d1, d2):
+            _assert_dict_close(v1, v2, rel=rel, abs=abs)
+    elif isinstance(d1, float) or isinstance(d2, float):
+        assert (math.isnan(d1) and math.isnan(d2)) or d1 == pytest.approx(d2, rel=rel, abs=abs)
+    else:
+        assert d1 == d2
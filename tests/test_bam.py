@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+from os import path
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+import pycoQC.pycoQC_parse
+from pycoQC.pycoQC_parse import pycoQC_parse, bam_file_stats
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def assert_bam_stats_equal (stats1, stats2):
+    assert list(stats1.keys()) == list(stats2.keys())
+    for bam_stats1, bam_stats2 in zip(stats1.values(), stats2.values()):
+        (df1, counts1, ref_len_dict1), (df2, counts2, ref_len_dict2) = bam_stats1[:3], bam_stats2[:3]
+        pd.testing.assert_frame_equal(df1, df2)
+        assert counts1 == counts2
+        assert ref_len_dict1 == ref_len_dict2
+        # Hashes of the read_ids of the primary alignments not extracted
+        assert len(bam_stats1) == len(bam_stats2)
+        for k1, k2 in zip(bam_stats1[3:], bam_stats2[3:]):
+            assert all(np.array_equal(a1, a2) for a1, a2 in zip(k1, k2))
+
+@pytest.mark.parametrize("subset", [False, True])
+def test_bam_regions (monkeypatch, bam_file, subset):
+    """
+    Indexed bam files split in regions parsed by a pool of workers give the same stats as a serial parse, including reads
+    overlapping the region boundaries, and the unindexed files read concurrently by the main process
+    """
+    monkeypatch.setattr(pycoQC.pycoQC_parse, "BAM_REGION_SIZE", 7000)
+    bam_file_list = [bam_file, path.join(path.dirname(bam_file), "unsorted.bam")]
+    read_ids = None
+    if subset:
+        read_ids = set(bam_file_stats([bam_file])[bam_file][0]["read_id"].values[::3])
+
+    serial_stats = bam_file_stats(bam_file_list, threads=1, read_ids=read_ids)
+    df, counts, ref_len_dict = serial_stats[bam_file][:3]
+    if subset:
+        assert len(serial_stats[bam_file][3][0]) == counts["Primary"]-len(df)
+    assert not df.empty and counts["Primary"] and counts["Secondary"] and counts["Suplementary"] and counts["Unmapped"]
+    assert_bam_stats_equal(bam_file_stats(bam_file_list, threads=3, read_ids=read_ids), serial_stats)
+
+def test_bam_regions_parse (monkeypatch, summary_file, bam_file):
+    """The parser gives the same reads table and alignment counts with threads > 1"""
+    monkeypatch.setattr(pycoQC.pycoQC_parse, "BAM_REGION_SIZE", 7000)
+    p1 = pycoQC_parse(summary_file, bam_file=bam_file, write_bam_sidecar=False, quiet=True)
+    p2 = pycoQC_parse(summary_file, bam_file=bam_file, write_bam_sidecar=False, threads=3, quiet=True)
+    assert p2.counter["Bam files sidecar loaded"] == 0
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+    pd.testing.assert_frame_equal(p2.alignments_df, p1.alignments_df)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import shutil
+
+# Third party imports
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_bam_sample_duplicates (tmp_path, summary_file, bam_file, threads):
+    """With bam_sample, the duplicated primary alignments of all the reads are counted, not only those of the sampled reads"""
+    bam_copy = str(tmp_path/"reads.bam")
+    shutil.copyfile(bam_file, bam_copy)
+    shutil.copyfile(bam_file+".bai", bam_copy+".bai")
+    kwargs = dict(summary_file=summary_file, bam_file=[bam_file, bam_copy], sample=200, threads=threads, write_bam_sidecar=False, quiet=True)
+
+    p1 = pycoQC_parse(**kwargs)
+    p2 = pycoQC_parse(bam_sample=True, bam_extra_sample=100, **kwargs)
+    assert p2.reads_df["align_len"].notna().sum() < p1.reads_df["align_len"].notna().sum()
+    pd.testing.assert_frame_equal(p2.alignments_df, p1.alignments_df)
+    assert p2.counter["Duplicated alignment reads"] == p1.counter["Duplicated alignment reads"] > 0
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+from os import path, stat, utime
+import shutil
+
+# Third party imports
+import pandas as pd
+import pytest
+
+# Local imports
+import pycoQC.pycoQC_parse
+from pycoQC.pycoQC_parse import pycoQC_parse, bam_file_stats, bam_stats_dir, load_bam_stats, save_bam_stats
+from pycoQC.Bam_stats import Bam_stats
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def bam_copy (tmp_path, bam_file):
+    """Copy of bam_file and of its index, next to which sidecar directories can be written"""
+    fn = str(tmp_path/"reads.bam")
+    shutil.copyfile(bam_file, fn)
+    shutil.copyfile(bam_file+".bai", fn+".bai")
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_sidecar_round_trip (bam_copy):
+    """The stats reloaded from a sidecar directory are the same as the stats extracted from the bam file"""
+    assert load_bam_stats(bam_copy) is None
+    df, counts, ref_len_dict = bam_file_stats([bam_copy])[bam_copy]
+    save_bam_stats(bam_copy, df, counts, ref_len_dict)
+    df2, counts2, ref_len_dict2 = load_bam_stats(bam_copy)
+    pd.testing.assert_frame_equal(df2, df)
+    assert counts2 == counts
+    assert ref_len_dict2 == ref_len_dict
+
+    # Subset of the fields saved
+    df3 = load_bam_stats(bam_copy, colnames=["ref_id", "align_len"])[0]
+    assert list(df3.columns) == ["read_id", "ref_id", "align_len"]
+    assert load_bam_stats(bam_copy, colnames=["ref_id", "align_len", "unknown"]) is None
+
+@pytest.mark.parametrize("fn", ["bam", "index"])
+def test_sidecar_invalidation (bam_copy, fn):
+    """Sidecar directories are not reloaded once the bam file or its index changed"""
+    Bam_stats(bam_copy, quiet=True)
+    assert path.isdir(bam_stats_dir(bam_copy))
+    assert load_bam_stats(bam_copy) is not None
+    fn = bam_copy if fn == "bam" else bam_copy+".bai"
+    st = stat(fn)
+    utime(fn, (st.st_atime, st.st_mtime+10))
+    assert load_bam_stats(bam_copy) is None
+
+def test_sidecar_parse (monkeypatch, summary_file, bam_copy):
+    """The parser saves the alignment stats of the bam files in sidecar directories and reuses them without parsing the files"""
+    p1 = pycoQC_parse(summary_file, bam_file=bam_copy, quiet=True)
+    assert p1.counter["Bam files sidecar loaded"] == 0
+    assert path.isdir(bam_stats_dir(bam_copy))
+
+    def bam_file_stats (*args, **kwargs):
+        raise AssertionError("Bam file parsed instead of loaded from its sidecar directory")
+    monkeypatch.setattr(pycoQC.pycoQC_parse, "bam_file_stats", bam_file_stats)
+    p2 = pycoQC_parse(summary_file, bam_file=bam_copy, quiet=True)
+    assert p2.counter["Bam files sidecar loaded"] == 1
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+    pd.testing.assert_frame_equal(p2.alignments_df, p1.alignments_df)
+    assert p2.ref_len_dict == p1.ref_len_dict
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+from os import listdir, stat, utime
+import gzip
+import shutil
+import uuid
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def summary_copy (tmp_path, summary_file):
+    """Uncompressed copy of summary_file, which can be modified by the tests"""
+    fn = str(tmp_path/"sequencing_summary.txt")
+    with gzip.open(summary_file, "rb") as fp_in, open(fn, "wb") as fp_out:
+        shutil.copyfileobj(fp_in, fp_out)
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_cache_reload (tmp_path, summary_copy, monkeypatch):
+    """A second parse of unchanged files reloads the same cleaned data from the cache, without parsing the files"""
+    cache_dir = str(tmp_path/"cache")
+    p1 = pycoQC_parse(summary_copy, cache_dir=cache_dir, quiet=True)
+
+    def _parse_summary (self):
+        raise AssertionError("Summary files parsed instead of loaded from cache")
+    monkeypatch.setattr(pycoQC_parse, "_parse_summary", _parse_summary)
+    p2 = pycoQC_parse(summary_copy, cache_dir=cache_dir, quiet=True)
+    assert p2.cache_key == p1.cache_key
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+    assert p2.counter == p1.counter
+
+@pytest.mark.parametrize("change", ["mtime", "size"])
+def test_cache_key_invalidation (tmp_path, summary_copy, change):
+    """Changing the modification time or the size of an input file changes the cache key, so the stale entry is not reused"""
+    cache_dir = str(tmp_path/"cache")
+    p1 = pycoQC_parse(summary_copy, cache_dir=cache_dir, quiet=True)
+
+    st = stat(summary_copy)
+    if change == "mtime":
+        utime(summary_copy, (st.st_atime, st.st_mtime+10))
+    else:
+        # Append a copy of the last read with a new read_id
+        with open(summary_copy) as fp:
+            last_line = fp.readlines()[-1].split("\t")
+        last_line[1] = str(uuid.UUID(int=1))
+        with open(summary_copy, "a") as fp:
+            fp.write("\t".join(last_line))
+
+    p2 = pycoQC_parse(summary_copy, cache_dir=cache_dir, quiet=True)
+    assert p2.cache_key != p1.cache_key
+    assert sorted(listdir(cache_dir)) == sorted([p1.cache_key, p2.cache_key])
+    pd.testing.assert_frame_equal(p2.reads_df, pycoQC_parse(summary_copy, quiet=True).reads_df)
+    if change == "size":
+        assert p2.counter["Initial reads"] == p1.counter["Initial reads"]+1
+
+def test_cache_dir_unwritable (tmp_path, summary_copy, caplog):
+    """A cache_dir which cannot be created only triggers a warning, and the reads are parsed as without cache"""
+    cache_dir = str(tmp_path/"sequencing_summary.txt"/"cache")
+    p = pycoQC_parse(summary_copy, cache_dir=cache_dir, quiet=True)
+    assert "Cannot write cache entry" in caplog.text
+    pd.testing.assert_frame_equal(p.reads_df, pycoQC_parse(summary_copy, quiet=True).reads_df)
+
+def test_memory_map (tmp_path, summary_copy):
+    """With memory_map, the numeric columns of the reads table are memory-mapped from the cache entry files instead of copied"""
+    cache_dir = str(tmp_path/"cache")
+    p1 = pycoQC_parse(summary_copy, cache_dir=cache_dir, quiet=True)
+    for p in (pycoQC_parse(summary_copy, cache_dir=cache_dir, memory_map=True, quiet=True), p1):
+        for col in ("channel", "start_time", "read_len", "mean_qscore"):
+            assert is_memory_mapped(p.reads_df[col].values) == (p is not p1)
+        pd.testing.assert_frame_equal(p.reads_df, p1.reads_df)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~HELPERS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def is_memory_mapped (a):
+    """True if the array is a view of a np.memmap"""
+    while a is not None:
+        if isinstance(a, np.memmap):
+            return True
+        a = a.base
+    return False
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import category_counts, category_replace, category_fillna
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def split_summary_files (tmp_path, summary_file):
+    """Summary file split in 2 files with different run_ids, the second one not containing the first file run_ids"""
+    df = pd.read_csv(summary_file, sep="\t")
+    df1, df2 = df.iloc[:2000], df.iloc[2000:].assign(run_id="run_b")
+    df2.loc[df2.index[::2], "run_id"] = "run_a"
+    fn_list = []
+    for i, sdf in enumerate((df1, df2)):
+        fn = str(tmp_path/"sequencing_summary_{}.txt".format(i))
+        sdf.to_csv(fn, sep="\t", index=False)
+        fn_list.append(fn)
+    return fn_list, pd.concat([df1, df2]).set_index("read_id")["run_id"]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_category_helpers ():
+    """Categorical helpers working on the integer codes give the same values as the object series equivalents"""
+    s = pd.Series(pd.Categorical(["b", "a", np.nan, "c", "a", "unclassified", "d"]), index=list("abcdefg"))
+    assert list(category_counts(s)) == [2, 1, 1, 1, 1]
+
+    r = category_replace(s, ["a", "d"], "unclassified")
+    assert list(r.cat.categories) == ["b", "c", "unclassified"]
+    pd.testing.assert_series_equal(r.astype(object), s.astype(object).replace(["a", "d"], "unclassified"))
+    assert list(category_replace(s, ["a"], "new").cat.categories) == ["b", "c", "d", "unclassified", "new"]
+
+    f = category_fillna(s, "unknown")
+    assert f.isna().sum() == 0
+    pd.testing.assert_series_equal(f.astype(object), s.astype(object).fillna("unknown"))
+
+@pytest.mark.parametrize("kwargs", [{}, {"threads":2}, {"chunk_size":1000}])
+def test_run_id_categories_union (split_summary_files, kwargs):
+    """The run_id categories of the files are merged, and each read keeps its run_id"""
+    fn_list, run_id = split_summary_files
+    p = pycoQC_parse(fn_list, quiet=True, **kwargs)
+    assert pd.api.types.is_categorical_dtype(p.reads_df["run_id"])
+    assert sorted(p.reads_df["run_id"].cat.categories) == sorted(run_id.unique())
+    assert list(p.reads_df["run_id"].astype(object)) == list(run_id[p.reads_df.index])
+
+def test_low_frequency_barcodes_unset (summary_file, barcode_file):
+    """Low frequency barcodes are relabelled as unclassified on the categorical codes"""
+    barcode = pycoQC_parse(summary_file, barcode_file=barcode_file, min_barcode_percent=0, quiet=True).reads_df["barcode"].astype(object)
+    counts = barcode[barcode != "unclassified"].value_counts()
+    low_barcodes = counts[counts < int(counts.sum()*0.1)].index
+    assert len(low_barcodes)
+
+    p = pycoQC_parse(summary_file, barcode_file=barcode_file, min_barcode_percent=10, quiet=True)
+    assert pd.api.types.is_categorical_dtype(p.reads_df["barcode"])
+    assert not p.reads_df["barcode"].cat.categories.isin(low_barcodes).any()
+    pd.testing.assert_series_equal(p.reads_df["barcode"].astype(object), barcode.replace(list(low_barcodes), "unclassified"))
+    assert p.counter["Reads with low frequency barcode unset"] == counts[low_barcodes].sum()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import json
+from os import path
+
+# Third party imports
+import pandas as pd
+import pytest
+
+# Local imports
+import pycoQC.pycoQC_parse
+from pycoQC.pycoQC import pycoQC as pycoQC_main
+from pycoQC.pycoQC_parse import pycoQC_parse, BAM_COLNAMES
+from pycoQC.pycoQC_plot import pycoQC_plot
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def no_barcode_bam_parse (monkeypatch, barcode_file):
+    """Fail if the barcode or the bam files are parsed"""
+    def fail (*args, **kwargs):
+        raise AssertionError("Barcode or bam files parsed while not needed")
+    merge_files_to_df = pycoQC.pycoQC_parse.merge_files_to_df
+    def merge_summary_files_to_df (fn_list, *args, **kwargs):
+        if barcode_file in fn_list:
+            fail()
+        return merge_files_to_df(fn_list, *args, **kwargs)
+    monkeypatch.setattr(pycoQC.pycoQC_parse, "merge_files_to_df", merge_summary_files_to_df)
+    monkeypatch.setattr(pycoQC.pycoQC_parse, "bam_file_stats", fail)
+    monkeypatch.setattr(pycoQC.pycoQC_parse, "load_bam_stats", fail)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_required_colnames ():
+    """The optional columns used by a list of plotting methods are merged in order, ignoring invalid method names"""
+    assert pycoQC_plot.required_colnames([]) == []
+    assert pycoQC_plot.required_colnames(["read_len_1D", "output_over_time", "invalid"]) == []
+    assert pycoQC_plot.required_colnames(["barcode_counts", "align_len_1D", "identity_freq_1D", "invalid"]) == ["barcode", "ref_id", "align_len", "identity_freq"]
+    colnames = pycoQC_plot.required_colnames(["summary_stats_dict"])
+    assert "barcode" in colnames and set(colnames).issuperset(["ref_id", "align_len", "identity_freq"])
+
+def test_skipped_files (summary_file, barcode_file, bam_file, no_barcode_bam_parse):
+    """Barcode and bam files are not parsed if none of their columns is needed"""
+    p = pycoQC_parse(summary_file, barcode_file=barcode_file, bam_file=bam_file, write_bam_sidecar=False, colnames=[], quiet=True)
+    assert p.barcode_files_list == p.bam_file_list == []
+    assert not "Barcode files found" in p.counter and not "Bam files found" in p.counter
+    assert list(p.reads_df.columns) == ["run_id", "channel", "start_time", "read_len", "mean_qscore"]
+    pd.testing.assert_frame_equal(p.reads_df, pycoQC_parse(summary_file, quiet=True).reads_df)
+
+def test_partial_colnames (summary_file, barcode_file, bam_file):
+    """Only the files and the optional columns needed are loaded"""
+    p = pycoQC_parse(summary_file, barcode_file=barcode_file, bam_file=bam_file, write_bam_sidecar=False, colnames=["barcode"], quiet=True)
+    assert p.bam_file_list == [] and "barcode" in p.reads_df
+    assert not set(BAM_COLNAMES).intersection(p.reads_df.columns)
+
+    p = pycoQC_parse(summary_file, barcode_file=barcode_file, bam_file=bam_file, write_bam_sidecar=False, colnames=["identity_freq"], quiet=True)
+    assert p.barcode_files_list == [] and not "barcode" in p.reads_df
+    # ref_id and align_len are always loaded with the alignment files
+    assert [c for c in BAM_COLNAMES if c in p.reads_df] == ["ref_id", "align_len", "identity_freq"]
+
+def test_report_colnames (tmp_path, summary_file, barcode_file, bam_file, no_barcode_bam_parse):
+    """The html report only loads the files used by the plotting methods of its configuration"""
+    config_fn = str(tmp_path/"config.json")
+    with open(config_fn, "w") as fp:
+        json.dump({"read_len_1D":{"plot_title":"Basecalled reads length"}, "output_over_time":{"plot_title":"Output over time"}}, fp)
+    html_fn = str(tmp_path/"pycoQC.html")
+    pycoQC_main(summary_file, barcode_file=barcode_file, bam_file=bam_file, write_bam_sidecar=False, config_file=config_fn, html_outfile=html_fn, quiet=True)
+    assert path.getsize(html_fn)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import gzip
+import shutil
+import subprocess
+import sys
+
+# Third party imports
+import pandas as pd
+import pysam as ps
+import pytest
+
+# Local imports
+import pycoQC.common
+from pycoQC.common import pycoQCError, file_compression, decompress_cmd, read_tsv_file
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture(scope="module")
+def compressed_files (tmp_path_factory, summary_file):
+    """Uncompressed, gzip, bgzip and, if the zstd program is available, zstd copies of summary_file"""
+    tmp_dir = tmp_path_factory.mktemp("compression")
+    fn_dict = {}
+    fn_dict[None] = str(tmp_dir/"sequencing_summary.txt")
+    with gzip.open(summary_file, "rb") as fp_in, open(fn_dict[None], "wb") as fp_out:
+        shutil.copyfileobj(fp_in, fp_out)
+    fn_dict["gzip"] = str(tmp_dir/"sequencing_summary.txt.gz")
+    shutil.copyfile(summary_file, fn_dict["gzip"])
+    fn_dict["bgzip"] = str(tmp_dir/"sequencing_summary.txt.bgz")
+    ps.tabix_compress(fn_dict[None], fn_dict["bgzip"])
+    if shutil.which("zstd"):
+        fn_dict["zstd"] = str(tmp_dir/"sequencing_summary.txt.zst")
+        subprocess.check_call(["zstd", "-q", fn_dict[None], "-o", fn_dict["zstd"]])
+    return fn_dict
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_file_compression (compressed_files):
+    """Compression formats are detected from the magic bytes, whatever the file extension"""
+    for compression, fn in compressed_files.items():
+        assert file_compression(fn) == compression
+
+def test_decompress_cmd (monkeypatch, compressed_files):
+    """The fastest decompression program available is used, and None is returned when no program can be used"""
+    available = {"bgzip", "pigz", "gzip", "zstd"}
+    monkeypatch.setattr(pycoQC.common.shutil, "which", lambda prog: prog if prog in available else None)
+    assert decompress_cmd(compressed_files["bgzip"], threads=4)[:4] == ["bgzip", "-dc", "-@", "4"]
+    assert decompress_cmd(compressed_files["gzip"], threads=4)[:4] == ["pigz", "-dc", "-p", "4"]
+    available = {"gzip"}
+    assert decompress_cmd(compressed_files["bgzip"])[:2] == ["gzip", "-dc"]
+    assert decompress_cmd(compressed_files["gzip"])[:2] == ["gzip", "-dc"]
+    assert decompress_cmd(compressed_files[None]) is None
+    available = set()
+    assert decompress_cmd(compressed_files["gzip"]) is None
+
+@pytest.mark.parametrize("compression", ["gzip", "bgzip", "zstd"])
+@pytest.mark.parametrize("kwargs", [{}, {"threads":2}, {"chunk_size":1000}])
+def test_compressed_parse (compressed_files, compression, kwargs):
+    """Compressed summary files decompressed by external programs give the same reads as the uncompressed file"""
+    if not compression in compressed_files:
+        pytest.skip("zstd program not available")
+    p1 = pycoQC_parse(compressed_files[None], quiet=True, **kwargs)
+    p2 = pycoQC_parse(compressed_files[compression], quiet=True, **kwargs)
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+
+def test_zstandard_fallback (monkeypatch, compressed_files):
+    """Without the zstd program, zstd files are read with the zstandard package, or raise pycoQCError if it is not installed"""
+    if not "zstd" in compressed_files:
+        pytest.skip("zstd program not available")
+    monkeypatch.setattr(pycoQC.common.shutil, "which", lambda prog: None)
+    try:
+        import zstandard
+        pd.testing.assert_frame_equal(read_tsv_file(compressed_files["zstd"]), read_tsv_file(compressed_files[None]))
+    except ImportError:
+        pass
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(pycoQCError, match="zstandard"):
+        read_tsv_file(compressed_files["zstd"])
+
+def test_corrupt_file (tmp_path, compressed_files):
+    """A truncated compressed file raises pycoQCError instead of silently returning the reads decompressed before the error"""
+    fn = str(tmp_path/"truncated.txt.gz")
+    with open(compressed_files["gzip"], "rb") as fp:
+        data = fp.read()
+    with open(fn, "wb") as fp:
+        fp.write(data[:len(data)//2])
+    with pytest.raises(pycoQCError, match="Cannot decompress"):
+        read_tsv_file(fn)
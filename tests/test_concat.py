@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import read_tsv_file, merge_files_to_df, concat_df_list
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def split_summary_files (tmp_path, summary_file):
+    """Summary file split in 3 files, the last one lacking the num_events column and with integer start times"""
+    df = pd.read_csv(summary_file, sep="\t")
+    fn_list = []
+    for i, sdf in enumerate((df.iloc[:1000], df.iloc[1000:2500], df.iloc[2500:])):
+        if i == 2:
+            sdf = sdf.drop(columns="num_events").assign(start_time=sdf["start_time"].astype(int))
+        fn = str(tmp_path/"sequencing_summary_{}.txt".format(i))
+        sdf.to_csv(fn, sep="\t", index=False)
+        fn_list.append(fn)
+    return fn_list
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_merge_files_to_df (split_summary_files, threads):
+    """Files parsed by a pool of workers are concatenated in file order, keeping only the columns found in all the files"""
+    expected = pd.concat([read_tsv_file(fn) for fn in split_summary_files], join="inner", ignore_index=True, sort=False)
+    df = merge_files_to_df(split_summary_files, threads=threads)
+    assert not "num_events" in df
+    assert df["start_time"].dtype == "float64"
+    pd.testing.assert_frame_equal(df, expected)
+
+def test_concat_df_list_categories ():
+    """Categorical columns are merged on the union of their categories, with values in list order"""
+    df_list = [
+        pd.DataFrame({"run_id":pd.Categorical(["b", "a"]), "read_len":[1, 2]}),
+        pd.DataFrame({"run_id":["c", "b", "d"], "read_len":[3.5, 4, 5]})]
+    df = concat_df_list(df_list)
+    assert df_list == []
+    assert list(df["run_id"].cat.categories) == ["a", "b", "c", "d"]
+    assert list(df["run_id"]) == ["b", "a", "c", "b", "d"]
+    assert list(df["read_len"]) == [1, 2, 3.5, 4, 5]
+    assert df["read_len"].dtype == "float64"
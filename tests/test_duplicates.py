@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import shutil
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import duplicate_read_ids, read_id_to_uint64
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~HELPERS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def colliding_read_ids (n, hi=12345):
+    """n distinct (hi, lo) pairs sharing the same 64 bits hash in duplicate_read_ids"""
+    lo = np.arange(1, n+1, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        key = np.uint64(hi) ^ (lo[0]*np.uint64(0x9E3779B97F4A7C15))
+        hi = key ^ (lo*np.uint64(0x9E3779B97F4A7C15))
+    return [(hi[i:i+1], lo[i:i+1]) for i in range(n)]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("encoded", [True, False])
+@pytest.mark.parametrize("verify", [True, False])
+def test_duplicates_batches (summary_file, encoded, verify):
+    """Duplicates found over successive batches are the same as in the concatenated read_ids"""
+    rng = np.random.RandomState(42)
+    read_ids = pd.read_csv(summary_file, sep="\t", usecols=["read_id"])["read_id"].values
+    read_ids = np.concatenate([read_ids, rng.choice(read_ids, size=2000)])
+    rng.shuffle(read_ids)
+
+    duplicates = duplicate_read_ids(verify=verify)
+    duplicated = []
+    for batch in np.array_split(read_ids, 37):
+        duplicated.append(duplicates.add(read_id_to_uint64(batch) if encoded else batch, label="test"))
+    expected = pd.Index(read_ids).duplicated(keep="first")
+    assert list(np.concatenate(duplicated)) == list(expected)
+    assert duplicates.counts["test"] == expected.sum()
+    assert len(duplicates) == len(read_ids)-expected.sum()
+
+def test_hash_collisions ():
+    """Distinct read_ids with the same 64 bits hash are only flagged as duplicates without verification"""
+    ids = colliding_read_ids(5)
+    assert len(set(int(lo[0]) for hi, lo in ids)) == 5
+
+    duplicates = duplicate_read_ids(verify=True)
+    assert not duplicates.add(ids[0]).any()
+    assert not duplicates.add(ids[1]).any()
+    # Within a batch and with several registered read_ids matching the hash
+    assert list(duplicates.add(tuple(np.concatenate(x) for x in zip(ids[2], ids[3])))) == [False, False]
+    assert not duplicates.add(ids[4]).any()
+    for i in range(5):
+        assert duplicates.add(ids[i]).all()
+
+    duplicates = duplicate_read_ids(verify=False)
+    assert not duplicates.add(ids[0]).any()
+    assert duplicates.add(ids[1]).all()
+
+def test_duplicated_summary_files (tmp_path, summary_file):
+    """Reads of a summary file given twice are all discarded as duplicates from the second file, in memory and by chunks"""
+    summary_copy = str(tmp_path/"sequencing_summary.txt.gz")
+    shutil.copyfile(summary_file, summary_copy)
+    p1 = pycoQC_parse(summary_file, quiet=True)
+    for kwargs in ({}, {"chunk_size":1000}, {"verify_duplicates":True}):
+        p2 = pycoQC_parse([summary_file, summary_copy], filter_duplicated=True, quiet=True, **kwargs)
+        assert p2.counter["Valid reads"] == p1.counter["Valid reads"]
+        assert p2.counter["Duplicated reads discarded"] == p1.counter["Valid reads"]
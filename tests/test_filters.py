@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import warnings
+from collections import OrderedDict
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def filters_summary (tmp_path, summary_file):
+    """Summary file with reads discarded by each of the filters, some of them by several filters"""
+    rng = np.random.RandomState(42)
+    df = pd.read_csv(summary_file, sep="\t")
+    df["run_id"] = rng.choice(["run_a", "run_b"], p=[0.8, 0.2], size=len(df))
+    df["calibration_strand_genome_template"] = rng.choice(["filtered_out", "no_match", "*", "YHR174W"], p=[0.3, 0.3, 0.3, 0.1], size=len(df))
+    df.loc[df.index[::100], "mean_qscore_template"] = np.nan
+    df.loc[df.index[::150], "sequence_length_template"] = 0
+    df = pd.concat([df, df.iloc[::50]], ignore_index=True)
+    fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(fn, sep="\t", index=False)
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("kwargs", [{}, {"threads":2}, {"chunk_size":1000}])
+def test_filter_counters (filters_summary, kwargs):
+    """
+    The discarded reads of each filter are counted among the reads left by the previous filters, as when filtering in turn,
+    and the valid reads are selected without SettingWithCopyWarning when the columns are later modified
+    """
+    options = {"filter_calibration":True, "filter_duplicated":True, "runid_list":["run_a"], "time_window":[1, 30]}
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", pd.errors.SettingWithCopyWarning)
+        p = pycoQC_parse(filters_summary, quiet=True, **options, **kwargs)
+    expected = filter_counters_loop(pd.read_csv(filters_summary, sep="\t"), **options)
+    assert all(v > 0 for v in expected.values())
+    for key, n in expected.items():
+        assert p.counter[key] == n, key
+    assert p.counter["Valid reads"] == p.counter["Initial reads"]-sum(expected.values())
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~HELPERS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def filter_counters_loop (df, runid_list, time_window, **kwargs):
+    """Apply the filters in turn, each of them selecting the valid reads, and count the reads discarded by each filter"""
+    filters = OrderedDict ([
+        ("Reads with NA values discarded", lambda df: df["mean_qscore_template"].notna()),
+        ("Zero length reads discarded", lambda df: df["sequence_length_template"] > 0),
+        ("Duplicated reads discarded", lambda df: ~df["read_id"].duplicated()),
+        ("Calibration reads discarded", lambda df: df["calibration_strand_genome_template"].isin(["filtered_out", "no_match", "*"])),
+        ("Excluded runid reads discarded", lambda df: df["run_id"].isin(runid_list)),
+        ("Reads outside of time window discarded", lambda df: df["start_time"].between(time_window[0]*3600, time_window[1]*3600))])
+    counters = OrderedDict()
+    for key, valid in filters.items():
+        valid = valid(df)
+        counters[key] = int((~valid).sum())
+        df = df[valid]
+    return counters
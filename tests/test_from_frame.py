@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import inspect
+
+# Third party imports
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse, bam_file_stats
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("chunk_size", [0, 1000])
+def test_from_frame (summary_file, barcode_file, bam_file, chunk_size):
+    """Parsers created from in memory tables give the same reads table as parsers reading the same files"""
+    summary_df = pd.read_csv(summary_file, sep="\t")
+    barcode_df = pd.read_csv(barcode_file, sep="\t")
+    bam_df, counts, ref_len_dict = bam_file_stats([bam_file])[bam_file]
+
+    p1 = pycoQC_parse(summary_file, barcode_file=barcode_file, bam_file=bam_file, write_bam_sidecar=False, chunk_size=chunk_size, quiet=True)
+    p2 = pycoQC_parse.from_frame(summary_df, barcode_df=barcode_df, bam_df=bam_df, alignments_df=p1.alignments_df,
+        ref_len_dict=ref_len_dict, chunk_size=chunk_size, quiet=True)
+    assert p2.summary_files_list == p2.barcode_files_list == p2.bam_file_list == []
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+    assert p2.ref_len_dict == p1.ref_len_dict
+
+def test_from_frame_colnames (summary_file, barcode_file):
+    """In memory tables of which no column is needed are not merged"""
+    summary_df = pd.read_csv(summary_file, sep="\t")
+    barcode_df = pd.read_csv(barcode_file, sep="\t")
+    p = pycoQC_parse.from_frame(summary_df, barcode_df=barcode_df, colnames=["mean_qscore"], quiet=True)
+    assert not "barcode" in p.reads_df
+    pd.testing.assert_frame_equal(p.reads_df, pycoQC_parse(summary_file, colnames=["mean_qscore"], quiet=True).reads_df)
+
+def test_from_arrow (summary_file, barcode_file):
+    """Parsers created from Arrow tables give the same reads table as parsers reading the same files"""
+    pa = pytest.importorskip("pyarrow")
+    summary_table = pa.Table.from_pandas(pd.read_csv(summary_file, sep="\t"))
+    barcode_table = pa.Table.from_pandas(pd.read_csv(barcode_file, sep="\t"))
+    p = pycoQC_parse.from_arrow(summary_table, barcode_table=barcode_table, quiet=True)
+    pd.testing.assert_frame_equal(p.reads_df, pycoQC_parse(summary_file, barcode_file=barcode_file, quiet=True).reads_df)
+
+@pytest.mark.parametrize("kwargs", [{"cleanup":False}, {}, {"chunk_size":1000}])
+def test_from_frame_unchanged (summary_file, barcode_file, kwargs):
+    """The caller tables are not modified by the parser"""
+    summary_df = pd.read_csv(summary_file, sep="\t")
+    barcode_df = pd.read_csv(barcode_file, sep="\t")
+    summary_copy, barcode_copy = summary_df.copy(), barcode_df.copy()
+    p = pycoQC_parse.from_frame(summary_df, barcode_df=barcode_df, quiet=True, **kwargs)
+    assert "barcode" in p.reads_df
+    pd.testing.assert_frame_equal(summary_df, summary_copy)
+    pd.testing.assert_frame_equal(barcode_df, barcode_copy)
+
+def test_init_signature ():
+    """The in memory tables are not an argument of the parser initialisation"""
+    assert list(inspect.signature(pycoQC_parse.__init__).parameters)[-1] == "quiet"
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import read_id_key, uint64_to_read_id
+from pycoQC.pycoQC_parse import pycoQC_parse, bam_file_stats
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("read_id_prefix", ["", "read_"])
+def test_join_reads_df (tmp_path, summary_file, read_id_prefix):
+    """
+    The barcode reads scattered with the read_id hash index match a pandas left merge keeping the first of the
+    duplicated reads, with UUID and string read_ids
+    """
+    rng = np.random.RandomState(42)
+    summary_df = pd.read_csv(summary_file, sep="\t")
+    summary_df["read_id"] = read_id_prefix+summary_df["read_id"]
+    summary_fn = str(tmp_path/"sequencing_summary.txt")
+    summary_df.to_csv(summary_fn, sep="\t", index=False)
+
+    # Barcodes for a subset of the reads, plus reads missing from the summary file and duplicated reads
+    barcode_df = summary_df[["read_id"]].sample(frac=0.8, random_state=rng)
+    barcode_df["barcode_arrangement"] = rng.choice(["barcode01", "barcode02", "unclassified"], size=len(barcode_df))
+    extra_df = pd.DataFrame({"read_id":["{}{:08x}-0000-0000-0000-000000000000".format(read_id_prefix, i) for i in range(100)], "barcode_arrangement":"barcode03"})
+    dup_df = barcode_df.sample(n=100, random_state=rng).assign(barcode_arrangement="barcode04")
+    barcode_df = pd.concat([barcode_df, extra_df, dup_df])
+    barcode_fn = str(tmp_path/"barcoding_summary.txt")
+    barcode_df.to_csv(barcode_fn, sep="\t", index=False)
+
+    p = pycoQC_parse(summary_fn, barcode_file=barcode_fn, min_barcode_percent=0, quiet=True)
+    expected = summary_df[["read_id"]].merge(barcode_df.drop_duplicates("read_id"), on="read_id", how="left").set_index("read_id")
+    expected = expected["barcode_arrangement"].fillna("unclassified")
+    assert list(p.reads_df["barcode"].astype(str)) == list(expected[p.reads_df.index])
+    assert p.counter["Barcode reads not found in summary"] == len(extra_df)
+    assert p.counter["Duplicated barcode reads"] == len(dup_df)
+
+def test_join_bam_reads_df (summary_file, bam_file):
+    """The alignment columns scattered with the read_id hash index match a pandas left merge, with NaN for unaligned reads"""
+    p = pycoQC_parse(summary_file, bam_file=bam_file, write_bam_sidecar=False, quiet=True)
+    bam_df = bam_file_stats([bam_file])[bam_file][0]
+    expected = pd.DataFrame({"read_id":p.reads_df.index}).merge(bam_df, on="read_id", how="left")
+    for col in ["align_len", "ref_start", "identity_freq"]:
+        np.testing.assert_allclose(p.reads_df[col].values.astype(float), expected[col].values.astype(float), rtol=1e-6)
+    assert list(p.reads_df["ref_id"].astype(object).fillna("")) == list(expected["ref_id"].astype(object).fillna(""))
+
+@pytest.mark.parametrize("collision", ["hi", "key"])
+def test_join_colliding_read_ids (tmp_path, summary_file, collision):
+    """
+    Distinct summary read_ids sharing their most significant 64 bits or their hash key, including duplicated ones, each get
+    their own barcode
+    """
+    rng = np.random.RandomState(42)
+    summary_df = pd.read_csv(summary_file, sep="\t")
+    lo = np.arange(1, 11, dtype=np.uint64)
+    if collision == "hi":
+        hi = np.full(10, 12345, dtype=np.uint64)
+    else:
+        with np.errstate(over="ignore"):
+            hi = read_id_key(np.uint64(12345), lo)
+        assert len(set(read_id_key(hi, lo))) == 1
+    summary_df.loc[:9, "read_id"] = uint64_to_read_id(hi, lo)
+    summary_df = pd.concat([summary_df, summary_df.iloc[[0, 5, 100]]], ignore_index=True)
+    summary_fn = str(tmp_path/"sequencing_summary.txt")
+    summary_df.to_csv(summary_fn, sep="\t", index=False)
+
+    barcode_df = summary_df[["read_id"]].drop_duplicates()
+    barcode_df["barcode_arrangement"] = rng.choice(["barcode01", "barcode02", "barcode03"], size=len(barcode_df))
+    barcode_fn = str(tmp_path/"barcoding_summary.txt")
+    barcode_df.to_csv(barcode_fn, sep="\t", index=False)
+
+    p = pycoQC_parse(summary_fn, barcode_file=barcode_fn, min_barcode_percent=0, quiet=True)
+    assert p.counter["Barcode reads not found in summary"] == 0
+    barcode = pd.Series(p.reads_df["barcode"].astype(str).values, index=p.reads_df.index)
+    assert len(barcode) == len(summary_df)
+    barcode = barcode[~barcode.index.duplicated()]
+    assert barcode.sort_index().equals(barcode_df.set_index("read_id")["barcode_arrangement"].sort_index())
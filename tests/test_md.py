@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pysam as ps
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import bam_file_stats, _md_base_counts
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def md_bam_file (tmp_path):
+    """
+    Bam file of alignments with a 5S40M2I30M3D20M cigar string and either a NM tag, a MD tag or none of them.
+    Reads with the same number give the same edit distance with the NM and MD tags
+    """
+    bam_fn = str(tmp_path/"md.bam")
+    header = {"HD":{"VN":"1.0"}, "SQ":[{"SN":"chr1", "LN":10000}]}
+    tags = [
+        ("nm_1", ("NM", 6)),
+        ("md_1", ("MD", "5A64^ACG20")),
+        ("nm_2", ("NM", 8)),
+        ("md_2", ("MD", "0T9c58G0^ACG20")),
+        ("nm_3", ("NM", 5)),
+        ("md_3", ("MD", "70^acg20")),
+        ("no_tag", None)]
+    with ps.AlignmentFile(bam_fn, "wb", header=header) as bam:
+        for i, (read_id, tag) in enumerate(tags):
+            a = ps.AlignedSegment(bam.header)
+            a.query_name = read_id
+            a.flag = 0
+            a.reference_id = 0
+            a.reference_start = 100*i
+            a.mapping_quality = 60
+            a.cigarstring = "5S40M2I30M3D20M"
+            a.query_sequence = "A"*97
+            if tag:
+                a.set_tag(*tag)
+            bam.write(a)
+    return bam_fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_md_base_counts ():
+    """The reference bases of each MD string are counted, mismatches and deletions alike, in upper or lower case"""
+    md_list = ["5A64^ACG20", "0T9c58G0^ACG20", "70^acg20", "90", "", "^A0C0^GT1", "12T0T0^CCCCCC3"]
+    expected = [sum(c in "ACGTacgt" for c in md) for md in md_list]
+    assert list(_md_base_counts(md_list)) == expected == [4, 6, 3, 0, 0, 4, 8]
+    assert list(_md_base_counts(md_list[::-1])) == expected[::-1]
+    assert len(_md_base_counts([])) == 0
+
+def test_md_edit_distance (md_bam_file):
+    """The mismatches and identity of the reads without NM tag are computed from the MD tag as from the equivalent NM tag"""
+    df = bam_file_stats([md_bam_file])[md_bam_file][0].set_index("read_id")
+    assert list(df.loc[["md_1", "md_2", "md_3"], "mismatch"]) == [1, 3, 0]
+    assert list(df.loc[["md_1", "md_2", "md_3"], "mismatch"]) == list(df.loc[["nm_1", "nm_2", "nm_3"], "mismatch"])
+    assert list(df.loc[["md_1", "md_2", "md_3"], "identity_freq"]) == list(df.loc[["nm_1", "nm_2", "nm_3"], "identity_freq"])
+    assert df.loc["md_1", "identity_freq"] == pytest.approx((92-6)/92)
+
+    # Reads without NM nor MD tag have no edit distance
+    assert np.isnan(df.loc["no_tag", "mismatch"]) and np.isnan(df.loc["no_tag", "identity_freq"])
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse
+from pycoQC.pycoQC_plot import pycoQC_plot
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def multi_run_summary (tmp_path, summary_file):
+    """Summary file with 4 interleaved run_ids of different sizes, one of them only containing 2 reads"""
+    rng = np.random.RandomState(42)
+    df = pd.read_csv(summary_file, sep="\t")
+    df["run_id"] = rng.choice(["run_a", "run_b", "run_c"], p=[0.6, 0.3, 0.1], size=len(df))
+    df.loc[df.index[[500, 3000]], "run_id"] = "run_d"
+    fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(fn, sep="\t", index=False)
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("chunk_size", [500, 100000])
+def test_preview (multi_run_summary, chunk_size):
+    """
+    In preview mode, the reads and bases counts are exact, each run_id is sampled in proportion of its reads count (at least 1
+    read) and the distributions estimated from the weighted sample are close to the full parse ones
+    """
+    sample = 1000
+    p1 = pycoQC_parse(multi_run_summary, quiet=True)
+    p2 = pycoQC_parse(multi_run_summary, chunk_size=chunk_size, preview=True, sample=sample, quiet=True)
+
+    # Reads sampled per run_id
+    runid_reads = p1.reads_df["run_id"].astype(str).value_counts()
+    expected = (runid_reads/runid_reads.sum()*sample).round().clip(lower=1).astype(int)
+    assert expected["run_d"] == 1
+    assert p2.reads_df["run_id"].astype(str).value_counts().sort_index().equals(expected.sort_index())
+
+    d1 = pycoQC_plot(p1, quiet=True).summary_stats_dict()
+    d2 = pycoQC_plot(p2, quiet=True).summary_stats_dict()
+    for lab in ("All Reads", "Pass Reads"):
+        # Exact values
+        for section, field in (("run", "run_duration"), ("run", "runid_number"), ("basecall", "reads_number"), ("basecall", "bases_number")):
+            assert d2[lab][section][field] == pytest.approx(d1[lab][section][field], rel=1e-6)
+        # Estimated values
+        assert d2[lab]["basecall"]["N50"] == pytest.approx(d1[lab]["basecall"]["N50"], rel=0.1)
+        for field in ("len_percentiles", "qual_score_percentiles"):
+            assert d2[lab]["basecall"][field][50] == pytest.approx(d1[lab]["basecall"][field][50], rel=0.1)
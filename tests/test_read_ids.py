@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import read_id_to_uint64, uint64_to_read_id
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_read_id_round_trip (summary_file):
+    """UUID read_ids encoded as pairs of uint64 are decoded back to the same strings"""
+    read_ids = pd.read_csv(summary_file, sep="\t", usecols=["read_id"])["read_id"].values
+    read_ids = np.append(read_ids, ["00000000-0000-0000-0000-000000000000", "ffffffff-ffff-ffff-ffff-ffffffffffff"])
+    hi, lo = read_id_to_uint64(read_ids)
+    assert hi.dtype == lo.dtype == np.uint64
+    assert list(uint64_to_read_id(hi, lo)) == list(read_ids)
+
+@pytest.mark.parametrize("read_id", [
+    "FFFFFD25-4733-44E7-BB2C-C738912B83C7",
+    "fffffd25473344e7bb2cc738912b83c7",
+    "{fffffd25-4733-44e7-bb2c-c738912b83c7}",
+    "fffffd25-4733-44e7-bb2c-c738912b83c",
+    "fffffd25-4733-44e7-bb2c-c738912b83c77",
+    "fffffd25_4733_44e7_bb2c_c738912b83c7",
+    "gffffd25-4733-44e7-bb2c-c738912b83c7",
+    "fffffd25-4733-44e7-bb2c-c738912b83cé",
+    "read_18170_ch_22"])
+def test_non_canonical_read_ids (read_id):
+    """read_ids which are not canonical lower case UUIDs are not encoded, even if mixed with UUIDs"""
+    assert read_id_to_uint64([read_id]) is None
+    assert read_id_to_uint64(["fffffd25-4733-44e7-bb2c-c738912b83c7", read_id]) is None
+
+def test_non_canonical_parse (tmp_path, summary_file, barcode_file):
+    """Non canonical read_ids are kept as strings, with the same results as the encoded UUIDs"""
+    summary_df = pd.read_csv(summary_file, sep="\t")
+    summary_df["read_id"] = summary_df["read_id"].str.upper()
+    summary_fn = str(tmp_path/"sequencing_summary.txt")
+    summary_df.to_csv(summary_fn, sep="\t", index=False)
+    barcode_df = pd.read_csv(barcode_file, sep="\t")
+    barcode_df["read_ID"] = barcode_df["read_ID"].str.upper()
+    barcode_fn = str(tmp_path/"barcoding_summary.txt")
+    barcode_df.to_csv(barcode_fn, sep="\t", index=False)
+
+    p1 = pycoQC_parse(summary_file, barcode_file=barcode_file, quiet=True)
+    p2 = pycoQC_parse(summary_fn, barcode_file=barcode_fn, quiet=True)
+    df = p1.reads_df.copy()
+    df.index = df.index.str.upper()
+    pd.testing.assert_frame_equal(p2.reads_df, df)
+    assert p2.counter == p1.counter
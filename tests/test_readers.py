@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+import pycoQC.common
+from pycoQC.common import read_tsv_file, iter_files_to_df, tsv_file_tail, concat_df_list
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def na_summary_file (tmp_path, summary_file):
+    """Uncompressed copy of summary_file with missing values in the integer channel and sequence_length_template columns"""
+    df = pd.read_csv(summary_file, sep="\t")
+    df["channel"] = df["channel"].astype(object)
+    df.loc[df.index[::100], "channel"] = np.nan
+    df.loc[df.index[50::100], "sequence_length_template"] = np.nan
+    fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(fn, sep="\t", index=False)
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_na_integer_columns (na_summary_file):
+    """Integer columns containing NA values are read as float32 by all the readers"""
+    dtype = {"channel":"uint16", "sequence_length_template":"uint32", "run_id":"category"}
+    usecols = list(dtype.keys())
+    df = read_tsv_file(na_summary_file, usecols=usecols, dtype=dtype)
+    assert df["channel"].dtype == df["sequence_length_template"].dtype == np.float32
+    assert df["channel"].isna().sum() == df["sequence_length_template"].isna().sum() == 40
+
+    header, ranges = pycoQC.common.tsv_file_ranges(na_summary_file, 3)
+    df_list = [pycoQC.common._read_tsv_range(na_summary_file, start, stop, header, usecols=usecols, dtype=dtype) for start, stop in ranges]
+    pd.testing.assert_frame_equal(concat_df_list(df_list), df)
+    df_list = list(iter_files_to_df([na_summary_file], chunk_size=1000, usecols=usecols, dtype=dtype))
+    pd.testing.assert_frame_equal(concat_df_list(df_list), df)
+    df_list = list(tsv_file_tail(na_summary_file).iter_df(chunk_size=1000, usecols=usecols, dtype=dtype))
+    pd.testing.assert_frame_equal(concat_df_list(df_list), df)
+
+    # Without NA values the integer dtypes are kept
+    df = read_tsv_file(na_summary_file, usecols=["mean_qscore_template", "num_events"], dtype={"num_events":"uint32"})
+    assert df["num_events"].dtype == np.uint32
+
+@pytest.mark.parametrize("kwargs", [
+    {"threads":3},
+    {"chunk_size":1000},
+    {"summary_index":True, "time_window":[0, 100]}])
+def test_na_parse (monkeypatch, na_summary_file, kwargs):
+    """The reads with NA values are discarded in the same way whatever the reader used"""
+    monkeypatch.setattr(pycoQC.common, "SPLIT_MIN_BYTES", 2**16)
+    p1 = pycoQC_parse(na_summary_file, quiet=True)
+    p2 = pycoQC_parse(na_summary_file, quiet=True, **kwargs)
+    assert p1.counter["Valid reads"] == p2.counter["Valid reads"] == p1.counter["Initial reads"]-80
+    if not "chunk_size" in kwargs:
+        pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
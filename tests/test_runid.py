@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def multi_run_summary (tmp_path, summary_file):
+    """Summary file with 3 interleaved run_ids of different throughputs"""
+    rng = np.random.RandomState(42)
+    df = pd.read_csv(summary_file, sep="\t")
+    df["run_id"] = rng.choice(["run_a", "run_b", "run_c"], p=[0.6, 0.3, 0.1], size=len(df))
+    df.loc[df["run_id"] == "run_b", "start_time"] /= 4
+    fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(fn, sep="\t", index=False)
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.mark.parametrize("kwargs", [{}, {"runid_list":["run_c", "run_a", "run_b"]}, {"chunk_size":1000}, {"threads":2}])
+def test_runid_offsets (multi_run_summary, kwargs):
+    """The start_time offsets applied through the per run_id lookup table are the same as with a loop over the run_ids"""
+    p = pycoQC_parse(multi_run_summary, quiet=True, **kwargs)
+    df = pd.read_csv(multi_run_summary, sep="\t", usecols=["read_id", "run_id", "start_time"], dtype={"start_time":"float32"})
+    df = df.set_index("read_id").loc[p.reads_df.index]
+    expected = runid_offsets_loop(df, kwargs.get("runid_list"))
+    assert p.reads_df["start_time"].is_monotonic_increasing
+    assert list(p.reads_df["start_time"].values) == list(expected["start_time"].values)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~HELPERS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def runid_offsets_loop (df, runid_list=None):
+    """Offset the start_time of the reads of each run_id in turn, in the order of runid_list or by decreasing throughput"""
+    df = df.copy()
+    runid_df = df.groupby("run_id")["start_time"].agg(["count", "min", "max"])
+    if not runid_list:
+        throughput = runid_df["count"]/(runid_df["max"]-runid_df["min"])
+        runid_list = list(throughput.sort_values(ascending=False).index)
+    increment_time = 0
+    for runid in runid_list:
+        df.loc[df["run_id"] == runid, "start_time"] += increment_time
+        increment_time += float(runid_df.loc[runid, "max"])+1
+    return df
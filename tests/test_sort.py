@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import sorted_runs_argsort
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def unsorted_summary (tmp_path, summary_file):
+    """Summary file of a single run made of 3 sorted blocks of reads, with groups of reads sharing the same start_time"""
+    df = pd.read_csv(summary_file, sep="\t").sort_values("start_time")
+    df["run_id"] = df["run_id"].iloc[0]
+    df["start_time"] = df["start_time"].round(-1)
+    df = pd.concat([df.iloc[1::3], df.iloc[2::3], df.iloc[0::3]])
+    fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(fn, sep="\t", index=False)
+    return fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_sorted_runs_argsort ():
+    """No permutation is returned for sorted values, and values that are equal keep their input order"""
+    assert sorted_runs_argsort(np.array([0, 1, 1, 1, 2, 5, 5], dtype=np.float32)) is None
+    assert sorted_runs_argsort(np.array([], dtype=np.float32)) is None
+
+    values = np.array([3, 4, 4, 9, 1, 4, 4, 8, 0, 4], dtype=np.float32)
+    order = sorted_runs_argsort(values)
+    assert list(order) == [8, 4, 0, 1, 2, 5, 6, 9, 7, 3]
+
+    rng = np.random.RandomState(42)
+    values = np.concatenate([np.sort(rng.randint(0, 100, 1000)) for _ in range(5)]).astype(np.float32)
+    order = sorted_runs_argsort(values)
+    assert np.all(np.diff(values[order]) >= 0)
+    assert list(order) == sorted(range(len(values)), key=lambda i: values[i])
+
+@pytest.mark.parametrize("order", [None, np.array([3, 0, 4, 1, 2])])
+def test_cast_reads_df_order (summary_file, order):
+    """The permutation is applied to the categorical codes and to the other columns in the same way"""
+    p = pycoQC_parse(summary_file, quiet=True)
+    df = pd.DataFrame({
+        "read_id":["r0", "r1", "r2", "r3", "r4"],
+        "run_id":pd.Categorical(["b", "a", "c", "a", "b"], categories=["c", "b", "a", "unused"]),
+        "barcode":["bc1", "bc2", "bc1", "unclassified", "bc2"],
+        "start_time":[3., 1., 4., 0., 2.],
+        "read_len":[30., 10., 40., 0., 20.]})
+    res = p._cast_reads_df(df.copy(), order)
+    expected = df if order is None else df.iloc[order]
+    assert list(res.index) == list(expected["read_id"])
+    for col in ("run_id", "barcode"):
+        assert res[col].dtype == "category"
+        assert list(res[col]) == list(expected[col])
+    assert list(res["run_id"].cat.categories) == ["c", "b", "a"]
+    assert res["start_time"].dtype == np.float32 and res["read_len"].dtype == np.uint32
+    assert list(res["read_len"]) == list(expected["read_len"])
+
+@pytest.mark.parametrize("kwargs", [{}, {"threads":2}])
+def test_sorted_reads (unsorted_summary, kwargs):
+    """Reads are sorted by start_time and reads with the same start_time stay in the order of the summary file"""
+    p = pycoQC_parse(unsorted_summary, quiet=True, **kwargs)
+    df = pd.read_csv(unsorted_summary, sep="\t", usecols=["read_id", "start_time"])
+    df = df[df["read_id"].isin(p.reads_df.index)].sort_values("start_time", kind="mergesort")
+    assert list(p.reads_df.index) == list(df["read_id"])
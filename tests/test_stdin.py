@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import os
+from os import path
+
+# Third party imports
+import pandas as pd
+import pysam as ps
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse, bam_file_stats, bam_stats_dir
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def sam_file (tmp_path, bam_file):
+    """Unsorted sam copy of the alignments of bam_file"""
+    sam_fn = str(tmp_path/"unsorted.sam")
+    with ps.AlignmentFile(path.join(path.dirname(bam_file), "unsorted.bam"), "rb") as bam:
+        with ps.AlignmentFile(sam_fn, "w", template=bam) as sam:
+            for read in bam.fetch(until_eof=True):
+                sam.write(read)
+    return sam_fn
+
+@pytest.fixture
+def stdin_sam (sam_file):
+    """Redirect the standard input file descriptor, read by htslib, to sam_file"""
+    saved_fd = os.dup(0)
+    fd = os.open(sam_file, os.O_RDONLY)
+    os.dup2(fd, 0)
+    os.close(fd)
+    yield "-"
+    os.dup2(saved_fd, 0)
+    os.close(saved_fd)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_unsorted_sam (summary_file, bam_file, sam_file):
+    """The alignments of an unsorted sam file, read sequentially, give the same stats as the regions of the indexed bam file"""
+    df1, counts1, ref_len_dict1 = bam_file_stats([bam_file])[bam_file][:3]
+    df2, counts2, ref_len_dict2 = bam_file_stats([sam_file])[sam_file][:3]
+    assert counts1 == counts2 and ref_len_dict1 == ref_len_dict2
+    pd.testing.assert_frame_equal(df2.sort_values("read_id", ignore_index=True), df1.sort_values("read_id", ignore_index=True))
+
+    p1 = pycoQC_parse(summary_file, bam_file=bam_file, write_bam_sidecar=False, quiet=True)
+    p2 = pycoQC_parse(summary_file, bam_file=sam_file, write_bam_sidecar=False, quiet=True)
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+    pd.testing.assert_frame_equal(p2.alignments_df, p1.alignments_df)
+
+def test_stdin (monkeypatch, tmp_path, summary_file, bam_file, stdin_sam):
+    """Alignments read from the standard input give the same reads table as the indexed bam file, and are not saved in a sidecar"""
+    p1 = pycoQC_parse(summary_file, bam_file=bam_file, write_bam_sidecar=False, quiet=True)
+    monkeypatch.chdir(tmp_path)
+    p2 = pycoQC_parse(summary_file, bam_file=stdin_sam, quiet=True)
+    assert p2.bam_file_list == ["-"]
+    assert not path.exists(bam_stats_dir("-"))
+    pd.testing.assert_frame_equal(p2.reads_df, p1.reads_df)
+    pd.testing.assert_frame_equal(p2.alignments_df, p1.alignments_df)
+
+def test_stdin_cache_disabled (tmp_path, summary_file, stdin_sam, caplog):
+    """The parse cache is disabled with a warning when alignments are read from the standard input"""
+    cache_dir = str(tmp_path/"cache")
+    p = pycoQC_parse(summary_file, bam_file=stdin_sam, cache_dir=cache_dir, quiet=True)
+    assert "Parse cache disabled" in caplog.text
+    assert p.cache_dir == "" and not path.exists(cache_dir)
+    assert p.counter["Bam files found"] == 1
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.pycoQC_parse import pycoQC_parse
+from pycoQC.pycoQC_plot import pycoQC_plot
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def summary_stats_dict (**kwargs):
+    d = pycoQC_plot(pycoQC_parse(quiet=True, **kwargs), quiet=True).summary_stats_dict()
+    del d["pycoqc"]
+    # Float fields are counted after rounding in streaming mode (see FIELD_DECIMALS), which can move reads across histogram bins
+    for lab in ("All Reads", "Pass Reads"):
+        for section in d[lab].values():
+            for hist in ("qual_score_hist", "identity_freq_hist"):
+                if hist in section:
+                    del section[hist]["y"]
+    return d
+
+@pytest.mark.parametrize("inputs", ["summary", "barcode", "bam"])
+@pytest.mark.parametrize("chunk_size", [500, 100000])
+def test_streaming_summary_stats (inputs, chunk_size, summary_file, barcode_file, bam_file, assert_dict_close):
+    """The stats aggregated by chunks are the same as the stats computed on the whole reads table"""
+    kwargs = {"summary_file":summary_file}
+    if inputs == "barcode":
+        kwargs["barcode_file"] = barcode_file
+    elif inputs == "bam":
+        kwargs["bam_file"] = bam_file
+        kwargs["write_bam_sidecar"] = False
+    d = summary_stats_dict(**kwargs)
+    assert ("alignment" in d["All Reads"]) == (inputs == "bam")
+    assert_dict_close(summary_stats_dict(chunk_size=chunk_size, **kwargs), d, abs=1e-3)
+
+def test_streaming_large_read_len (tmp_path, summary_file, assert_dict_close):
+    """The bases are summed exactly by chunks, even when the read lengths are too large to be summed in float32"""
+    rng = np.random.RandomState(42)
+    df = pd.read_csv(summary_file, sep="\t")
+    df["sequence_length_template"] = rng.randint(1000000, 2000000, size=len(df))
+    summary_fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(summary_fn, sep="\t", index=False)
+
+    d = summary_stats_dict(summary_file=summary_fn, chunk_size=1000)
+    assert d["All Reads"]["basecall"]["bases_number"] == int(df["sequence_length_template"].sum())
+    assert_dict_close(d, summary_stats_dict(summary_file=summary_fn), abs=1e-3)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import os
+import shutil
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import summary_file_index
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def indexed_summary (tmp_path, summary_file):
+    """
+    Uncompressed summary file sorted by start_time, with 2 run_ids and an index of small blocks, and a copy of the same file
+    without index
+    """
+    df = pd.read_csv(summary_file, sep="\t").sort_values("start_time")
+    df["run_id"] = np.where(np.arange(len(df)) < len(df)//2, "run_a", "run_b")
+    fn = str(tmp_path/"sequencing_summary.txt")
+    df.to_csv(fn, sep="\t", index=False)
+    index = summary_file_index(fn, block_size=2**14)
+    index.build()
+    copy_dir = tmp_path/"copy"
+    copy_dir.mkdir()
+    copy_fn = str(copy_dir/"sequencing_summary.txt")
+    shutil.copy(fn, copy_fn)
+    return fn, copy_fn
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_index_invalidation (indexed_summary):
+    """The index is not loaded once the size or the modification time of the summary file changed"""
+    fn = indexed_summary[0]
+    index = summary_file_index(fn)
+    assert index.load() and len(index) > 1
+
+    # Same size, different modification time
+    st = os.stat(fn)
+    os.utime(fn, (st.st_atime, st.st_mtime+10))
+    assert not summary_file_index(fn).load()
+    summary_file_index(fn, block_size=2**14).build()
+    assert summary_file_index(fn).load()
+
+    # Different size
+    with open(fn) as fp:
+        last_line = fp.readlines()[-1]
+    with open(fn, "a") as fp:
+        fp.write(last_line)
+    assert not summary_file_index(fn).load()
+
+    # A stale index is not used by the parser, and rebuilt if summary_index is True
+    p = pycoQC_parse(fn, time_window=[0, 100], quiet=True)
+    assert not p._summary_indexes
+    p = pycoQC_parse(fn, summary_index=True, time_window=[0, 100], quiet=True)
+    assert fn in p._summary_indexes
+    index = summary_file_index(fn)
+    assert index.load() and index.blocks[-1]["stop"] == os.path.getsize(fn)
+
+def test_index_select (indexed_summary):
+    """The blocks selected are all the blocks overlapping the time window and containing one of the run_ids"""
+    fn = indexed_summary[0]
+    index = summary_file_index(fn)
+    index.load()
+    ranges = index.select(time_window=[20000, 40000])
+    assert 0 < len(ranges) < len(index)
+    df = pd.concat(index.iter_df(ranges), ignore_index=True)
+    all_df = pd.read_csv(fn, sep="\t")
+    assert df["start_time"].min() < 20000 and df["start_time"].max() > 40000
+    assert set(df["read_id"]) >= set(all_df.loc[all_df["start_time"].between(20000, 40000), "read_id"])
+
+    ranges = index.select(runid_list=["run_b"])
+    df = pd.concat(index.iter_df(ranges), ignore_index=True)
+    assert 0 < len(ranges) < len(index)
+    assert set(df["read_id"]) >= set(all_df.loc[all_df["run_id"] == "run_b", "read_id"])
+
+@pytest.mark.parametrize("kwargs", [
+    {"time_window":[5, 15]},
+    {"time_window":[5, 15], "chunk_size":200},
+    {"runid_list":["run_b"]},
+    {"time_window":[0, 10], "runid_list":["run_a"]}])
+def test_index_parse (indexed_summary, kwargs):
+    """Parsing only the selected blocks gives the same reads as parsing the whole file without index"""
+    fn, copy_fn = indexed_summary
+    p1 = pycoQC_parse(fn, quiet=True, **kwargs)
+    p2 = pycoQC_parse(copy_fn, quiet=True, **kwargs)
+    assert fn in p1._summary_indexes and not p2._summary_indexes
+    assert p1.counter["Summary blocks skipped"] > 0
+    assert p1.counter["Valid reads"] == p2.counter["Valid reads"]
+    assert p1.counter["Initial reads"] < p2.counter["Initial reads"]
+    pd.testing.assert_frame_equal(p1.reads_df, p2.reads_df)
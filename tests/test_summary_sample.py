@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import sequencing_summary_file_sample, file_compression
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def multi_run_summary_files (tmp_path, summary_file):
+    """Summary file with 4 interleaved run_ids of different sizes, one of them only containing 2 reads, split in 2 files"""
+    rng = np.random.RandomState(42)
+    df = pd.read_csv(summary_file, sep="\t")
+    df["run_id"] = rng.choice(["run_a", "run_b", "run_c"], p=[0.6, 0.3, 0.1], size=len(df))
+    df.loc[df.index[[500, 3000]], "run_id"] = "run_d"
+    fn_list = []
+    for i, sdf in enumerate((df.iloc[:1500], df.iloc[1500:])):
+        fn = str(tmp_path/"sequencing_summary_{}.txt".format(i))
+        sdf.to_csv(fn, sep="\t", index=False)
+        fn_list.append(fn)
+    return fn_list
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_summary_sample (multi_run_summary_files):
+    """
+    Reads are sampled from each run_id proportionally to its reads count with at least 1 read, the same reads being sampled
+    with a given seed whatever the chunk size, and the sample is sorted by start_time
+    """
+    n_seq = 400
+    df_all = pd.concat([pd.read_csv(fn, sep="\t") for fn in multi_run_summary_files], ignore_index=True)
+    df = sequencing_summary_file_sample(multi_run_summary_files, n_seq=n_seq, seed=1, chunk_size=1000000)
+
+    runid_counts = df_all["run_id"].value_counts()
+    expected = (runid_counts/runid_counts.sum()*n_seq).round().clip(lower=1).astype(int)
+    assert expected["run_d"] == 1
+    assert df["run_id"].value_counts().sort_index().equals(expected.sort_index())
+    assert df["start_time"].is_monotonic_increasing
+    # The sampled lines are unchanged
+    pd.testing.assert_frame_equal(df, df_all.set_index("read_id").loc[df["read_id"]].reset_index()[df_all.columns])
+
+    for chunk_size in (300, 1000):
+        pd.testing.assert_frame_equal(sequencing_summary_file_sample(multi_run_summary_files, n_seq=n_seq, seed=1, chunk_size=chunk_size), df)
+    assert set(sequencing_summary_file_sample(multi_run_summary_files, n_seq=n_seq, seed=2)["read_id"]) != set(df["read_id"])
+
+def test_summary_sample_outfile (tmp_path, multi_run_summary_files):
+    """The sample is written in bgzip format if the output file name ends with gz"""
+    df = sequencing_summary_file_sample(multi_run_summary_files, n_seq=100, seed=1)
+    for outfile, compression in (("sample.txt", None), ("sample.txt.gz", "bgzip")):
+        outfile = str(tmp_path/outfile)
+        sequencing_summary_file_sample(multi_run_summary_files, outfile=outfile, n_seq=100, seed=1)
+        assert file_compression(outfile) == compression
+        pd.testing.assert_frame_equal(pd.read_csv(outfile, sep="\t"), df)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Standard library imports
+import gzip
+import json
+import time
+
+# Third party imports
+import pandas as pd
+import pytest
+
+# Local imports
+from pycoQC.common import tsv_file_tail
+from pycoQC.pycoQC import pycoQC
+from pycoQC.pycoQC_parse import pycoQC_parse
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~FIXTURES~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+@pytest.fixture
+def summary_lines (summary_file):
+    """Lines of summary_file, including the header line"""
+    with gzip.open(summary_file, "rb") as fp:
+        return fp.readlines()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~TESTS~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+def test_tsv_file_tail (tmp_path, summary_file, summary_lines):
+    """Only the complete lines appended since the previous read are parsed, a partial last line being left for the next read"""
+    fn = str(tmp_path/"sequencing_summary.txt")
+    open(fn, "wb").close()
+    tail = tsv_file_tail(fn, block_size=10000)
+    df_list = []
+    for start, stop in ((0, 1), (1, 1000), (1000, 1000), (1000, 2500), (2500, len(summary_lines))):
+        with open(fn, "ab") as fp:
+            fp.write(b"".join(summary_lines[start:stop]))
+            # Write the first half of the next line
+            if stop < len(summary_lines):
+                fp.write(summary_lines[stop][:50])
+        df_list.extend(tail.iter_df(chunk_size=300))
+        assert sum(len(df) for df in df_list) == max(0, stop-1)
+        # Complete the partial line
+        if stop < len(summary_lines):
+            with open(fn, "rb+") as fp:
+                fp.seek(-50, 2)
+                fp.truncate()
+    pd.testing.assert_frame_equal(pd.concat(df_list, ignore_index=True), pd.read_csv(summary_file, sep="\t"))
+
+def test_watch_update (tmp_path, summary_file, summary_lines):
+    """The reads appended to the summary file and parsed by update give the same totals as a parse of the complete file"""
+    fn = str(tmp_path/"sequencing_summary.txt")
+    with open(fn, "wb") as fp:
+        fp.write(b"".join(summary_lines[:1]))
+
+    # Empty summary file at startup
+    p = pycoQC_parse(fn, chunk_size=1000, watch=True, quiet=True)
+    assert p.reads_df.empty
+    assert p.update() == 0
+
+    stop = 1
+    for next_stop in (2, 1501, len(summary_lines)):
+        with open(fn, "ab") as fp:
+            fp.write(b"".join(summary_lines[stop:next_stop]))
+            fp.write(summary_lines[next_stop][:50] if next_stop < len(summary_lines) else b"")
+        assert p.update() == next_stop-stop
+        # A single valid read is not enough to define the run duration
+        assert p.reads_df.empty == (next_stop == 2)
+        with open(fn, "rb+") as fp:
+            fp.truncate(sum(len(l) for l in summary_lines[:next_stop]))
+        stop = next_stop
+
+    expected = pycoQC_parse(summary_file, chunk_size=1000, quiet=True)
+    assert p.counter == expected.counter
+    for df_level in ("all", "pass"):
+        assert p.aggregate[df_level].reads == expected.aggregate[df_level].reads
+        assert p.aggregate[df_level].bases == expected.aggregate[df_level].bases
+    pd.testing.assert_frame_equal(p.reads_df, expected.reads_df)
+
+def test_watch_reports (monkeypatch, tmp_path, summary_file, summary_lines):
+    """pycoQC starts watching an empty summary file and only writes the reports once reads were appended"""
+    fn = str(tmp_path/"sequencing_summary.txt")
+    json_fn = str(tmp_path/"pycoQC.json")
+    with open(fn, "wb") as fp:
+        fp.write(summary_lines[0])
+
+    sleep_calls = []
+    def sleep (seconds):
+        sleep_calls.append(seconds)
+        if len(sleep_calls) == 1:
+            with open(fn, "ab") as fp:
+                fp.write(b"".join(summary_lines[1:]))
+        elif len(sleep_calls) == 3:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(time, "sleep", sleep)
+
+    pycoQC(fn, json_outfile=json_fn, chunk_size=1000, watch=True, watch_interval=5, quiet=True)
+    assert sleep_calls == [5, 5, 5]
+    with open(json_fn) as fp:
+        d = json.load(fp)
+    assert d["All Reads"]["basecall"]["reads_number"] == pycoQC_parse(summary_file, quiet=True).counter["Valid reads"]